@@ -13,7 +13,7 @@ setup(
     # В нашем случае, основной пакет - это 'src', 'ui' и т.д., которые находятся внутри 'digital_ruble_simulation'.
     # find_packages() автоматически найдёт 'src' и 'ui', если они помечены как пакеты (__init__.py).
     # package_dir={'': '.'}, # Корень пакетов - текущая директория (не обязательно, если пакеты в корне)
-    packages=find_packages(include=['digital_ruble_simulation', 'digital_ruble_simulation.*']), # Ищем пакеты, начинающиеся с digital_ruble_simulation
+    packages=find_packages(include=['src', 'src.*', 'ui', 'ui.*']), # Пакеты верхнего уровня - src и ui
     # Альтернатива: явно перечислить пакеты
     # packages=[
     #     'digital_ruble_simulation',
@@ -28,6 +28,13 @@ setup(
     install_requires=[
         "sqlalchemy>=1.4",
         "matplotlib>=3.5",
+        "numpy>=1.17",
     ],
+    # Запуск сценариев без UI: digital-ruble-sim --scenario low --seed 42
+    entry_points={
+        'console_scripts': [
+            'digital-ruble-sim=src.cli:main',
+        ],
+    },
     python_requires='>=3.6',
 )
\ No newline at end of file
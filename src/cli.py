@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+Запуск сценариев симуляции без графического интерфейса (серверы, ночные замеры производительности).
+
+Пример:
+    python -m src.cli --scenario low medium --duration 600 --seed 42 --output results.json
+    python -m src.cli --scenario peak --shards 4 --local-events --db-dir runs --quiet
+    python -m src.cli --scenario medium --seed 1 --record-trace medium.trace
+    python -m src.cli --replay-trace medium.trace --output replay.json
+
+Код возврата ненулевой, если цепочка недействительна или запуск при непустой нагрузке
+не закоммитил ни одной транзакции.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# Корень проекта добавляется в sys.path так же, как в main.py (для запуска файла напрямую)
+current_file_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_file_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src import main as simulation
+from src.core import trace
+from src.data import database_manager
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Имитационная модель цифрового рубля: запуск сценариев без UI.")
+    parser.add_argument('--scenario', nargs='+', default=['low'], choices=sorted(simulation.SCENARIOS),
+                        help="Сценарии для последовательного запуска.")
+    parser.add_argument('--users', type=int, default=0, help="Количество пользователей (0 - из сценария).")
+    parser.add_argument('--fos', type=int, default=0, help="Количество ФО (0 - из сценария).")
+    parser.add_argument('--duration', type=float, default=simulation.SIMULATION_DURATION_SECONDS,
+                        help="Длительность в секундах виртуального времени.")
+    parser.add_argument('--transactions', type=int, default=0,
+                        help="Ожидаемое количество транзакций (0 - из сценария пропорционально длительности).")
+    parser.add_argument('--seed', type=int, default=None, help="Начальное значение генераторов случайных чисел.")
+    parser.add_argument('--storage-profile', default='benchmark', choices=sorted(database_manager.STORAGE_PROFILES),
+                        help="Профиль настройки SQLite.")
+    parser.add_argument('--db-dir', default=None,
+                        help="Каталог для отдельной БД каждого запуска (по умолчанию - общая БД симуляции).")
+    parser.add_argument('--pipelined', action='store_true', help="Конвейерный режим HotStuff.")
+    parser.add_argument('--mining-workers', type=int, default=1,
+                        help="Количество процессов для майнинга блоков (больше 1 - параллельный перебор nonce).")
+    parser.add_argument('--shared-mempool', action='store_true', help="Общий для всех ФО пул транзакций.")
+    parser.add_argument('--realtime', action='store_true', help="Согласовывать виртуальное время с реальным.")
+    parser.add_argument('--speed', type=float, default=1.0, help="Ускорение виртуального времени в режиме --realtime.")
+    parser.add_argument('--output', default='simulation_results.json', help="Файл результатов (JSON).")
+    parser.add_argument('--quiet', action='store_true', help="Не выводить журнал симуляции, только итоги.")
+    parser.add_argument('--shards', type=int, default=1,
+                        help="Количество независимых шардов-процессов: ФО и их пользователи делятся между шардами, "
+                             "у каждого своя цепочка (требует --db-dir и --local-events). Переводов и сообщений "
+                             "между шардами нет.")
+    parser.add_argument('--local-events', action='store_true',
+                        help="События с офлайн-кошельками и смарт-контрактами затрагивают клиентов одной ФО "
+                             "(без переводов между ФО).")
+    parser.add_argument('--record-trace', default=None,
+                        help="Записать нагрузку в трассу (при нескольких сценариях или шардах к имени добавляется суффикс).")
+    parser.add_argument('--self-check', action='store_true',
+                        help="Проверить, что обеспеченный перевод попадает в закоммиченный блок (базовый и конвейерный "
+                             "режимы), и завершить работу.")
+    parser.add_argument('--replay-trace', default=None,
+                        help="Воспроизвести нагрузку из трассы (сценарий, ФО и пользователи берутся из неё; "
+                             "с --realtime - в исходном темпе).")
+    args = parser.parse_args(argv)
+    if args.shards < 1:
+        parser.error("--shards должно быть положительным")
+    if args.mining_workers < 1:
+        parser.error("--mining-workers должно быть положительным")
+    if args.replay_trace:
+        if args.shards > 1 or args.record_trace:
+            parser.error("--replay-trace несовместим с --shards и --record-trace")
+        args.scenario = [trace.TraceReader(args.replay_trace).header.get("scenario", "low")]
+    if args.shards > 1 and not args.db_dir:
+        parser.error("для --shards > 1 нужен --db-dir: каждый шард пишет в свою БД")
+    if args.shards > 1 and not args.local_events:
+        # События сценария выбирают ФО и получателя среди всех пользователей; шарды не обмениваются
+        # транзакциями, поэтому события между ФО разных шардов были бы потеряны
+        parser.error("--shards > 1 требует --local-events: переводы между ФО разных шардов не поддерживаются")
+    return args
+
+def split_evenly(total, parts):
+    """Делит total на parts почти равных целых частей (первые части больше на единицу)."""
+    base, remainder = divmod(total, parts)
+    return [base + (1 if i < remainder else 0) for i in range(parts)]
+
+def get_run_size(scenario, args):
+    """
+    Возвращает (пользователи, ФО, ожидаемые транзакции) запуска с учётом параметров командной строки.
+    Ожидаемое количество транзакций в сценарии задано на час - при другой длительности сохраняется интенсивность.
+    """
+    params = simulation.SCENARIOS[scenario]
+    num_users = args.users or params["num_users"]
+    num_fos = args.fos or params["num_fos"]
+    if args.transactions > 0:
+        expected_txs = args.transactions
+    else:
+        expected_txs = max(1, round(params["total_transactions_expected"] * args.duration / 3600))
+    return num_users, num_fos, expected_txs
+
+def get_trace_path(path, scenario, args, shard_index, num_shards):
+    """Путь трассы запуска: при нескольких сценариях или шардах к имени файла добавляется суффикс."""
+    base, ext = os.path.splitext(path)
+    if len(args.scenario) > 1:
+        base += f"_{scenario}"
+    if num_shards > 1:
+        base += f"_shard{shard_index}"
+    return base + ext
+
+def run_one(scenario, args, shard_index=0, num_shards=1):
+    """
+    Инициализирует и выполняет один сценарий или его шард: шард получает свою часть ФО
+    с их пользователями и пропорциональную часть нагрузки, собственную цепочку,
+    валидаторов (ФО шарда) и БД.
+
+    Returns:
+        dict: Параметры и результаты запуска.
+    """
+    num_users, num_fos, expected_txs = get_run_size(scenario, args)
+    fo_counts = split_evenly(num_fos, num_shards)
+    user_counts = split_evenly(num_users, num_shards)
+    shard_expected_txs = max(1, round(expected_txs * user_counts[shard_index] / num_users))
+    seed = args.seed + shard_index if args.seed is not None else None
+
+    db_path = None
+    if args.db_dir:
+        os.makedirs(args.db_dir, exist_ok=True)
+        shard_suffix = f"_shard{shard_index}" if num_shards > 1 else ""
+        db_file = os.path.join(os.path.abspath(args.db_dir),
+                               f"{scenario}_{datetime.now():%Y%m%d_%H%M%S_%f}{shard_suffix}.db")
+        db_path = f"sqlite:///{db_file}"
+
+    duration = args.duration
+    expected_txs = shard_expected_txs
+    trace_writer = trace_reader = workload_generator = None
+    trace_path = None
+    if args.replay_trace:
+        trace_path = args.replay_trace
+        trace_reader = trace.TraceReader(trace_path)
+        if trace_reader.run:
+            duration, expected_txs = trace_reader.run
+        seed = trace_reader.header.get("seed")
+    elif args.record_trace:
+        trace_path = get_trace_path(args.record_trace, scenario, args, shard_index, num_shards)
+        trace_writer = trace.TraceWriter(trace_path)
+
+    try:
+        db_manager, chain, _, fos, users, replicas, network, _ = simulation.initialize_simulation(
+            num_users=user_counts[shard_index], num_fos=fo_counts[shard_index], scenario=scenario,
+            pipelined_consensus=args.pipelined, shared_mempool=args.shared_mempool,
+            storage_profile=args.storage_profile, db_path=db_path,
+            fo_id_offset=sum(fo_counts[:shard_index]), user_id_offset=sum(user_counts[:shard_index]),
+            seed=seed, trace_writer=trace_writer, trace_reader=trace_reader, mining_workers=args.mining_workers,
+        )
+        if trace_reader is None:
+            workload_generator = simulation.create_workload(scenario, fos, duration, expected_txs, seed=seed)
+        loop_stats = simulation.run_simulation_loop(
+            replicas, duration, expected_txs, fos, users, db_manager,
+            realtime=args.realtime, speed=args.speed, workload_generator=workload_generator,
+            trace_writer=trace_writer, trace_reader=trace_reader, seed=seed, local_events=args.local_events,
+        )
+    finally:
+        if trace_writer is not None:
+            trace_writer.close()
+
+    committed_txs = sum(len(block.transactions) for block in chain.chain)
+    network_stats = network.get_stats()
+    result = {
+        'scenario': scenario,
+        'num_users': len(users),
+        'num_fos': len(fos),
+        'duration': duration,
+        'expected_transactions': expected_txs,
+        'seed': seed,
+        'storage_profile': args.storage_profile,
+        'pipelined': args.pipelined,
+        'shared_mempool': args.shared_mempool,
+        'db_path': db_path,
+        'trace_path': trace_path,
+        'trace_mode': 'replay' if trace_reader is not None else ('record' if trace_writer is not None else None),
+        'blocks': len(chain.chain),
+        'committed_transactions': committed_txs,
+        'throughput_tps': committed_txs / loop_stats['wall_time'] if loop_stats['wall_time'] > 0 else None,
+        'chain_valid': chain.is_chain_valid(),
+        'messages_sent': network_stats['messages_sent'],
+        'messages_delivered': network_stats['messages_delivered'],
+        'mining_workers': chain.mining_workers,
+        'mining_hashes_per_second': chain.mining_stats['hashes_per_second'] if chain.mining_stats else None,
+    }
+    result.update(loop_stats)
+    chain.shutdown()
+    db_manager.close()
+    return result
+
+def _run_shard(scenario, args, shard_index):
+    """Выполняет шард в процессе пула."""
+    if args.quiet:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            return run_one(scenario, args, shard_index, args.shards)
+    return run_one(scenario, args, shard_index, args.shards)
+
+def run_sharded(scenario, args):
+    """
+    Выполняет сценарий в args.shards процессах. Шарды - независимые симуляции: у каждого своя
+    цепочка, валидаторы (ФО шарда), пользователи и БД, обмена транзакциями и сообщениями
+    консенсуса между ними нет. Поэтому режим требует --local-events (переводы между ФО не
+    генерируются), а результаты не описывают одну общую цепочку: действительность цепочки
+    и пропускная способность приводятся только по шардам.
+
+    Returns:
+        dict: Суммы счётчиков по шардам и результаты каждого шарда ('shards').
+    """
+    num_shards = min(args.shards, get_run_size(scenario, args)[1]) # В каждом шарде хотя бы одна ФО
+    args = argparse.Namespace(**{**vars(args), 'shards': num_shards})
+    # spawn: дочерние процессы не наследуют потоки записи в БД и диспетчеры сети родителя
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=num_shards, mp_context=context) as executor:
+        shards = list(executor.map(_run_shard, [scenario] * num_shards, [args] * num_shards, range(num_shards)))
+
+    result = {key: shards[0][key] for key in ('scenario', 'duration', 'storage_profile', 'pipelined',
+                                              'shared_mempool', 'virtual_time')}
+    for key in ('num_users', 'num_fos', 'expected_transactions', 'blocks', 'committed_transactions',
+                'messages_sent', 'messages_delivered', 'generated_transactions', 'events_processed'):
+        result[key] = sum(shard[key] for shard in shards)
+    result.update({
+        'mode': 'independent_shards',
+        'seed': args.seed,
+        'num_shards': num_shards,
+        'wall_time': max(shard['wall_time'] for shard in shards),
+        'invalid_shards': [index for index, shard in enumerate(shards) if not shard['chain_valid']],
+        'shards': shards,
+    })
+    return result
+
+def run_self_check(db_dir):
+    """
+    Сквозная проверка: перевод пользователя, обменявшего безналичные средства на цифровые,
+    должен быть закоммичен консенсусом в базовом и конвейерном режимах.
+
+    Returns:
+        bool: True, если в обоих режимах перевод попал в цепочку, а цепочка действительна.
+    """
+    passed = True
+    for pipelined in (False, True):
+        db_file = os.path.join(os.path.abspath(db_dir), f"self_check_{datetime.now():%Y%m%d_%H%M%S_%f}.db")
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            db_manager, chain, _, fos, users, replicas, network, _ = simulation.initialize_simulation(
+                num_users=8, num_fos=4, scenario="low", pipelined_consensus=pipelined,
+                storage_profile='benchmark', db_path=f"sqlite:///{db_file}", seed=0,
+            )
+            fo_instance = max(fos.values(), key=lambda fo: len(fo.users))
+            sender_id, recipient_id = sorted(fo_instance.users)[:2]
+            submitted = simulation._submit_fo_transaction(fo_instance, sender_id, recipient_id, 100, db_manager, chain)
+            simulation.run_simulation_loop(replicas, 10, 0, fos, users, db_manager)
+        committed = [tx for tx in chain.get_transactions_by_user(sender_id) if tx['recipient_id'] == recipient_id]
+        ok = submitted and len(committed) == 1 and chain.state.get(recipient_id, 0) >= 100 and chain.is_chain_valid()
+        print(f"[CLI] Самопроверка ({'конвейерный' if pipelined else 'базовый'} режим): "
+              f"{'перевод закоммичен' if ok else 'ОШИБКА - перевод не закоммичен'}.")
+        chain.shutdown()
+        db_manager.close()
+        passed = passed and ok
+    return passed
+
+def committed_nothing(result):
+    """Проверяет, что запуск сгенерировал транзакции, но ни одна из них не попала в цепочку."""
+    return result['generated_transactions'] > 0 and result['committed_transactions'] == 0
+
+def is_run_valid(result):
+    """
+    Проверяет цепочку запуска или, для независимых шардов, цепочки всех шардов. Запуск (шард),
+    в котором при непустой нагрузке не закоммичено ни одной транзакции, также недействителен:
+    его пропускная способность ничего не измеряет.
+    """
+    if result.get('mode') == 'independent_shards':
+        return not result['invalid_shards'] and not any(committed_nothing(shard) for shard in result['shards'])
+    return result['chain_valid'] and not committed_nothing(result)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.self_check:
+        os.makedirs(args.db_dir or '.', exist_ok=True)
+        return 0 if run_self_check(args.db_dir or '.') else 1
+    results = []
+    for scenario in args.scenario:
+        started_at = datetime.now().isoformat(timespec='seconds')
+        try:
+            if args.shards > 1:
+                result = run_sharded(scenario, args)
+            elif args.quiet:
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    result = run_one(scenario, args)
+            else:
+                result = run_one(scenario, args)
+        except KeyboardInterrupt:
+            simulation.stop_simulation()
+            print(f"[CLI] Сценарий {scenario} прерван.")
+            break
+        result['started_at'] = started_at
+        results.append(result)
+        if result.get('mode') == 'independent_shards':
+            print(f"[CLI] {scenario}: {result['num_shards']} независимых шардов, блоков {result['blocks']}, "
+                  f"транзакций в блоках {result['committed_transactions']}, "
+                  f"{result['wall_time']:.2f} сек. реального времени, недействительные цепочки шардов: "
+                  f"{result['invalid_shards'] or 'нет'}.")
+        else:
+            print(f"[CLI] {scenario}: блоков {result['blocks']}, транзакций в блоках {result['committed_transactions']}, "
+                  f"{result['wall_time']:.2f} сек. реального времени, цепочка "
+                  f"{'действительна' if result['chain_valid'] else 'НЕДЕЙСТВИТЕЛЬНА'}.")
+            if result['mining_hashes_per_second'] is not None:
+                print(f"[CLI] {scenario}: майнинг (процессов: {result['mining_workers']}): "
+                      f"{result['mining_hashes_per_second']:.0f} хеш/с.")
+        shard_results = result['shards'] if result.get('mode') == 'independent_shards' else [result]
+        for index, shard in enumerate(shard_results):
+            if committed_nothing(shard):
+                where = f"шард {index}" if result.get('mode') == 'independent_shards' else "запуск"
+                print(f"[ERROR] {scenario}: {where} сгенерировал {shard['generated_transactions']} транзакций, "
+                      f"но ни одна не закоммичена - throughput_tps не отражает пропускную способность.")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"[CLI] Результаты записаны в {args.output}")
+    return 0 if results and all(is_run_valid(result) for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,44 @@
 import hashlib
+import struct
+import threading
 import time
-import json
 from . import utils
+from . import codec
 from . import transaction
+from . import mining
+from . import state
+from . import verifier
+
+EMISSION_SENDER_ID = "CENTRAL_BANK_MINT" # Условный ID отправителя транзакций эмиссии
+
+def _get_tx_field(tx, field):
+    """
+    Возвращает поле транзакции, представленной объектом Transaction или словарём из пула ФО.
+    """
+    if isinstance(tx, dict):
+        return tx.get(field)
+    return getattr(tx, field, None)
+
+def calculate_transaction_hash(tx):
+    """
+    Вычисляет хеш транзакции - лист дерева Меркла - по её каноническому бинарному представлению.
+    Статус не учитывается, так как он меняется после включения транзакции в блок.
+    """
+    if isinstance(tx, dict):
+        tx = transaction.Transaction.from_dict(tx)
+    return tx.calculate_hash()
 
 class Block:
     """
     Класс, представляющий блок в блокчейне.
     Содержит транзакции типа Transaction.
+    Хеш блока вычисляется только по заголовку фиксированного формата,
+    а транзакции входят в него через корень дерева Меркла.
     """
+    # Формат заголовка: index (8 байт), previous_hash (32), merkle_root (32), timestamp (8), nonce (8)
+    HEADER_PREFIX_FORMAT = '>Q32s32sd'
+    NONCE_FORMAT = mining.NONCE_FORMAT
+
     def __init__(self, index, previous_hash, transactions, timestamp=None, nonce=0):
         self.index = index
         self.previous_hash = previous_hash
@@ -16,70 +46,208 @@ class Block:
         self.transactions = transactions
         self.timestamp = timestamp or time.time()
         self.nonce = nonce
+        # Хеши транзакций и корень Меркла считаются один раз на блок
+        self.tx_hashes = [calculate_transaction_hash(tx) for tx in self.transactions]
+        self.merkle_root = utils.merkle_root(self.tx_hashes)
         # Вычисляем хеш при создании
         self.hash = self.calculate_hash()
 
+    def calculate_merkle_root(self):
+        """
+        Заново вычисляет корень Меркла по текущему содержимому транзакций.
+        Используется при проверке целостности, а не при майнинге.
+        """
+        return utils.merkle_root([calculate_transaction_hash(tx) for tx in self.transactions])
+
+    def get_header_prefix(self):
+        """
+        Возвращает байты заголовка блока без nonce.
+        """
+        return struct.pack(
+            self.HEADER_PREFIX_FORMAT,
+            self.index,
+            utils.hash_to_bytes(self.previous_hash),
+            utils.hash_to_bytes(self.merkle_root),
+            float(self.timestamp),
+        )
+
     def calculate_hash(self):
         """
-        Вычисляет хеш блока на основе его содержимого.
-        Использует функцию из utils для единообразия.
+        Вычисляет хеш блока по заголовку (без повторной сериализации транзакций).
         """
-        # Подготовим данные для хеширования
-        # Преобразуем список транзакций в список словарей для сериализации
-        tx_list = [tx.to_dict() for tx in self.transactions]
-        block_data = {
-            'index': self.index,
-            'previous_hash': self.previous_hash,
-            'transactions': tx_list,
-            'timestamp': self.timestamp,
-            'nonce': self.nonce,
-        }
-        # Сериализуем данные в строку
-        block_string = json.dumps(block_data, sort_keys=True, ensure_ascii=False).encode('utf-8')
-        # Вычисляем хеш
-        return utils.calculate_hash(block_data) # Передаём словарь, функция сама его сериализует
+        header = self.get_header_prefix() + struct.pack(self.NONCE_FORMAT, self.nonce)
+        return hashlib.sha256(header).hexdigest()
 
-    def mine_block(self, difficulty=2):
+    def mine_block(self, difficulty=2, miner=None):
         """
         (Упрощённая) добыча блока - находит хеш, начинающийся с N нулей.
+        Префикс заголовка хешируется один раз, на каждой попытке добавляется только nonce.
+
+        Args:
+            difficulty (int): Количество ведущих нулей в хеше.
+            miner (mining.ParallelMiner, optional): Многопроцессный майнер.
+                Если не указан, перебор идёт в текущем потоке.
+
+        Returns:
+            dict: Статистика майнинга: попытки, время (сек) и скорость (хеш/с).
         """
         target = '0' * difficulty
         print(f"[INFO] Начинается майнинг блока {self.index}...")
         start_time = time.time()
-        while self.hash[:difficulty] != target:
-            self.nonce += 1
-            self.hash = self.calculate_hash()
-        end_time = time.time()
+        attempts = 0
+        if self.hash[:difficulty] == target:
+            pass # Хеш уже удовлетворяет сложности
+        elif miner is not None:
+            self.nonce, self.hash = miner.mine(self.get_header_prefix(), difficulty, self.nonce + 1)
+            attempts = miner.last_attempts
+        else:
+            prefix_hasher = hashlib.sha256(self.get_header_prefix())
+            while self.hash[:difficulty] != target:
+                self.nonce += 1
+                hasher = prefix_hasher.copy()
+                hasher.update(struct.pack(self.NONCE_FORMAT, self.nonce))
+                self.hash = hasher.hexdigest()
+                attempts += 1
+        elapsed = time.time() - start_time
+        hashes_per_second = attempts / elapsed if elapsed > 0 else 0.0
         print(f"[INFO] Блок {self.index} добыт! Hash: {self.hash}")
-        print(f"[INFO] Время майнинга блока {self.index}: {end_time - start_time:.4f} секунд.")
+        print(f"[INFO] Время майнинга блока {self.index}: {elapsed:.4f} секунд, "
+              f"{attempts} попыток ({hashes_per_second:.0f} хеш/с).")
+        if miner is not None and attempts:
+            # Скорость пула измеряется без учёта запуска процессов
+            hashes_per_second = miner.last_hashes_per_second
+        return {'attempts': attempts, 'elapsed': elapsed, 'hashes_per_second': hashes_per_second}
+
+    def get_merkle_proof(self, tx_id):
+        """
+        Возвращает доказательство включения транзакции в блок.
+
+        Returns:
+            dict | None: {'tx_hash', 'proof', 'merkle_root'} или None, если транзакции нет в блоке.
+        """
+        for position, tx in enumerate(self.transactions):
+            if _get_tx_field(tx, 'id') == tx_id:
+                return {
+                    'tx_hash': self.tx_hashes[position],
+                    'proof': utils.merkle_proof(self.tx_hashes, position),
+                    'merkle_root': self.merkle_root,
+                }
+        return None
+
+    def encode(self):
+        """
+        Возвращает каноническое бинарное представление блока: поля заголовка и транзакции
+        (каждая - Transaction.encode() с префиксом длины). Корень Меркла и хеш не кодируются -
+        они однозначно вычисляются из содержимого при декодировании.
+        """
+        writer = codec.Writer()
+        writer.write_uint(self.index)
+        writer.write_str(self.previous_hash)
+        writer.write_double(self.timestamp)
+        writer.write_uint(self.nonce)
+        writer.write_uint(len(self.transactions))
+        for tx in self.transactions:
+            if isinstance(tx, dict):
+                tx = transaction.Transaction.from_dict(tx)
+            writer.write_bytes(tx.encode())
+        return writer.getvalue()
+
+    @classmethod
+    def decode(cls, data):
+        """
+        Восстанавливает блок из представления encode(); корень Меркла и хеш пересчитываются.
+        """
+        reader = codec.Reader(data)
+        index = reader.read_uint()
+        previous_hash = reader.read_str()
+        timestamp = reader.read_double()
+        nonce = reader.read_uint()
+        transactions = [transaction.Transaction.decode(reader.read_bytes()) for _ in range(reader.read_uint())]
+        if not reader.at_end():
+            raise ValueError("Лишние байты после блока")
+        return cls(index, previous_hash, transactions, timestamp=timestamp, nonce=nonce)
 
-    def to_dict(self):
+    @classmethod
+    def from_stored(cls, block_data):
+        """
+        Восстанавливает блок, сохранённый в БД без канонического представления
+        (см. DatabaseManager.iter_full_blocks). Хеш и корень Меркла берутся из хранилища;
+        вызывающий код сверяет их с пересчитанными по содержимому блока.
+        """
+        block = cls.__new__(cls)
+        block.index = block_data['index']
+        block.previous_hash = block_data['previous_hash']
+        block.transactions = [transaction.Transaction.from_dict(tx) for tx in block_data['transactions']]
+        block.timestamp = block_data['timestamp']
+        block.nonce = block_data['nonce']
+        block.tx_hashes = [calculate_transaction_hash(tx) for tx in block.transactions]
+        block.merkle_root = block_data.get('merkle_root') or utils.merkle_root(block.tx_hashes)
+        block.hash = block_data['hash']
+        return block
+
+    def to_dict(self, include_data=False):
         """
         Возвращает словарь с данными блока.
         Транзакции также преобразуются в словари.
+
+        Args:
+            include_data (bool): Добавить каноническое представление блока (поле 'data') для хранения в БД.
         """
-        return {
+        block_data = {
             'index': self.index,
             'previous_hash': self.previous_hash,
             'transactions': [tx.to_dict() for tx in self.transactions],
             'timestamp': self.timestamp,
             'nonce': self.nonce,
+            'merkle_root': self.merkle_root,
             'hash': self.hash,
         }
+        if include_data:
+            block_data['data'] = self.encode()
+        return block_data
 
 class Blockchain:
     """
     Класс, представляющий цепочку блоков (блокчейн).
     Теперь отслеживает состояние балансов и валидирует транзакции.
+    Изменения цепочки и состояния (add_block, apply_emission) и проверки поверх состояния выполняются
+    под self.lock: реплики консенсуса обращаются к общей цепочке из разных потоков-диспетчеров.
     """
-    def __init__(self, difficulty=2):
+    def __init__(self, difficulty=2, mining_workers=1, db_manager=None, snapshot_interval=0, verify_workers=1):
+        """
+        Args:
+            difficulty (int): Сложность майнинга (количество ведущих нулей).
+            mining_workers (int): Количество процессов для поиска nonce.
+                При значении больше 1 используется mining.ParallelMiner.
+            db_manager (DatabaseManager, optional): Хранилище снимков состояния. Если задано,
+                цепочка восстанавливается из последнего снимка и последующих блоков БД.
+            snapshot_interval (int): Снимать состояние каждые N блоков (0 - только генезис).
+            verify_workers (int): Количество процессов для проверки цепочки (см. verifier.ChainVerifier).
+        """
         self.chain = []
+        self.lock = threading.RLock() # Повторно входимая: add_block снимает снимок, seed_balances вызывает apply_emission
         self.difficulty = difficulty
+        self.miner = mining.ParallelMiner(mining_workers) if mining_workers and mining_workers > 1 else None
+        self.mining_workers = self.miner.workers if self.miner is not None else 1
+        self.mining_stats = None # Статистика майнинга генезис-блока (см. Block.mine_block)
         # Состояние балансов пользователей {user_id: balance}
         self.state = {}
+        # Балансы, не выводимые из блоков цепочки в памяти: снимок, из которого восстановлена цепочка,
+        # и эмиссия. Используются при повторном применении балансов в is_chain_valid
+        self.base_state = {}
         # Состояние кошельков {user_id: {'digital': status, 'offline': status}}
         self.wallet_state = {}
-        self.create_genesis_block()
+        # Индексы по подтверждённым транзакциям, пополняются при добавлении блоков
+        self.tx_index = {} # {tx_id: (позиция блока в цепи, позиция транзакции в блоке)}
+        self.account_index = {} # {user_id: [(позиция блока, позиция транзакции), ...]} в порядке цепи
+        self.tx_history = [] # [(позиция блока, позиция транзакции), ...] в порядке цепи
+        self.db_manager = db_manager
+        self.snapshot_interval = snapshot_interval
+        # True, если цепочка восстановлена из снимка в БД (данные прошлого запуска продолжаются)
+        self.restored_from_db = self.restore_from_db()
+        if not self.restored_from_db:
+            self.create_genesis_block()
+        self.verifier = verifier.ChainVerifier(self, workers=verify_workers)
 
     def create_genesis_block(self):
         """
@@ -94,9 +262,112 @@ class Blockchain:
         # Давайте создадим пустой генезис-блок.
         genesis_transactions = []
         genesis_block = Block(0, "0", genesis_transactions)
-        genesis_block.mine_block(self.difficulty)
+        self.mining_stats = genesis_block.mine_block(self.difficulty, miner=self.miner)
         self.chain.append(genesis_block)
+        self._index_block(genesis_block, 0)
         print(f"[INFO] Генезис-блок создан и добавлен. Hash: {genesis_block.hash}")
+        if self.db_manager is not None:
+            # Генезис и пустой снимок на нулевой высоте - точка восстановления для следующего запуска
+            self.db_manager.save_block(genesis_block.to_dict(include_data=True))
+            self.save_snapshot()
+
+    def save_snapshot(self):
+        """
+        Сохраняет снимок балансов и состояния кошельков на высоте последнего блока.
+        """
+        if self.db_manager is None:
+            return
+        with self.lock:
+            latest_block = self.get_latest_block()
+            data = state.encode_snapshot(self.state, self.wallet_state)
+            self.db_manager.save_state_snapshot(latest_block.index, latest_block.hash, data)
+
+    def restore_from_db(self):
+        """
+        Восстанавливает цепочку из последнего снимка состояния в БД:
+        загружает балансы и кошельки на высоте снимка и повторно применяет только последующие блоки.
+        Цепочка в памяти начинается с блока снимка.
+
+        Returns:
+            bool: True, если снимок найден и цепочка восстановлена.
+        """
+        if self.db_manager is None:
+            return False
+        snapshot = self.db_manager.get_latest_state_snapshot()
+        if snapshot is None:
+            return False
+        self.state, self.wallet_state = state.decode_snapshot(snapshot['data'])
+        self.base_state = dict(self.state)
+        emissions = self._load_emissions()
+        replayed = 0
+        for block_data in self.db_manager.iter_full_blocks(snapshot['height']):
+            if block_data.get('data') is not None:
+                block = Block.decode(block_data['data'])
+            elif len(block_data['transactions']) != block_data['tx_count']:
+                print(f"[WARN] В БД не хватает транзакций блока {block_data['index']}, восстановление остановлено.")
+                break
+            else:
+                block = Block.from_stored(block_data)
+            # Блок без канонического представления перепроверяется так же, как декодированный:
+            # если содержимое в БД не воспроизводит сохранённые корень Меркла и хеш, блок отклоняется
+            if (block.hash != block_data['hash'] or block.merkle_root != block.calculate_merkle_root()
+                    or block.hash != block.calculate_hash()):
+                print(f"[WARN] Хеш блока {block_data['index']} в БД не совпадает с его содержимым, восстановление остановлено.")
+                break
+            for tx in block.transactions:
+                tx.status = 'CONFIRMED'
+            if not self.chain:
+                # Блок снимка: его транзакции уже учтены в балансах
+                self.chain.append(block)
+                self._index_block(block, 0)
+                self._apply_stored_emissions(emissions, block.hash)
+                continue
+            if block.previous_hash != self.get_latest_block().hash:
+                print(f"[WARN] Блок {block.index} в БД не продолжает цепочку, восстановление остановлено.")
+                break
+            state_delta = self._build_state_delta(block)
+            if state_delta is None:
+                print(f"[WARN] Блок {block.index} в БД не проходит проверку балансов, восстановление остановлено.")
+                break
+            self.chain.append(block)
+            state_delta.commit()
+            self._index_block(block, len(self.chain) - 1)
+            self._apply_stored_emissions(emissions, block.hash)
+            replayed += 1
+        if not self.chain:
+            # Блок снимка не прошёл проверку - цепочка создаётся заново
+            self.state, self.wallet_state, self.base_state = {}, {}, {}
+            return False
+        print(f"[INFO] Цепочка восстановлена из снимка на высоте {snapshot['height']}, "
+              f"повторно применено блоков: {replayed}. Последний блок: {self.get_latest_block().index}.")
+        return True
+
+    def _load_emissions(self):
+        """
+        Загружает из БД эмиссии, сохранённые apply_emission.
+
+        Returns:
+            dict: {хеш блока, после которого зачислена эмиссия: [(получатель, сумма), ...]}.
+        """
+        emissions = {}
+        for tx_data in self.db_manager.query_transactions(filters={'sender_id': EMISSION_SENDER_ID}, order='timestamp'):
+            emissions.setdefault(tx_data['block_hash'], []).append((tx_data['recipient_id'], int(tx_data['amount'])))
+        return emissions
+
+    def _apply_stored_emissions(self, emissions, block_hash):
+        """
+        Зачисляет эмиссии, выполненные после блока block_hash: эмиссия не входит в блоки,
+        поэтому без неё повторное применение последующих блоков не прошло бы проверку балансов.
+        """
+        for recipient_id, amount in emissions.get(block_hash, ()):
+            self.state[recipient_id] = self.state.get(recipient_id, 0) + amount
+            self.base_state[recipient_id] = self.base_state.get(recipient_id, 0) + amount
+
+    def shutdown(self):
+        """Останавливает пулы процессов проверки цепочки и майнинга."""
+        self.verifier.shutdown()
+        if self.miner is not None:
+            self.miner.shutdown()
 
     def get_latest_block(self):
         """
@@ -104,37 +375,120 @@ class Blockchain:
         """
         return self.chain[-1]
 
-    def validate_block_transactions(self, block):
+    def validate_block_transactions(self, block, ancestors=()):
         """
         Проверяет корректность транзакций в блоке.
         Включает проверку балансов отправителей.
+
+        Args:
+            block (Block): Проверяемый блок.
+            ancestors (list, optional): Незакоммиченные предки блока от старшего к младшему
+                (конвейерный режим). Блок проверяется поверх их изменений состояния.
+        """
+        with self.lock:
+            pending_state = self._build_pending_state(ancestors)
+            if pending_state is None:
+                return False
+            return self._build_state_delta(block, *pending_state) is not None
+
+    def select_valid_transactions(self, transactions, ancestors=()):
+        """
+        Отбирает транзакции, которые можно включить в новый блок поверх незакоммиченных предков.
+        Недействительные транзакции (повторы, недостаточно средств) пропускаются.
+
+        Returns:
+            list: Транзакции для блока или None, если недействительны сами предки.
         """
-        temp_state = self.state.copy() # Работаем с копией состояния для проверки
+        with self.lock:
+            pending_state = self._build_pending_state(ancestors)
+            if pending_state is None:
+                return None
+            base_state, seen_ids = pending_state
+            temp_state = state.StateOverlay(base_state)
+            selected = []
+            for tx in transactions:
+                error = self._apply_transaction(temp_state, tx, seen_ids)
+                if error:
+                    print(f"[WARN] Транзакция {tx.id} не включена в блок: {error}")
+                    continue
+                selected.append(tx)
+            return selected
+
+    def _build_pending_state(self, ancestors):
+        """
+        Накладывает изменения незакоммиченных предков на текущее состояние журналами StateOverlay
+        (каждый следующий поверх предыдущего).
+
+        Returns:
+            tuple: (состояние с изменениями предков, ID их транзакций) или None, если предок недействителен.
+        """
+        pending_state = self.state
+        seen_ids = set()
+        for ancestor in ancestors:
+            pending_state = self._build_state_delta(ancestor, pending_state, seen_ids)
+            if pending_state is None:
+                return None
+        return pending_state, seen_ids
+
+    def _build_state_delta(self, block, base_state=None, seen_ids=None):
+        """
+        Проверяет транзакции блока поверх текущего состояния, не копируя его:
+        изменённые балансы записываются в журнал StateOverlay (только затронутые счета).
+
+        Args:
+            block (Block): Проверяемый блок.
+            base_state (optional): Состояние, поверх которого проверяется блок. По умолчанию - self.state.
+            seen_ids (set, optional): ID транзакций незакоммиченных предков; дополняется ID транзакций блока.
+
+        Returns:
+            state.StateOverlay: Представление с изменениями блока или None, если блок недействителен.
+        """
+        temp_state = state.StateOverlay(self.state if base_state is None else base_state)
+        if seen_ids is None:
+            seen_ids = set()
 
         for tx in block.transactions:
-            sender_id = tx.sender_id
-            recipient_id = tx.recipient_id
-            amount = tx.amount
-
-            # Проверяем, что у отправителя достаточно средств
-            sender_balance = temp_state.get(sender_id, 0)
-            if sender_balance < amount:
-                print(f"[ERROR] Недостаточно средств для транзакции {tx.id}. Баланс {sender_id}: {sender_balance}, Сумма: {amount}")
-                return False
+            error = self._apply_transaction(temp_state, tx, seen_ids)
+            if error:
+                print(f"[ERROR] Блок {block.index}: {error}")
+                return None
 
-            # Обновляем временные балансы
-            temp_state[sender_id] = sender_balance - amount
-            temp_state[recipient_id] = temp_state.get(recipient_id, 0) + amount
+        # Если все транзакции валидны, возвращаем журнал изменений
+        return temp_state
 
-        # Если все транзакции валидны, возвращаем True
-        return True
+    def _apply_transaction(self, temp_state, tx, seen_ids):
+        """
+        Применяет транзакцию к временному состоянию.
+
+        Returns:
+            str: Описание ошибки или None, если транзакция применена.
+        """
+        # Одна транзакция не может входить в блок дважды или повторно попасть в цепочку
+        if tx.id in seen_ids or tx.id in self.tx_index:
+            return f"Транзакция {tx.id} повторяется или уже есть в цепочке."
+
+        sender_id = tx.sender_id
+        recipient_id = tx.recipient_id
+        amount = tx.amount
+
+        # Проверяем, что у отправителя достаточно средств
+        sender_balance = temp_state.get(sender_id, 0)
+        if sender_balance < amount:
+            return f"Недостаточно средств для транзакции {tx.id}. Баланс {sender_id}: {sender_balance}, Сумма: {amount}"
+        seen_ids.add(tx.id)
 
-        def add_block(self, new_block):
-            """
-            Добавляет новый блок в цепочку после валидации.
-            """
+        # Обновляем временные балансы
+        temp_state[sender_id] = sender_balance - amount
+        temp_state[recipient_id] = temp_state.get(recipient_id, 0) + amount
+        return None
+
+    def add_block(self, new_block):
+        """
+        Добавляет новый блок в цепочку после валидации.
+        """
+        with self.lock:
             new_block.previous_hash = self.get_latest_block().hash
-            # new_block.mine_block(self.difficulty) # Вызовите это перед add_block, если хотите майнить здесь
+            # new_block.mine_block(self.difficulty, miner=self.miner) # Вызовите это перед add_block, если хотите майнить здесь
             new_block.hash = new_block.calculate_hash()
 
             # Проверяем целостность цепи
@@ -142,56 +496,68 @@ class Blockchain:
                 print(f"[ERROR] previous_hash блока {new_block.index} не совпадает с хешем последнего блока цепи.")
                 return False
 
+            # Проверяем, что корень Меркла соответствует транзакциям блока
+            if new_block.merkle_root != new_block.calculate_merkle_root():
+                print(f"[ERROR] Корень Меркла блока {new_block.index} не соответствует его транзакциям.")
+                return False
+
             # Проверяем вычисленный хеш
             if new_block.hash != new_block.calculate_hash():
                 print(f"[ERROR] Вычисленный хеш блока {new_block.index} не совпадает с сохранённым.")
                 return False
 
             # Проверяем транзакции в блоке
-            if not self.validate_block_transactions(new_block):
+            state_delta = self._build_state_delta(new_block)
+            if state_delta is None:
                 print(f"[ERROR] Транзакции в блоке {new_block.index} недействительны.")
                 return False
 
             # Если все проверки пройдены, добавляем блок
             self.chain.append(new_block)
-            # Применяем транзакции к глобальному состоянию
+            # Применяем изменения балансов блока к глобальному состоянию
+            state_delta.commit()
             for tx in new_block.transactions:
-                sender_id = tx.sender_id
-                recipient_id = tx.recipient_id
-                amount = tx.amount
-
-                # Обновляем состояние балансов (псевдокод, зависит от реализации)
-                # self.state[sender_id] = self.state.get(sender_id, 0) - amount
-                # self.state[recipient_id] = self.state.get(recipient_id, 0) + amount
                 # Обновляем статус транзакции
                 tx.status = 'CONFIRMED'
+            self._index_block(new_block, len(self.chain) - 1)
 
             print(f"[INFO] Блок {new_block.index} успешно добавлен в цепочку. Hash: {new_block.hash}")
+            if self.snapshot_interval and new_block.index % self.snapshot_interval == 0:
+                self.save_snapshot()
             return True
 
-
-    def is_chain_valid(self):
+    def _index_block(self, block, position):
         """
-        Проверяет целостность всей цепочки блоков.
+        Добавляет транзакции блока в индексы tx_index, account_index и tx_history.
+
+        Args:
+            block (Block): Добавленный блок.
+            position (int): Позиция блока в self.chain.
         """
-        for i in range(1, len(self.chain)):
-            current_block = self.chain[i]
-            previous_block = self.chain[i-1]
+        for offset, tx in enumerate(block.transactions):
+            location = (position, offset)
+            self.tx_index[tx.id] = location
+            self.account_index.setdefault(tx.sender_id, []).append(location)
+            if tx.recipient_id != tx.sender_id:
+                self.account_index.setdefault(tx.recipient_id, []).append(location)
+            self.tx_history.append(location)
 
-            # Проверяем, совпадает ли хеш текущего блока с вычисленным
-            if current_block.hash != current_block.calculate_hash():
-                print(f"[ERROR] Хеш блока {i} недействителен.")
-                return False
+    def _get_transaction_at(self, location):
+        """Возвращает транзакцию по позиции (блок, смещение) из индекса."""
+        position, offset = location
+        return self.chain[position].transactions[offset]
 
-            # Проверяем, совпадает ли previous_hash текущего блока с хешем предыдущего
-            if current_block.previous_hash != previous_block.hash:
-                print(f"[ERROR] previous_hash блока {i} не совпадает с хешем блока {i-1}.")
-                return False
+    def is_chain_valid(self, replay_balances=False):
+        """
+        Проверяет целостность цепочки блоков: связность, корни Меркла и хеши.
+        Проверка инкрементальная - блоки, проверенные предыдущим вызовом, не пересчитываются
+        (см. verifier.ChainVerifier).
 
-        # Проверяем, что состояние балансов соответствует истории транзакций
-        # Это сложная проверка, но в упрощённой версии можно считать, что если
-        # блоки прошли add_block, то состояние корректно.
-        # Для полной проверки нужно пройти всю цепочку и пересчитать балансы.
+        Args:
+            replay_balances (bool): Дополнительно повторно применить транзакции и сверить балансы.
+        """
+        if not self.verifier.verify(replay_balances=replay_balances):
+            return False
         print("[INFO] Цепочка блоков действительна.")
         return True
 
@@ -203,46 +569,85 @@ class Blockchain:
 
     def find_transaction_by_id(self, tx_id):
         """
-        Ищет транзакцию по её ID во всей цепочке.
+        Ищет транзакцию по её ID через индекс tx_index за O(1).
         """
-        for block in self.chain:
-            for tx in block.transactions:
-                if tx.id == tx_id:
-                    return tx
-        return None
+        location = self.tx_index.get(tx_id)
+        if location is None:
+            return None
+        return self._get_transaction_at(location)
+
+    def get_merkle_proof(self, tx_id):
+        """
+        Возвращает доказательство включения транзакции в цепочку
+        (индекс и хеш блока, путь по дереву Меркла).
+        """
+        location = self.tx_index.get(tx_id)
+        if location is None:
+            return None
+        block = self.chain[location[0]]
+        proof = block.get_merkle_proof(tx_id)
+        if proof:
+            proof['block_index'] = block.index
+            proof['block_hash'] = block.hash
+        return proof
 
     def get_transactions_by_user(self, user_id):
         """
         Возвращает все транзакции, в которых участвовал пользователь (в качестве отправителя или получателя).
+        Использует индекс account_index: O(k), где k - число транзакций пользователя.
         """
-        user_transactions = []
-        for block in self.chain:
-            for tx in block.transactions:
-                if tx.sender_id == user_id or tx.recipient_id == user_id:
-                    user_transactions.append(tx.to_dict()) # Возвращаем словарь для UI
-        return user_transactions
+        return [self._get_transaction_at(location).to_dict() # Возвращаем словарь для UI
+                for location in self.account_index.get(user_id, ())]
 
     def get_current_state(self):
         """
         Возвращает текущее состояние балансов.
         """
-        return self.state.copy()
+        with self.lock:
+            return self.state.copy()
 
     def get_current_wallet_state(self):
         """
         Возвращает текущее состояние кошельков.
         """
-        return self.wallet_state.copy()
+        with self.lock:
+            return self.wallet_state.copy()
 
-    def get_transaction_history(self):
+    def get_transaction_history(self, offset=0, limit=None):
         """
-        Возвращает историю всех транзакций.
+        Возвращает страницу истории транзакций в порядке цепи.
+        tx_history хранит только позиции транзакций в блоках, в словари преобразуется лишь запрошенная страница.
+
+        Args:
+            offset (int): Сколько транзакций от начала истории пропустить.
+            limit (int, optional): Размер страницы. По умолчанию - вся история после offset.
         """
-        history = []
-        for block in self.chain:
-            for tx in block.transactions:
-                history.append(tx.to_dict())
-        return history
+        end = None if limit is None else offset + limit
+        return [self._get_transaction_at(location).to_dict() for location in self.tx_history[offset:end]]
+
+    def get_transaction_count(self):
+        """Возвращает количество транзакций в истории (для постраничного вывода)."""
+        return len(self.tx_history)
+
+    def seed_balances(self, balances):
+        """
+        Согласует состояние цепочки с цифровыми балансами пользователей, созданных или загруженных
+        из БД вне цепочки: недостающие на счёте средства зачисляются эмиссией (apply_emission).
+
+        Args:
+            balances (dict): {user_id: цифровой баланс}.
+
+        Returns:
+            int: Количество пополненных счетов.
+        """
+        with self.lock:
+            funded = 0
+            for user_id, balance in balances.items():
+                deficit = balance - self.state.get(user_id, 0)
+                if deficit > 0:
+                    self.apply_emission(user_id, deficit)
+                    funded += 1
+            return funded
 
     def apply_emission(self, recipient_id, amount):
         """
@@ -253,14 +658,22 @@ class Blockchain:
         Лучше всего это интегрировать в процесс консенсуса или в специальный блок эмиссии.
         Пока что просто обновим состояние и вернём транзакцию эмиссии.
         """
-        self.state[recipient_id] = self.state.get(recipient_id, 0) + amount
+        with self.lock:
+            self.state[recipient_id] = self.state.get(recipient_id, 0) + amount
+            self.base_state[recipient_id] = self.base_state.get(recipient_id, 0) + amount
+            latest_hash = self.get_latest_block().hash
         # Создаём транзакцию эмиссии
         emission_tx = transaction.Transaction(
-            sender_id="CENTRAL_BANK_MINT", # Условный ID эмиссии
+            sender_id=EMISSION_SENDER_ID,
             recipient_id=recipient_id,
             amount=amount,
             tx_type=transaction.TransactionType.B2C, # Или другой тип эмиссии
             fo_id="CBR"
         )
         emission_tx.status = 'EMISSION_CONFIRMED'
+        if self.db_manager is not None:
+            # Эмиссия сохраняется с хешем последнего блока: restore_from_db зачислит её после этого блока
+            emission_data = emission_tx.to_dict()
+            emission_data['block_hash'] = latest_hash
+            self.db_manager.save_transaction(emission_data)
         return emission_tx
@@ -0,0 +1,112 @@
+import json
+import struct
+
+# Каноническое бинарное кодирование: все числа - big-endian фиксированной длины,
+# строки и вложенные записи - с префиксом длины. Одинаковые данные всегда дают одинаковые байты.
+LENGTH_FORMAT = '>I'
+NONE_LENGTH = 0xFFFFFFFF # Длина-маркер для отсутствующей строки (None)
+INT_TAG = b'i'
+FLOAT_TAG = b'd'
+
+class Writer:
+    """
+    Накопитель байтов канонического представления.
+    """
+    __slots__ = ('parts',)
+
+    def __init__(self):
+        self.parts = []
+
+    def write_raw(self, data):
+        self.parts.append(data)
+
+    def write_bytes(self, data):
+        """Байты с префиксом длины."""
+        self.parts.append(struct.pack(LENGTH_FORMAT, len(data)))
+        self.parts.append(data)
+
+    def write_str(self, value):
+        """Строка UTF-8 с префиксом длины; None кодируется отдельным маркером."""
+        if value is None:
+            self.parts.append(struct.pack(LENGTH_FORMAT, NONE_LENGTH))
+        else:
+            self.write_bytes(str(value).encode('utf-8'))
+
+    def write_number(self, value):
+        """Число с тегом типа: целые - int64, остальные - double."""
+        if isinstance(value, int):
+            self.parts.append(INT_TAG + struct.pack('>q', value))
+        else:
+            self.parts.append(FLOAT_TAG + struct.pack('>d', value))
+
+    def write_double(self, value):
+        self.parts.append(struct.pack('>d', float(value)))
+
+    def write_uint(self, value):
+        self.parts.append(struct.pack('>Q', value))
+
+    def write_json(self, value):
+        """
+        Произвольные данные (например, additional_data) - JSON с сортировкой ключей и без пробелов.
+        None кодируется нулевой длиной; пустой словарь - как '{}', чтобы их представления различались.
+        """
+        if value is None:
+            self.write_bytes(b'')
+        else:
+            self.write_bytes(json.dumps(value, sort_keys=True, separators=(',', ':'),
+                                        ensure_ascii=False, default=str).encode('utf-8'))
+
+    def getvalue(self):
+        return b''.join(self.parts)
+
+class Reader:
+    """
+    Последовательное чтение канонического представления.
+    """
+    __slots__ = ('data', 'offset')
+
+    def __init__(self, data, offset=0):
+        self.data = memoryview(data)
+        self.offset = offset
+
+    def _unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values[0]
+
+    def read_raw(self, size):
+        if self.offset + size > len(self.data):
+            raise ValueError("Недостаточно данных для декодирования")
+        chunk = bytes(self.data[self.offset:self.offset + size])
+        self.offset += size
+        return chunk
+
+    def read_bytes(self):
+        return self.read_raw(self._unpack(LENGTH_FORMAT))
+
+    def read_str(self):
+        length = self._unpack(LENGTH_FORMAT)
+        if length == NONE_LENGTH:
+            return None
+        return self.read_raw(length).decode('utf-8')
+
+    def read_number(self):
+        tag = self.read_raw(1)
+        if tag == INT_TAG:
+            return self._unpack('>q')
+        if tag == FLOAT_TAG:
+            return self._unpack('>d')
+        raise ValueError(f"Неизвестный тег числа: {tag!r}")
+
+    def read_double(self):
+        return self._unpack('>d')
+
+    def read_uint(self):
+        return self._unpack('>Q')
+
+    def read_json(self):
+        data = self.read_bytes()
+        return json.loads(data.decode('utf-8')) if data else None
+
+    def at_end(self):
+        return self.offset == len(self.data)
@@ -1,6 +1,8 @@
 import time
 import threading
 import hashlib
+import queue
+from collections import deque
 from . import blockchain
 from . import transaction
 from . import utils # Импортируем utils для криптографии
@@ -23,15 +25,139 @@ class QuorumCertificate:
             'signatures': self.signatures
         }
 
+    @classmethod
+    def from_dict(cls, qc_data):
+        return cls(qc_data['view'], qc_data['block_hash'], dict(qc_data['signatures']))
+
+class TimeoutCertificate:
+    """
+    Сертификат таймаута (TC): 2f+1 узлов не дождались прогресса в view и согласны перейти к следующему.
+    """
+    def __init__(self, view, signatures):
+        self.view = view
+        self.signatures = signatures # Словарь {node_id: signature}
+
+    def to_dict(self):
+        return {
+            'view': self.view,
+            'signatures': self.signatures
+        }
+
+    @classmethod
+    def from_dict(cls, tc_data):
+        return cls(tc_data['view'], dict(tc_data['signatures']))
+
+class Pacemaker:
+    """
+    Отслеживает прогресс view и определяет момент таймаута.
+    Таймаут растёт экспоненциально при последовательных неудачных view
+    и сбрасывается к базовому значению после успешного view.
+    Собирает статистику длительности view для оценки потерь из-за сбоев лидеров.
+    """
+    def __init__(self, base_timeout=1.0, backoff_factor=2.0, max_timeout=None, history_size=10000, clock=time.time):
+        """
+        Args:
+            base_timeout (float): Базовый таймаут view (сек).
+            backoff_factor (float): Множитель таймаута после каждого неудачного view.
+            max_timeout (float, optional): Верхняя граница таймаута. По умолчанию 16 * base_timeout.
+            history_size (int): Сколько последних длительностей view хранить для статистики.
+            clock (callable): Источник текущего времени (сек). В симуляции - виртуальные часы движка событий.
+        """
+        self.clock = clock
+        self.base_timeout = base_timeout
+        self.backoff_factor = backoff_factor
+        self.max_timeout = max_timeout or base_timeout * 16
+        self.current_timeout = base_timeout
+        self.consecutive_timeouts = 0
+        self.view = 0
+        self.view_start_time = clock()
+        self.completed_view_latencies = deque(maxlen=history_size) # Длительности успешных view
+        self.timed_out_view_durations = deque(maxlen=history_size) # Длительности view, завершённых таймаутом
+        self.views_completed = 0
+        self.views_timed_out = 0
+        self.time_lost_to_timeouts = 0.0
+        self.lock = threading.Lock()
+
+    def start_view(self, view, timed_out=False):
+        """
+        Фиксирует завершение текущего view и начало нового.
+
+        Args:
+            view (int): Номер нового view.
+            timed_out (bool): True, если предыдущий view завершился по таймауту (через TC).
+        """
+        with self.lock:
+            now = self.clock()
+            duration = now - self.view_start_time
+            if timed_out:
+                self.views_timed_out += 1
+                self.timed_out_view_durations.append(duration)
+                self.time_lost_to_timeouts += duration
+                self.consecutive_timeouts += 1
+                self.current_timeout = min(
+                    self.base_timeout * (self.backoff_factor ** self.consecutive_timeouts),
+                    self.max_timeout
+                )
+            else:
+                self.views_completed += 1
+                self.completed_view_latencies.append(duration)
+                self.consecutive_timeouts = 0
+                self.current_timeout = self.base_timeout
+            self.view = view
+            self.view_start_time = now
+
+    def reset(self, view):
+        """Начинает отсчёт view без записи статистики (например, при запуске узла)."""
+        with self.lock:
+            self.view = view
+            self.view_start_time = self.clock()
+
+    def time_in_view(self):
+        """Возвращает, сколько секунд длится текущий view."""
+        return self.clock() - self.view_start_time
+
+    def is_expired(self):
+        """Проверяет, истёк ли таймаут текущего view."""
+        return self.time_in_view() >= self.current_timeout
+
+    def get_stats(self):
+        """
+        Возвращает статистику по view: количество, средняя/p95 длительность, потери времени на таймауты.
+        """
+        with self.lock:
+            latencies = sorted(self.completed_view_latencies)
+            avg_latency = sum(latencies) / len(latencies) if latencies else None
+            p95_latency = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+            return {
+                'current_view': self.view,
+                'current_timeout': self.current_timeout,
+                'views_completed': self.views_completed,
+                'views_timed_out': self.views_timed_out,
+                'avg_view_latency': avg_latency,
+                'p95_view_latency': p95_latency,
+                'time_lost_to_timeouts': self.time_lost_to_timeouts,
+            }
+
 class Replica:
     """
     Класс, представляющий узел (реплику) в консенсусе HotStuff.
     В нашей модели это будет Финансовая Организация (FO), участвующая в консенсусе.
+
+    Режимы работы:
+        - базовый: лидер предлагает блок раз в round_interval секунд, блок коммитится сразу после QC;
+        - конвейерный (pipelined=True, chained HotStuff): следующий лидер предлагает блок сразу после
+          формирования QC предыдущего, блоки строятся поверх ещё не закоммиченных, а коммит
+          происходит по правилу трёх последовательных QC (фазы соседних блоков перекрываются).
     """
-    def __init__(self, node_id, blockchain_instance, financial_org_instance, validator_set, crypto_instance, db_manager): # Добавлен аргумент db_manager
+    def __init__(self, node_id, blockchain_instance, financial_org_instance, validator_set, crypto_instance, db_manager,
+                 pipelined=False, round_interval=2.0, idle_interval=0.05, base_timeout=None, clock=time.time,
+                 financial_orgs=None):
         self.node_id = node_id
         self.blockchain = blockchain_instance
         self.fo = financial_org_instance # Ссылка на ФО, которая является узлом
+        # Все ФО {fo_id: FinancialOrg}: транзакции отброшенных блоков возвращаются в пул ФО, принявшей их
+        # (если не заданы - в пул собственной ФО узла)
+        self.financial_orgs = financial_orgs
         self.validator_set = validator_set # Объект, хранящий узлы и их веса (упрощённо)
         self.crypto = crypto_instance # Объект для криптографических операций (заглушка)
         self.db_manager = db_manager # Ссылка на db_manager для сохранения блоков
@@ -43,7 +169,20 @@ class Replica:
         self.pending_blocks = {} # {block_hash: Block_object}
         self.pending_qcs = {} # {block_hash: QuorumCertificate_object}
         self.votes = {} # {block_hash: {node_id: signature}}
+        self.commit_view = -1 # View QC, по которому узел последний раз закоммитил блоки (более старые голоса устарели)
         self.lock = threading.Lock()
+        self.pipelined = pipelined
+        self.round_interval = round_interval # Пауза между раундами в базовом режиме (сек)
+        self.idle_interval = idle_interval # Пауза опроса пула в конвейерном режиме, если предлагать нечего (сек)
+        self.last_proposed_view = -1 # Последний view, в котором узел предложил блок
+        # Pacemaker: таймауты view. В базовом режиме лидер может ждать до round_interval, поэтому таймаут больше.
+        if base_timeout is None:
+            base_timeout = 1.0 if pipelined else 3 * round_interval
+        self.clock = clock # Источник времени для таймаутов и меток времени блоков
+        self.pacemaker = Pacemaker(base_timeout=base_timeout, clock=clock)
+        self.high_tc = None # Наивысший известный TC
+        self.timeouts = {} # {view: {node_id: signature}}
+        self.last_timeout_view = -1 # Последний view, для которого узел отправил TIMEOUT
         self._running = True # Флаг для остановки
 
         # Для симуляции: ссылка на сеть (упрощённая)
@@ -53,76 +192,236 @@ class Replica:
         """Устанавливает ссылку на сеть для обмена сообщениями."""
         self.network = network_instance
 
-    def is_primary(self, view, for_node_id=None):
+    def set_clock(self, clock):
         """
-        Проверяет, является ли указанный узел (или self, если не указан) лидером (primary) для данного view.
+        Устанавливает источник времени узла и его pacemaker (например, виртуальные часы движка событий)
+        и начинает отсчёт текущего view заново.
+        """
+        with self.lock:
+            self.clock = clock
+            self.pacemaker.clock = clock
+            self.pacemaker.reset(self.current_view)
+
+    def get_primary_id(self, view):
+        """
+        Возвращает ID лидера (primary) для данного view.
         """
         # Простой способ: round-robin по ID узлов
         sorted_nodes = sorted(self.validator_set.validators.keys())
-        primary_index = view % len(sorted_nodes)
-        primary_id = sorted_nodes[primary_index]
+        return sorted_nodes[view % len(sorted_nodes)]
+
+    def is_primary(self, view, for_node_id=None):
+        """
+        Проверяет, является ли указанный узел (или self, если не указан) лидером (primary) для данного view.
+        """
         node_to_check = for_node_id if for_node_id is not None else self.node_id
-        return primary_id == node_to_check
+        return self.get_primary_id(view) == node_to_check
+
+    def get_quorum_threshold(self):
+        """
+        Возвращает размер кворума (2f+1 голосов).
+        """
+        # f = (len(validators) - 1) // 3
+        f = len(self.validator_set.validators) // 3 # Примерное f
+        return 2 * f + 1
+
+    def _advance_view(self, new_view, timed_out=False):
+        """
+        Переводит узел в новый view и сообщает об этом pacemaker.
+        Вызывается под self.lock.
+        """
+        if new_view <= self.current_view:
+            return
+        self.current_view = new_view
+        self.pacemaker.start_view(new_view, timed_out=timed_out)
+        # Голоса таймаута для прошедших view больше не нужны
+        self.timeouts = {v: t for v, t in self.timeouts.items() if v >= new_view}
+
+    def _has_justification_for(self, view):
+        """
+        Проверяет, есть ли QC или TC предыдущего view, на которые может опереться предложение в view.
+        """
+        return ((self.high_qc is not None and self.high_qc.view == view - 1)
+                or (self.high_tc is not None and self.high_tc.view == view - 1))
 
     def propose_block(self):
         """
         Инициирует создание и отправку сообщения PROPOSE, если этот узел лидер (primary).
+        В предложение включается high_qc - агрегированный этим лидером QC предыдущего view.
         """
         with self.lock:
-            if not self.is_primary(self.current_view):
-                return
+            self._propose_block_locked()
+
+    def _get_parent_block(self):
+        """
+        Возвращает блок, поверх которого строится новое предложение.
+        В конвейерном режиме это блок из high_qc (может быть ещё не закоммичен),
+        иначе - последний блок цепочки.
+        """
+        if self.pipelined and self.high_qc:
+            parent_block = self.pending_blocks.get(self.high_qc.block_hash)
+            if parent_block:
+                return parent_block
+        return self.blockchain.get_latest_block()
 
-            print(f"[HOTSTUFF] Узел {self.node_id} (Primary) начинает формирование блока для view {self.current_view}.")
+    def _get_uncommitted_ancestors(self, block_hash):
+        """
+        Возвращает незакоммиченные блоки от последнего закоммиченного до block_hash включительно
+        (от старшего к младшему).
 
-            # Получаем транзакции из пула ФО
-            transactions_to_include = self.fo.process_pool_for_consensus()
-            if not transactions_to_include:
-                 print(f"[HOTSTUFF] Узел {self.node_id} (Primary) не нашёл транзакций для view {self.current_view}. Пропускает блок.")
-                 # Даже если транзакций нет, всё равно можно предложить пустой блок
-                 transactions_to_include = []
+        Returns:
+            list: Цепочка блоков или None, если она не доходит до последнего закоммиченного блока.
+        """
+        latest_hash = self.blockchain.get_latest_block().hash
+        ancestors = []
+        while block_hash != latest_hash:
+            block = self.pending_blocks.get(block_hash)
+            if block is None:
+                return None
+            ancestors.append(block)
+            block_hash = block.previous_hash
+        ancestors.reverse()
+        return ancestors
+
+    def _prune_pending_blocks(self):
+        """
+        Оставляет в pending_blocks только блоки, продолжающие последний закоммиченный блок:
+        закоммиченные блоки и ответвления от них больше не нужны.
+        """
+        latest_block = self.blockchain.get_latest_block()
+        kept = {}
+        for block_hash, block in sorted(self.pending_blocks.items(), key=lambda item: item[1].index):
+            if block.index > latest_block.index and (block.previous_hash == latest_block.hash
+                                                     or block.previous_hash in kept):
+                kept[block_hash] = block
+        self.pending_blocks = kept
+
+    def _drop_block_with_descendants(self, block):
+        """
+        Удаляет блок, который нельзя закоммитить, вместе с его потомками из pending_blocks,
+        а их транзакции возвращает для повторного предложения в пул ФО, принявшей каждую из них
+        (в общем пуле - в начало очереди отправителя, сохраняя порядок его nonce).
+        """
+        dropped = {block.hash: block}
+        for block_hash, pending_block in sorted(self.pending_blocks.items(), key=lambda item: item[1].index):
+            if pending_block.previous_hash in dropped:
+                dropped[block_hash] = pending_block
+        returned_by_fo = {} # {fo_id: [транзакции в порядке цепочки]}
+        for block_hash, dropped_block in dropped.items():
+            self.pending_blocks.pop(block_hash, None)
+            self.pending_qcs.pop(block_hash, None)
+            self.votes.pop(block_hash, None)
+            for tx in dropped_block.transactions:
+                returned_by_fo.setdefault(tx.fo_id, []).append(tx)
+        returned = 0
+        for fo_id, transactions in returned_by_fo.items():
+            fo_instance = self.fo if self.financial_orgs is None else self.financial_orgs.get(fo_id)
+            if fo_instance is None:
+                print(f"[WARN] Узел {self.node_id}: ФО {fo_id} не найдена, транзакции возвращаются в пул ФО узла.")
+                fo_instance = self.fo
+            returned += fo_instance.return_transactions_to_pool(transactions)
+        if self.high_qc and self.high_qc.block_hash in dropped:
+            # Новые блоки строятся поверх последнего закоммиченного
+            self.high_qc = self.high_commit_qc
+        print(f"[HOTSTUFF] Узел {self.node_id}: Отброшено блоков: {len(dropped)}, "
+              f"транзакций возвращено в пул: {returned}.")
+
+    def _has_uncommitted_transactions(self):
+        """
+        Проверяет, есть ли в конвейере незакоммиченные блоки с транзакциями.
+        Пока они есть, лидер предлагает блоки даже с пустым пулом, чтобы довести их до коммита.
+        """
+        latest_index = self.blockchain.get_latest_block().index
+        return any(b.transactions for b in self.pending_blocks.values() if b.index > latest_index)
 
-            # Создаём блок
-            latest_block = self.blockchain.get_latest_block()
-            new_block = blockchain.Block(
-                index=latest_block.index + 1,
-                previous_hash=latest_block.hash,
-                transactions=transactions_to_include,
-                timestamp=time.time()
-            )
+    def _propose_block_locked(self):
+        """
+        Формирует и рассылает PROPOSE. Вызывается под self.lock.
+        """
+        if not self.is_primary(self.current_view) or self.last_proposed_view >= self.current_view:
+            return
 
-            # Привязываемся к high_qc
-            new_block.parent_qc = self.high_qc.to_dict() if self.high_qc else None
+        view = self.current_view
+        if self.pipelined and view > 0 and not self._has_justification_for(view):
+            # В конвейерном режиме блок предлагается только поверх QC (или TC) предыдущего view
+            return
 
-            block_hash = new_block.calculate_hash()
-            self.pending_blocks[block_hash] = new_block
+        # Получаем транзакции из пула ФО
+        transactions_to_include = self.fo.process_pool_for_consensus()
+        if not transactions_to_include:
+            if (self.pipelined and not self._has_uncommitted_transactions()
+                    and self.pacemaker.time_in_view() < self.pacemaker.base_timeout / 2):
+                # Нечего предлагать и нечего доводить до коммита - ждём транзакций.
+                # Ближе к таймауту лидер предлагает пустой блок, чтобы view не сменялся по таймауту.
+                return
+            print(f"[HOTSTUFF] Узел {self.node_id} (Primary) не нашёл транзакций для view {view}. Предлагает пустой блок.")
+            # Даже если транзакций нет, всё равно можно предложить пустой блок
+            transactions_to_include = []
+
+        print(f"[HOTSTUFF] Узел {self.node_id} (Primary) начинает формирование блока для view {view}.")
+        # Пул ФО хранит словари, в блок включаются объекты Transaction
+        transactions_to_include = [
+            tx if isinstance(tx, transaction.Transaction) else transaction.Transaction.from_dict(tx)
+            for tx in transactions_to_include
+        ]
+
+        # Создаём блок поверх незакоммиченных предков: транзакции проверяются с учётом их изменений,
+        # чтобы блоки конвейера не тратили одни и те же средства дважды
+        self._prune_pending_blocks()
+        parent_block = self._get_parent_block()
+        ancestors = self._get_uncommitted_ancestors(parent_block.hash) or []
+        selected = self.blockchain.select_valid_transactions(transactions_to_include, ancestors)
+        if selected is None:
+            print(f"[HOTSTUFF] Узел {self.node_id}: Незакоммиченные предки блока недействительны. Блок строится поверх цепочки.")
+            self._drop_block_with_descendants(ancestors[0])
+            parent_block = self.blockchain.get_latest_block()
+            selected = self.blockchain.select_valid_transactions(transactions_to_include)
+        transactions_to_include = selected
+        new_block = blockchain.Block(
+            index=parent_block.index + 1,
+            previous_hash=parent_block.hash,
+            transactions=transactions_to_include,
+            timestamp=self.clock()
+        )
+
+        # Привязываемся к high_qc
+        new_block.parent_qc = self.high_qc.to_dict() if self.high_qc else None
+
+        block_hash = new_block.hash
+        self.pending_blocks[block_hash] = new_block
+
+        # Формируем сообщение PROPOSE: блок передаётся в каноническом бинарном виде
+        propose_msg = {
+            'type': 'PROPOSE',
+            'view': view,
+            'block': new_block.encode(),
+            'block_hash': block_hash,
+            'parent_qc': new_block.parent_qc,
+            'sender_id': self.node_id
+        }
 
-            # Формируем сообщение PROPOSE
-            propose_msg = {
-                'type': 'PROPOSE',
-                'view': self.current_view,
-                'block': new_block.to_dict(),
-                'parent_qc': new_block.parent_qc,
-                'sender_id': self.node_id
-            }
+        print(f"[HOTSTUFF] Узел {self.node_id} (Primary) отправляет PROPOSE для блока {new_block.index} (view {view}).")
 
-            print(f"[HOTSTUFF] Узел {self.node_id} (Primary) отправляет PROPOSE для блока {new_block.index} (view {self.current_view}).")
+        # Отправляем всем узлам
+        if self.network:
+            self.network.broadcast_message(propose_msg, exclude_sender=True)
 
-            # Отправляем всем узлам
-            if self.network:
-                self.network.broadcast_message(propose_msg, exclude_sender=True)
+        # Лидер голосует за собственный блок и переходит к следующему view
+        self.last_proposed_view = view
+        self._advance_view(view + 1)
+        self._vote_for_block(block_hash, view)
 
-    def handle_propose(self, msg, parent_qc_=None):
+    def handle_propose(self, msg):
         """
         Обрабатывает сообщение PROPOSE.
         """
         with self.lock:
             view = msg['view']
-            block_data = msg['block']
-            parent_qc_data = msg['parent_qc'] # --- ИСПРАВЛЕНИЕ: переменная определена ---
+            parent_qc_data = msg['parent_qc']
             sender_id = msg['sender_id']
 
-            # Проверяем, что view актуален
-            if view != self.current_view:
+            # Проверяем, что view актуален (предложения из будущих view принимаются - узел догоняет)
+            if view < self.current_view:
                 print(f"[HOTSTUFF] Узел {self.node_id}: Получен PROPOSE для неактуального view {view} (ожидается {self.current_view}).")
                 # Здесь может быть логика для ViewChange, если view устарел
                 return
@@ -132,186 +431,311 @@ class Replica:
                  print(f"[HOTSTUFF] Узел {self.node_id}: Получен PROPOSE от не-лидера {sender_id} для view {view}.")
                  return
 
-            # Валидация блока (упрощённо)
-            # Проверим parent_qc, если он есть
-            # --- ИСПРАВЛЕНИЕ: используем parent_qc_data ---
-            if parent_qc_: # ИСПРАВЛЕНО: if parent_qc_data (проверяет, что переменная не None и не пустая)
-                parent_block_hash = parent_qc_data['block_hash']
-                # В реальной системе проверяется подпись QC
-                print(f"[HOTSTUFF] Узел {self.node_id}: Проверяет parent_qc для блока {block_data['index']}.")
-                # Предположим, проверка прошла успешно
-
-            # Создаём объект Block
+            # Декодируем блок; корень Меркла и хеш пересчитываются по содержимому
             try:
-                new_block = blockchain.Block(
-                    index=block_data['index'],
-                    previous_hash=block_data['previous_hash'],
-                    # transactions - список словарей, нужно преобразовать в объекты Transaction
-                    transactions=[transaction.Transaction(**tx) for tx in block_data['transactions']], # Исправлено: передаём **tx
-                    timestamp=block_data['timestamp'],
-                    nonce=block_data['nonce']
-                )
-                # Устанавливаем хеш, вычисленный при создании объекта Block
-                new_block.hash = block_data['hash']
-                new_block.parent_qc = parent_qc_data # Сохраняем родительский QC
-
-                block_hash = new_block.hash
+                new_block = blockchain.Block.decode(msg['block'])
+            except Exception as e:
+                print(f"[HOTSTUFF] Узел {self.node_id}: Ошибка при декодировании блока из PROPOSE: {e}")
+                return
 
-                # Проверяем, что блок можно применить к текущему состоянию
-                if not self.blockchain.validate_block_transactions(new_block):
-                    print(f"[HOTSTUFF] Узел {self.node_id}: Блок {new_block.index} не прошёл валидацию. Отклоняем.")
+            # Валидация блока (упрощённо)
+            # Проверим parent_qc, если он есть: он агрегирован лидером и заменяет рассылку голосов всем узлам
+            if parent_qc_data:
+                # В реальной системе проверяется подпись QC
+                parent_qc = QuorumCertificate.from_dict(parent_qc_data)
+                if len(parent_qc.signatures) < self.get_quorum_threshold():
+                    print(f"[HOTSTUFF] Узел {self.node_id}: parent_qc блока {new_block.index} не содержит кворума. Отклоняем.")
                     return
+                self._update_high_qc(parent_qc)
+                # Блоки, уже закоммиченные лидером-агрегатором, больше не нужны
+                self._prune_pending_blocks()
 
-                print(f"[HOTSTUFF] Узел {self.node_id}: Принят PROPOSE для блока {new_block.index} (view {view}).")
+            # Проверяем, что хеш соответствует содержимому блока
+            if new_block.hash != msg['block_hash']:
+                print(f"[HOTSTUFF] Узел {self.node_id}: Хеш блока {new_block.index} не совпадает с содержимым. Отклоняем.")
+                return
+            new_block.parent_qc = parent_qc_data # Сохраняем родительский QC
+            block_hash = new_block.hash
+
+            # Проверяем, что блок можно применить к текущему состоянию, а в конвейерном режиме -
+            # к состоянию после его незакоммиченных предков
+            ancestors = []
+            if self.pipelined:
+                ancestors = self._get_uncommitted_ancestors(new_block.previous_hash)
+                if ancestors is None:
+                    print(f"[HOTSTUFF] Узел {self.node_id}: Блок {new_block.index} не продолжает известную цепочку. Отклоняем.")
+                    return
+            if not self.blockchain.validate_block_transactions(new_block, ancestors):
+                print(f"[HOTSTUFF] Узел {self.node_id}: Блок {new_block.index} не прошёл валидацию. Отклоняем.")
+                return
 
-                # Шаг 2: Голосование (Vote)
-                self._vote_for_block(block_hash, view)
+            print(f"[HOTSTUFF] Узел {self.node_id}: Принят PROPOSE для блока {new_block.index} (view {view}).")
+            self.pending_blocks[block_hash] = new_block
 
-            except Exception as e:
-                print(f"[HOTSTUFF] Узел {self.node_id}: Ошибка при создании объекта Block из PROPOSE: {e}")
-                return
+            # Шаг 2: Голосование (Vote) и переход к следующему view
+            self._advance_view(view + 1)
+            self._vote_for_block(block_hash, view)
 
     def _vote_for_block(self, block_hash, view):
         """
         Отправляет сообщение VOTE за указанный блок в указанном view.
+        Голос отправляется только лидеру следующего view, который агрегирует QC
+        (линейный поток сообщений HotStuff: O(n) вместо O(n^2) на блок).
         """
         vote_msg = {
             'type': 'VOTE',
             'view': view,
             'block_hash': block_hash,
-            'sender_id': self.node_id
+            'sender_id': self.node_id,
+            'signature': self.crypto.sign(block_hash, self.node_id),
         }
-        print(f"[HOTSTUFF] Узел {self.node_id} отправляет VOTE за блок {block_hash[:8]} (view {view}).")
+        next_leader_id = self.get_primary_id(view + 1)
+        print(f"[HOTSTUFF] Узел {self.node_id} отправляет VOTE за блок {block_hash[:8]} (view {view}) лидеру {next_leader_id}.")
 
-        # Отправляем лидеру следующего view (или текущему, если голосование в том же view)
-        # В простой модели отправляем всем
-        if self.network:
-            self.network.broadcast_message(vote_msg, exclude_sender=True)
+        if next_leader_id == self.node_id:
+            # Голос за себя обрабатывается без сети (lock уже захвачен вызывающим методом)
+            self._register_vote(vote_msg)
+        elif self.network:
+            self.network.send_message_to(vote_msg, next_leader_id)
 
     def handle_vote(self, msg):
         """
         Обрабатывает сообщение VOTE.
         """
         with self.lock:
-            view = msg['view']
-            block_hash = msg['block_hash']
-            sender_id = msg['sender_id']
+            self._register_vote(msg)
 
-            # Проверяем view
-            if view != self.current_view:
-                 # Голоса для устаревших view игнорируются или обрабатываются по-другому
-                 return
+    def _register_vote(self, msg):
+        """
+        Учитывает голос и формирует QC при наборе кворума.
+        Вызывается под self.lock.
+        """
+        view = msg['view']
+        block_hash = msg['block_hash']
+        sender_id = msg['sender_id']
 
-            # Проверяем, что узел может голосовать (реально проверяется подпись и ключ)
-            if sender_id not in self.validator_set.validators:
-                print(f"[HOTSTUFF] Узел {self.node_id}: Получен VOTE от неизвестного узла {sender_id}.")
-                return
+        # Голоса собирает только лидер следующего view
+        if not self.is_primary(view + 1):
+            print(f"[HOTSTUFF] Узел {self.node_id}: Получен VOTE для view {view}, но узел не агрегирует голоса этого view.")
+            return
+
+        # QC для блока уже сформирован - поздние голоса не нужны
+        if block_hash in self.pending_qcs:
+            return
+        # Блоки этого view уже закоммичены или отброшены (их QC удалены в _prune_certificates)
+        if view <= self.commit_view:
+            return
+
+        # Проверяем, что узел может голосовать (реально проверяется подпись и ключ)
+        if sender_id not in self.validator_set.validators:
+            print(f"[HOTSTUFF] Узел {self.node_id}: Получен VOTE от неизвестного узла {sender_id}.")
+            return
+
+        # Инициализируем словарь для голосов за этот блок
+        if block_hash not in self.votes:
+            self.votes[block_hash] = {}
 
-            # Инициализируем словарь для голосов за этот блок
-            if block_hash not in self.votes:
-                self.votes[block_hash] = {}
+        # Сохраняем голос (в реальности проверяется подпись)
+        self.votes[block_hash][sender_id] = msg.get('signature', 'dummy_sig') # Заглушка для подписи
 
-            # Сохраняем голос (в реальности проверяется подпись)
-            self.votes[block_hash][sender_id] = msg.get('signature', 'dummy_sig') # Заглушка для подписи
+        print(f"[HOTSTUFF] Узел {self.node_id}: Принят VOTE от {sender_id} за блок {block_hash[:8]} (view {view}). Всего голосов: {len(self.votes[block_hash])}")
 
-            print(f"[HOTSTUFF] Узел {self.node_id}: Принят VOTE от {sender_id} за блок {block_hash[:8]} (view {view}). Всего голосов: {len(self.votes[block_hash])}")
+        # Проверяем, набран ли кворум (2f+1 голосов)
+        if len(self.votes[block_hash]) >= self.get_quorum_threshold():
+            print(f"[HOTSTUFF] Узел {self.node_id}: Набран кворум голосов ({len(self.votes[block_hash])}) за блок {block_hash[:8]} (view {view}).")
+            # Создаём единственный QC для блока
+            qc = QuorumCertificate(view, block_hash, self.votes.pop(block_hash))
+            self.pending_qcs[block_hash] = qc
 
-            # Проверяем, набран ли кворум (2f+1 голосов)
-            # f = (len(validators) - 1) // 3
-            f = len(self.validator_set.validators) // 3 # Примерное f
-            quorum_threshold = 2 * f + 1
+            # Фиксируем (commit) блок: это делает только агрегирующий лидер
+            self._try_commit_block(block_hash, qc)
 
-            if len(self.votes[block_hash]) >= quorum_threshold:
-                print(f"[HOTSTUFF] Узел {self.node_id}: Набран кворум голосов ({len(self.votes[block_hash])}) за блок {block_hash[:8]} (view {view}).")
-                # Создаём QC
-                qc = QuorumCertificate(view, block_hash, self.votes[block_hash].copy())
-                self.pending_qcs[block_hash] = qc
+            # В конвейерном режиме следующий блок предлагается сразу после формирования QC
+            if self.pipelined:
+                self._propose_block_locked()
 
-                # Пытаемся зафиксировать (commit) блок
-                self._try_commit_block(block_hash, qc)
+    def _update_high_qc(self, qc):
+        """
+        Обновляет high_qc, если переданный QC новее.
+        """
+        if not self.high_qc or qc.view > self.high_qc.view:
+            self.high_qc = qc
+            print(f"[HOTSTUFF] Узел {self.node_id}: Обновлён high_qc до view {qc.view} для блока {qc.block_hash[:8]}.")
 
-    def _try_commit_block(self, block_hash, qc, parent_qc_=None):
+    def _try_commit_block(self, block_hash, qc):
         """
-        Проверяет правило коммита (3 подряд идущих QC) и фиксирует блок, если правило выполнено.
+        Применяет правило коммита для блока, за который сформирован QC, и запоминает QC для следующего предложения.
+        QC формируется одним лидером, поэтому блоки коммитятся в общий Blockchain ровно один раз.
+
+        Базовый режим: блок коммитится сразу.
+        Конвейерный режим (chained HotStuff): если block <- parent <- grandparent образуют прямую цепочку
+        (previous_hash), коммитится grandparent вместе со всеми незакоммиченными предками.
         """
-        # Правило коммита HotStuff: если есть цепочка из 3 подряд идущих блоков с QC,
-        # то третий с конца (leaf) можно коммитить.
-        # Для упрощения: если у нас есть QC для текущего блока (C), и он ссылается на
-        # блок с parent_qc (P), и этот parent_qc (P) ссылается на блок с high_commit_qc (G),
-        # то можно коммитить блок, на который ссылается parent_qc (т.е. P).
-        # high_commit_qc -> parent_qc -> qc_current
-        # Тогда блок, на который ссылается parent_qc (P), можно коммитить.
+        self._update_high_qc(qc)
 
-        # Найдём блок, для которого у нас есть qc_current
-        block_current = self.pending_blocks.get(block_hash)
-        if not block_current:
+        block = self.pending_blocks.get(block_hash)
+        if not block:
             return # Блок не найден
 
-        parent_qc_data = block_current.parent_qc
-        if not parent_qc_: # ИСПРАВЛЕНО: if not parent_qc_data (проверяет, что переменная None или пустая)
-            # Если нет parent_qc, это может быть genesis или первый блок
-            # Пока что просто обновим high_qc
-            self.high_qc = qc
-            print(f"[HOTSTUFF] Узел {self.node_id}: Обновлён high_qc до view {qc.view} для блока {block_hash[:8]}.")
+        if not self.pipelined:
+            committed = self._commit_chain(block)
+        else:
+            parent_block = self.pending_blocks.get(block.previous_hash)
+            if not parent_block:
+                return
+            grandparent_block = self.pending_blocks.get(parent_block.previous_hash)
+            if not grandparent_block:
+                return
+            print(f"[HOTSTUFF] Узел {self.node_id}: Сформирована цепочка из трёх QC, блок {grandparent_block.index} готов к коммиту.")
+            committed = self._commit_chain(grandparent_block)
+        if committed:
+            self.commit_view = max(self.commit_view, qc.view)
+            self._prune_certificates(committed)
+
+    def _prune_certificates(self, committed_hashes):
+        """
+        Удаляет QC и голоса за блоки не выше закоммиченной высоты: закоммиченные блоки, ответвления
+        от них и блоки view не новее commit_view, которых узел так и не получил.
+        Без этого pending_qcs и votes пополняются с каждым блоком. Вызывается под self.lock.
+        """
+        latest_index = self.blockchain.get_latest_block().index
+        stale = set(committed_hashes)
+        stale.update(block_hash for block_hash, block in self.pending_blocks.items() if block.index <= latest_index)
+        for block_hash in stale:
+            self.pending_qcs.pop(block_hash, None)
+            self.votes.pop(block_hash, None)
+        self.pending_qcs = {block_hash: qc for block_hash, qc in self.pending_qcs.items()
+                            if qc.view > self.commit_view or block_hash in self.pending_blocks}
+
+    def _commit_chain(self, block):
+        """
+        Коммитит блок и все его незакоммиченные предки по порядку.
+
+        Returns:
+            list: Хеши закоммиченных блоков (пустой, если коммит не состоялся).
+        """
+        latest_block = self.blockchain.get_latest_block()
+        if block.index <= latest_block.index:
+            return [] # Блок уже закоммичен
+
+        blocks_to_commit = [block]
+        while blocks_to_commit[-1].previous_hash != latest_block.hash:
+            ancestor = self.pending_blocks.get(blocks_to_commit[-1].previous_hash)
+            if ancestor is None:
+                print(f"[HOTSTUFF] Узел {self.node_id}: Блок {block.index} не продолжает текущую цепочку. Коммит невозможен.")
+                return []
+            blocks_to_commit.append(ancestor)
+
+        committed = []
+        for block_to_commit in reversed(blocks_to_commit):
+            print(f"[HOTSTUFF] Узел {self.node_id}: Правило коммита выполнено. Коммитит блок {block_to_commit.index} (hash {block_to_commit.hash[:8]}).")
+            # Добавляем блок в цепочку
+            success = self.blockchain.add_block(block_to_commit)
+            if not success:
+                print(f"[HOTSTUFF] Узел {self.node_id}: Не удалось закоммитить блок {block_to_commit.index}.")
+                self._drop_block_with_descendants(block_to_commit)
+                return committed
+            committed.append(block_to_commit.hash)
+            self.pending_blocks.pop(block_to_commit.hash, None)
+            # Обновляем high_commit_qc
+            self.high_commit_qc = self.pending_qcs.get(block_to_commit.hash, self.high_commit_qc)
+            print(f"[HOTSTUFF] Узел {self.node_id}: Блок {block_to_commit.index} успешно закоммичен.")
+            # Сохраняем блок в БД при добавлении в цепочку
+            if self.db_manager:
+                self.db_manager.save_block(block_to_commit.to_dict(include_data=True))
+        return committed
+
+    def on_local_timeout(self):
+        """
+        Срабатывает, когда pacemaker не дождался прогресса в текущем view:
+        узел рассылает TIMEOUT со своим high_qc.
+        """
+        with self.lock:
+            view = self.current_view
+            if self.last_timeout_view >= view:
+                return
+            self.last_timeout_view = view
+            print(f"[HOTSTUFF] Узел {self.node_id}: Таймаут view {view} ({self.pacemaker.current_timeout:.2f} сек). Отправляет TIMEOUT.")
+            timeout_msg = {
+                'type': 'TIMEOUT',
+                'view': view,
+                'high_qc': self.high_qc.to_dict() if self.high_qc else None,
+                'sender_id': self.node_id,
+                'signature': self.crypto.sign(f"TIMEOUT{view}", self.node_id),
+            }
+            if self.network:
+                self.network.broadcast_message(timeout_msg, exclude_sender=True)
+            self._register_timeout(timeout_msg)
+
+    def handle_timeout(self, msg):
+        """
+        Обрабатывает сообщение TIMEOUT.
+        """
+        with self.lock:
+            self._register_timeout(msg)
+
+    def _register_timeout(self, msg):
+        """
+        Учитывает TIMEOUT и при наборе кворума формирует TC и переходит к следующему view.
+        Вызывается под self.lock.
+        """
+        view = msg['view']
+        sender_id = msg['sender_id']
+
+        if view < self.current_view:
+            return # View уже сменился
+        if sender_id not in self.validator_set.validators:
+            print(f"[HOTSTUFF] Узел {self.node_id}: Получен TIMEOUT от неизвестного узла {sender_id}.")
             return
 
-        # Проверим, есть ли parent_qc (P) у current (C), и есть ли high_commit_qc (G) у parent_qc (P)
-        parent_block_hash = parent_qc_data.get('block_hash')
-        parent_block = self.pending_blocks.get(parent_block_hash)
-
-        if parent_block:
-            # Проверим, есть ли QC для parent_block (P), который является "дедушкой" для current (C)
-            # Это означает, что у нас есть QC для P (parent_qc), и если у нас есть QC для G (high_commit_qc),
-            # и parent_qc(P) ссылается на G, то можно коммитить P.
-            # Однако, в нашей упрощенной логике, если у нас есть QC для C, и parent_qc(P) для C,
-            # и QC для P (в pending_qcs), и parent_qc(G) для P (в pending_qcs или в high_commit_qc),
-            # то можно коммитить G (т.е. "дедушку" P).
-            # Уточним: если у нас есть high_commit_qc (G), и QC(P), и parent_qc(P) указывает на G, и QC(C) для C, и parent_qc(C) указывает на P,
-            # то можно коммитить P.
-            # Попробуем упрощённую версию: если у нас есть high_commit_qc (G), и QC(P), и parent_qc(P) указывает на G, то можно коммитить P.
-            parent_qc_for_p = self.pending_qcs.get(parent_block_hash)
-            if parent_qc_for_p and self.high_commit_qc and self.high_commit_qc.block_hash == parent_block.parent_qc.get('block_hash'):
-                # high_commit_qc -> parent_qc_for_p -> qc_for_current
-                # Коммитим parent_qc_for_p (т.е. блок P)
-                block_to_commit_hash = parent_block_hash
-                block_to_commit = parent_block
-                if block_to_commit:
-                    print(f"[HOTSTUFF] Узел {self.node_id}: Правило коммита выполнено. Коммитит блок {block_to_commit.index} (hash {block_to_commit_hash[:8]}).")
-                    # Добавляем блок в цепочку
-                    success = self.blockchain.add_block(block_to_commit)
-                    if success:
-                        # Обновляем high_commit_qc
-                        self.high_commit_qc = self.pending_qcs.get(block_to_commit_hash)
-                        print(f"[HOTSTUFF] Узел {self.node_id}: Блок {block_to_commit.index} успешно закоммичен.")
-                        # --- ИСПРАВЛЕНИЕ: Сохраняем блок в БД при добавлении в цепочку ---
-                        # Проверим, инициализирован ли self.db_manager
-                        if self.db_manager:
-                            # Блоки хранятся как объекты Block, преобразуем в словарь для БД
-                            # Убедимся, что у Block есть метод to_dict
-                            block_db_data = block_to_commit.to_dict()
-                            self.db_manager.save_block(block_db_data)
-                        # --- Конец исправления ---
-                    else:
-                        print(f"[HOTSTUFF] Узел {self.node_id}: Не удалось закоммитить блок {block_to_commit.index}.")
-
-
-        # Обновляем high_qc на текущий, если он "новее"
-        if not self.high_qc or qc.view > self.high_qc.view:
-            self.high_qc = qc
-            print(f"[HOTSTUFF] Узел {self.node_id}: Обновлён high_qc до view {qc.view} для блока {block_hash[:8]}.")
+        # TIMEOUT несёт high_qc отправителя - следующий лидер построит блок на наивысшем из них
+        if msg.get('high_qc'):
+            self._update_high_qc(QuorumCertificate.from_dict(msg['high_qc']))
+
+        view_timeouts = self.timeouts.setdefault(view, {})
+        view_timeouts[sender_id] = msg.get('signature', 'dummy_sig')
+
+        if len(view_timeouts) >= self.get_quorum_threshold():
+            tc = TimeoutCertificate(view, self.timeouts.pop(view))
+            self.high_tc = tc
+            print(f"[HOTSTUFF] Узел {self.node_id}: Сформирован TC для view {view}. Переход к view {view + 1}.")
+            self._advance_view(view + 1, timed_out=True)
+            # Новый лидер сразу предлагает блок, опираясь на TC
+            self._propose_block_locked()
+
+    def get_view_stats(self):
+        """
+        Возвращает статистику pacemaker по длительности view и таймаутам.
+        """
+        return self.pacemaker.get_stats()
 
     def run(self):
         """
         Основной цикл работы узла (реплики).
         """
         print(f"[HOTSTUFF] Узел {self.node_id} запущен.")
+        with self.lock:
+            self.pacemaker.reset(self.current_view)
         while self._running:
-            # Проверяем, пора ли предлагать новый блок (например, по таймеру)
-            # В упрощённой модели, просто вызываем propose_block периодически
-            # или когда есть транзакции. Добавим искусственную задержку.
-            time.sleep(2) # Имитация времени между раундами
-            self.propose_block()
-            # Логика обработки сообщений должна быть асинхронной, например, через очередь в сети
+            # В конвейерном режиме под нагрузкой блоки предлагаются из обработчика голосов сразу после QC,
+            # здесь лидер только опрашивает пул, если предлагать было нечего.
+            # В базовом режиме пауза имитирует время между раундами.
+            time.sleep(self.get_step_interval())
+            self.step()
+            # Входящие сообщения обрабатываются асинхронно потоками-диспетчерами сети
+
+    def step(self):
+        """
+        Один шаг цикла узла: предложение блока (если узел - лидер) и проверка таймаута view.
+        Вызывается из run() или планировщиком событий симуляции с виртуальным временем.
+        """
+        self.propose_block()
+        if self._running and self.pacemaker.is_expired():
+            self.on_local_timeout()
+
+    def get_step_interval(self):
+        """Интервал между шагами цикла узла (сек)."""
+        return self.idle_interval if self.pipelined else self.round_interval
 
     def stop(self):
         """Останавливает цикл работы узла."""
@@ -328,8 +752,8 @@ class Replica:
             self.handle_propose(message)
         elif msg_type == 'VOTE':
             self.handle_vote(message)
-        #elif msg_type == 'TIMEOUT':
-        #    self.handle_timeout(message)
+        elif msg_type == 'TIMEOUT':
+            self.handle_timeout(message)
         else:
             print(f"[HOTSTUFF] Узел {self.node_id}: Получено неизвестное сообщение типа {msg_type}.")
 
@@ -358,29 +782,134 @@ class MockCrypto:
 class InMemoryNetwork:
     """
     Упрощённая "сеть" для симуляции передачи сообщений между узлами.
+    У каждой реплики есть своя входящая очередь (inbox) и поток-диспетчер,
+    который последовательно передаёт сообщения в replica.handle_message.
+    Отправка сообщения только кладёт его в очереди получателей и не вызывает
+    обработчики на стеке отправителя (нет рекурсии и повторного захвата lock).
     """
+    _STOP = object() # Маркер остановки потока-диспетчера
+
     def __init__(self, replicas):
         self.replicas = {r.node_id: r for r in replicas} # Словарь {node_id: Replica_object}
+        self.inboxes = {node_id: queue.Queue() for node_id in self.replicas} # {node_id: Queue}
+        self._dispatchers = {} # {node_id: Thread}
+        self._start_lock = threading.Lock()
+        self._stopped = False # После stop() сообщения отбрасываются, диспетчеры не перезапускаются
+        self.messages_sent = 0 # Количество сообщений, поставленных в очереди
+        self.messages_delivered = 0 # Количество обработанных сообщений
+        self._stats_lock = threading.Lock()
+
+    def start(self):
+        """
+        Запускает потоки-диспетчеры для всех реплик (повторный вызов безопасен).
+        Вызов start() после stop() снова разрешает доставку сообщений.
+        """
+        with self._start_lock:
+            self._stopped = False
+            self._start_dispatchers()
+
+    def _start_dispatchers(self):
+        """Запускает недостающие потоки-диспетчеры. Вызывается под self._start_lock."""
+        for node_id in self.replicas:
+            if node_id in self._dispatchers:
+                continue
+            t = threading.Thread(target=self._dispatch_loop, args=(node_id,), name=f"inbox-{node_id}")
+            t.daemon = True
+            t.start()
+            self._dispatchers[node_id] = t
+
+    def stop(self, timeout=1):
+        """
+        Останавливает потоки-диспетчеры. Сообщения, уже стоящие в очередях, обрабатываются до маркера остановки;
+        сообщения, отправленные позже, отбрасываются.
+        """
+        with self._start_lock:
+            self._stopped = True
+            dispatchers = self._dispatchers
+            self._dispatchers = {}
+            for node_id in dispatchers:
+                self.inboxes[node_id].put(self._STOP)
+        # Ждём вне блокировки: обработчики сообщений могут отправлять сообщения (они будут отброшены)
+        for t in dispatchers.values():
+            t.join(timeout=timeout)
+
+    def _dispatch_loop(self, node_id):
+        """
+        Цикл потока-диспетчера: достаёт сообщения из очереди узла и передаёт их реплике.
+        """
+        inbox = self.inboxes[node_id]
+        replica = self.replicas[node_id]
+        while True:
+            message = inbox.get()
+            try:
+                if message is self._STOP:
+                    return
+                replica.handle_message(message)
+                with self._stats_lock:
+                    self.messages_delivered += 1
+            except Exception as e:
+                print(f"[NETWORK] Узел {node_id}: Ошибка при обработке сообщения {message.get('type')}: {e}")
+            finally:
+                inbox.task_done()
+
+    def _enqueue(self, message, target_node_id):
+        """
+        Кладёт сообщение в очередь узла, при необходимости запуская диспетчеры.
+        После stop() сообщение отбрасывается (например, запоздавший голос или таймаут).
+        """
+        inbox = self.inboxes.get(target_node_id)
+        if inbox is None:
+            return
+        with self._start_lock:
+            if self._stopped:
+                return
+            if not self._dispatchers:
+                self._start_dispatchers()
+            inbox.put(message)
+        with self._stats_lock:
+            self.messages_sent += 1
 
     def broadcast_message(self, message, exclude_sender=False):
         """
         Рассылает сообщение всем узлам.
         """
         sender_id = message.get('sender_id')
-        for node_id, replica in self.replicas.items():
+        for node_id in self.replicas:
             if exclude_sender and node_id == sender_id:
                 continue
             # В реальной системе тут был бы сетевой вызов
-            # Имитируем вызов обработчика на другом узле
-            replica.handle_message(message)
+            self._enqueue(message, node_id)
 
     def send_message_to(self, message, target_node_id):
         """
         Отправляет сообщение конкретному узлу.
         """
-        target_replica = self.replicas.get(target_node_id)
-        if target_replica:
-            target_replica.handle_message(message)
+        self._enqueue(message, target_node_id)
+
+    def wait_until_idle(self, timeout=None):
+        """
+        Ждёт, пока все очереди не будут обработаны.
+
+        Returns:
+            bool: True, если очереди опустели до истечения таймаута.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while any(inbox.unfinished_tasks for inbox in self.inboxes.values()):
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def get_stats(self):
+        """
+        Возвращает статистику сети: отправленные/доставленные сообщения и глубину очередей.
+        """
+        with self._stats_lock:
+            return {
+                'messages_sent': self.messages_sent,
+                'messages_delivered': self.messages_delivered,
+                'queue_depths': {node_id: inbox.qsize() for node_id, inbox in self.inboxes.items()},
+            }
 
     def get_replica(self, node_id):
         """Возвращает объект реплики по ID."""
@@ -390,11 +919,8 @@ class InMemoryNetwork:
         """Возвращает список всех ID реплик."""
         return list(self.replicas.keys())
 
-    # Метод для обработки сообщений должен быть вызван из реплики
-    # или из центрального менеджера.
-    # Добавим его в Replica как публичный метод для вызова из Network
-    # (это не идеальная архитектура, но работает для симуляции)
     def deliver_message_to_replica(self, message, target_node_id):
-        replica = self.get_replica(target_node_id)
-        if replica:
-             replica.handle_message(message)
+        """
+        Доставляет сообщение узлу через его очередь (аналог send_message_to).
+        """
+        self._enqueue(message, target_node_id)
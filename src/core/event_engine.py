@@ -0,0 +1,133 @@
+import heapq
+import itertools
+import threading
+import time
+
+class EventEngine:
+    """
+    Движок дискретно-событийной симуляции с виртуальными часами.
+    События хранятся в куче по времени срабатывания (при равном времени - в порядке планирования);
+    виртуальное время перескакивает сразу к следующему событию, поэтому час симуляции
+    выполняется так быстро, как позволяет CPU.
+    В режиме realtime событие выполняется не раньше соответствующего момента реального времени
+    (с ускорением speed: при speed=10 час виртуального времени занимает 6 минут).
+    """
+    def __init__(self, start_time=0.0, realtime=False, speed=1.0):
+        """
+        Args:
+            start_time (float): Начальное значение виртуального времени (сек).
+            realtime (bool): Согласовывать виртуальное время с реальным.
+            speed (float): Во сколько раз виртуальное время идёт быстрее реального (только для realtime).
+        """
+        if speed <= 0:
+            raise ValueError("Коэффициент скорости должен быть положительным")
+        self.realtime = realtime
+        self.speed = speed
+        self._now = start_time
+        self._queue = [] # Куча (время, порядковый номер, callback, args)
+        self._counter = itertools.count() # Порядковый номер для стабильного порядка при равном времени
+        self._cancelled = set() # Порядковые номера отменённых событий
+        self._periodic = {} # {ID периодического события: порядковый номер его следующего вызова}
+        self._stop_event = threading.Event()
+        self.events_processed = 0
+
+    @property
+    def now(self):
+        """Текущее виртуальное время (сек)."""
+        return self._now
+
+    def schedule_at(self, at_time, callback, *args):
+        """
+        Планирует вызов callback(*args) на момент виртуального времени at_time.
+        Момент в прошлом заменяется текущим временем.
+
+        Returns:
+            int: ID события (для cancel).
+        """
+        event_id = next(self._counter)
+        heapq.heappush(self._queue, (max(at_time, self._now), event_id, callback, args))
+        return event_id
+
+    def schedule(self, delay, callback, *args):
+        """Планирует вызов callback(*args) через delay секунд виртуального времени."""
+        return self.schedule_at(self._now + delay, callback, *args)
+
+    def schedule_every(self, interval, callback, *args, start_delay=None):
+        """
+        Планирует периодический вызов callback(*args) с шагом interval.
+        Повторение прекращается, если callback вернул False.
+
+        Args:
+            start_delay (float, optional): Задержка первого вызова. По умолчанию равна interval.
+
+        Returns:
+            int: ID периодического события: cancel с ним отменяет все последующие вызовы.
+        """
+        if interval <= 0:
+            raise ValueError("Интервал периодического события должен быть положительным")
+
+        def _periodic():
+            # Событие могли отменить во время вызова callback - тогда оно не планируется снова
+            if callback(*args) is not False and periodic_id in self._periodic:
+                self._periodic[periodic_id] = self.schedule(interval, _periodic)
+            else:
+                self._periodic.pop(periodic_id, None)
+
+        periodic_id = self.schedule(interval if start_delay is None else start_delay, _periodic)
+        self._periodic[periodic_id] = periodic_id
+        return periodic_id
+
+    def cancel(self, event_id):
+        """
+        Отменяет запланированное событие (удаление из кучи ленивое).
+        Для ID из schedule_every отменяется ближайший вызов и все последующие.
+        """
+        self._cancelled.add(self._periodic.pop(event_id, event_id))
+
+    def stop(self):
+        """Останавливает run() после текущего события (можно вызывать из другого потока). Остановка окончательная."""
+        self._stop_event.set()
+
+    def _wait_for(self, at_time, virtual_start, wall_start):
+        """Ждёт момента реального времени, соответствующего виртуальному at_time (режим realtime)."""
+        delay = wall_start + (at_time - virtual_start) / self.speed - time.time()
+        if delay > 0:
+            self._stop_event.wait(delay)
+
+    def run(self, until=None):
+        """
+        Выполняет события по порядку виртуального времени.
+
+        Args:
+            until (float, optional): Момент виртуального времени, после которого события не выполняются.
+                Если очередь исчерпана раньше, часы переводятся на until.
+
+        Returns:
+            int: Количество выполненных событий.
+        """
+        virtual_start = self._now
+        wall_start = time.time()
+        processed = 0
+        while self._queue and not self._stop_event.is_set():
+            at_time, event_id, callback, args = self._queue[0]
+            if until is not None and at_time > until:
+                break
+            heapq.heappop(self._queue)
+            if event_id in self._cancelled:
+                self._cancelled.discard(event_id)
+                continue
+            if self.realtime:
+                self._wait_for(at_time, virtual_start, wall_start)
+                if self._stop_event.is_set():
+                    heapq.heappush(self._queue, (at_time, event_id, callback, args))
+                    break
+            self._now = at_time
+            callback(*args)
+            processed += 1
+        if until is not None and not self._stop_event.is_set() and self._now < until:
+            if self.realtime:
+                self._wait_for(until, virtual_start, wall_start)
+            if not self._stop_event.is_set():
+                self._now = until
+        self.events_processed += processed
+        return processed
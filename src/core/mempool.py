@@ -0,0 +1,291 @@
+import heapq
+import itertools
+import threading
+from collections import deque
+from . import transaction
+
+class Mempool:
+    """
+    Пул неподтверждённых транзакций (mempool).
+    Транзакции дедуплицируются по ID. Порядок извлечения задаётся параметром priority:
+        - None: FIFO на deque, добавление и извлечение за O(1);
+        - 'fee': сначала транзакции с большей комиссией (поле 'fee' или additional_data['fee']), O(log n);
+        - 'age': сначала самые старые по timestamp, O(log n).
+    Удаление по ID ленивое: запись помечается удалённой и пропускается при извлечении.
+    """
+    PRIORITIES = (None, 'fee', 'age')
+
+    def __init__(self, priority=None, max_size=None):
+        """
+        Args:
+            priority (str, optional): Режим приоритета (None, 'fee' или 'age').
+            max_size (int, optional): Максимальное количество транзакций в пуле.
+        """
+        if priority not in self.PRIORITIES:
+            raise ValueError(f"Неизвестный режим приоритета пула: {priority}")
+        self.priority = priority
+        self.max_size = max_size
+        self._entries = {} # {tx_id: (tx, size_bytes)}
+        self._fifo = deque() # Очередь ID для режима FIFO
+        self._heap = [] # Куча (ключ, порядковый номер, tx_id) для режимов с приоритетом
+        self._counter = itertools.count() # Порядковый номер для стабильного порядка при равных ключах
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _get_field(tx, field, default=None):
+        """Возвращает поле транзакции (словаря или объекта Transaction)."""
+        if isinstance(tx, dict):
+            return tx.get(field, default)
+        return getattr(tx, field, default)
+
+    @classmethod
+    def estimate_size(cls, tx):
+        """
+        Оценивает размер транзакции в байтах (длина её канонического бинарного представления).
+        """
+        if isinstance(tx, dict):
+            tx = transaction.Transaction.from_dict(tx)
+        return len(tx.encode())
+
+    def _priority_key(self, tx):
+        """Ключ сортировки для режима с приоритетом (меньше - раньше)."""
+        if self.priority == 'fee':
+            fee = self._get_field(tx, 'fee')
+            if fee is None:
+                fee = (self._get_field(tx, 'additional_data') or {}).get('fee', 0)
+            return -fee
+        return self._get_field(tx, 'timestamp', 0)
+
+    def add(self, tx):
+        """
+        Добавляет транзакцию в пул.
+
+        Returns:
+            bool: False, если транзакция с таким ID уже есть или пул заполнен.
+        """
+        tx_id = self._get_field(tx, 'id')
+        with self.lock:
+            if tx_id in self._entries:
+                return False
+            if self.max_size is not None and len(self._entries) >= self.max_size:
+                return False
+            self._entries[tx_id] = (tx, self.estimate_size(tx))
+            if self.priority is None:
+                self._fifo.append(tx_id)
+            else:
+                heapq.heappush(self._heap, (self._priority_key(tx), next(self._counter), tx_id))
+            return True
+
+    def requeue(self, transactions):
+        """
+        Возвращает извлечённые ранее транзакции (например, из отброшенного блока) в начало очереди
+        в исходном порядке. В режимах с приоритетом порядок задаётся ключом приоритета.
+        Ограничение max_size не применяется: транзакции уже были в пуле.
+
+        Returns:
+            int: Количество возвращённых транзакций (уже находящиеся в пуле пропускаются).
+        """
+        returned = 0
+        with self.lock:
+            for tx in reversed(transactions):
+                tx_id = self._get_field(tx, 'id')
+                if tx_id in self._entries:
+                    continue
+                self._entries[tx_id] = (tx, self.estimate_size(tx))
+                if self.priority is None:
+                    self._fifo.appendleft(tx_id)
+                else:
+                    heapq.heappush(self._heap, (self._priority_key(tx), next(self._counter), tx_id))
+                returned += 1
+        return returned
+
+    def remove(self, tx_id):
+        """
+        Удаляет транзакцию из пула (например, если она уже включена в блок другим узлом).
+
+        Returns:
+            bool: True, если транзакция была в пуле.
+        """
+        with self.lock:
+            return self._entries.pop(tx_id, None) is not None
+
+    def _peek_id(self):
+        """Возвращает ID следующей транзакции, пропуская удалённые. Вызывается под self.lock."""
+        if self.priority is None:
+            while self._fifo and self._fifo[0] not in self._entries:
+                self._fifo.popleft()
+            return self._fifo[0] if self._fifo else None
+        while self._heap and self._heap[0][2] not in self._entries:
+            heapq.heappop(self._heap)
+        return self._heap[0][2] if self._heap else None
+
+    def _pop_id(self):
+        """Извлекает ID следующей транзакции. Вызывается под self.lock после _peek_id."""
+        if self.priority is None:
+            return self._fifo.popleft()
+        return heapq.heappop(self._heap)[2]
+
+    def pop_batch(self, max_txs=None, max_bytes=None):
+        """
+        Извлекает транзакции для блока с учётом ограничений на количество и суммарный размер.
+        Транзакция крупнее max_bytes всё равно извлекается, если она первая в блоке,
+        иначе она заблокировала бы пул.
+
+        Args:
+            max_txs (int, optional): Максимальное количество транзакций.
+            max_bytes (int, optional): Максимальный суммарный размер в байтах.
+
+        Returns:
+            list: Извлечённые транзакции.
+        """
+        batch = []
+        total_bytes = 0
+        with self.lock:
+            while max_txs is None or len(batch) < max_txs:
+                tx_id = self._peek_id()
+                if tx_id is None:
+                    break
+                tx, size = self._entries[tx_id]
+                if max_bytes is not None and batch and total_bytes + size > max_bytes:
+                    break
+                self._pop_id()
+                del self._entries[tx_id]
+                batch.append(tx)
+                total_bytes += size
+        return batch
+
+    def snapshot(self):
+        """
+        Возвращает список транзакций в пуле (без учёта порядка извлечения).
+        """
+        with self.lock:
+            return [tx for tx, _ in self._entries.values()]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, tx_id):
+        return tx_id in self._entries
+
+class SharedMempool(Mempool):
+    """
+    Общий для всех ФО пул транзакций: любой лидер заполняет блок из глобальной очереди.
+    Транзакции каждого отправителя извлекаются строго в порядке поступления (по nonce отправителя),
+    а между отправителями - по времени поступления первой ожидающей транзакции.
+    Добавление и извлечение - O(log S), где S - число отправителей с ожидающими транзакциями.
+    """
+    def __init__(self, max_size=None):
+        super().__init__(priority=None, max_size=max_size)
+        self._sender_queues = {} # {sender_id: deque[(порядковый номер, tx_id)]}
+        self._ready = [] # Куча (порядковый номер головы очереди, sender_id)
+        self._sender_nonces = {} # {sender_id: следующий nonce}
+        self._tx_nonces = {} # {tx_id: nonce}
+        self._requeue_counter = itertools.count(-1, -1) # Порядковые номера возвращённых транзакций (раньше любых)
+
+    def add(self, tx):
+        """
+        Добавляет транзакцию в очередь её отправителя и присваивает ей следующий nonce отправителя.
+
+        Returns:
+            bool: False, если транзакция с таким ID уже есть или пул заполнен.
+        """
+        tx_id = self._get_field(tx, 'id')
+        sender_id = self._get_field(tx, 'sender_id')
+        with self.lock:
+            if tx_id in self._entries:
+                return False
+            if self.max_size is not None and len(self._entries) >= self.max_size:
+                return False
+            self._entries[tx_id] = (tx, self.estimate_size(tx))
+            nonce = self._sender_nonces.get(sender_id, 0)
+            self._sender_nonces[sender_id] = nonce + 1
+            self._tx_nonces[tx_id] = nonce
+            seq = next(self._counter)
+            sender_queue = self._sender_queues.setdefault(sender_id, deque())
+            sender_queue.append((seq, tx_id))
+            if len(sender_queue) == 1:
+                heapq.heappush(self._ready, (seq, sender_id))
+            return True
+
+    def requeue(self, transactions):
+        """
+        Возвращает извлечённые ранее транзакции в начало очередей их отправителей в исходном порядке,
+        перед ожидающими транзакциями тех же отправителей, и перенумеровывает nonce этих очередей.
+        Возвращённые транзакции получают наименьшие порядковые номера и извлекаются первыми.
+
+        Returns:
+            int: Количество возвращённых транзакций (уже находящиеся в пуле пропускаются).
+        """
+        returned = 0
+        senders = set()
+        with self.lock:
+            for tx in reversed(transactions):
+                tx_id = self._get_field(tx, 'id')
+                if tx_id in self._entries:
+                    continue
+                sender_id = self._get_field(tx, 'sender_id')
+                self._entries[tx_id] = (tx, self.estimate_size(tx))
+                self._sender_queues.setdefault(sender_id, deque()).appendleft((next(self._requeue_counter), tx_id))
+                senders.add(sender_id)
+                returned += 1
+            for sender_id in senders:
+                # Транзакции отправителя занимают последние выданные nonce по порядку очереди
+                live_ids = [tx_id for _, tx_id in self._sender_queues[sender_id] if tx_id in self._entries]
+                first_nonce = max(0, self._sender_nonces.get(sender_id, 0) - len(live_ids))
+                self._sender_nonces[sender_id] = first_nonce + len(live_ids)
+                for nonce, tx_id in enumerate(live_ids, first_nonce):
+                    self._tx_nonces[tx_id] = nonce
+            if senders:
+                # Головы очередей изменились - куча перестраивается (одна запись на отправителя)
+                self._ready = [(sender_queue[0][0], sender_id)
+                               for sender_id, sender_queue in self._sender_queues.items() if sender_queue]
+                heapq.heapify(self._ready)
+        return returned
+
+    def remove(self, tx_id):
+        """
+        Удаляет транзакцию из пула; очередь отправителя продвигается при следующем извлечении.
+        """
+        with self.lock:
+            self._tx_nonces.pop(tx_id, None)
+            return self._entries.pop(tx_id, None) is not None
+
+    def _peek_id(self):
+        """Возвращает ID следующей транзакции, пропуская удалённые. Вызывается под self.lock."""
+        while self._ready:
+            seq, sender_id = self._ready[0]
+            sender_queue = self._sender_queues[sender_id]
+            while sender_queue and sender_queue[0][1] not in self._entries:
+                sender_queue.popleft()
+            if not sender_queue:
+                heapq.heappop(self._ready)
+                del self._sender_queues[sender_id]
+                continue
+            if sender_queue[0][0] != seq:
+                # Голова очереди отправителя была удалена - обновляем её позицию в куче
+                heapq.heapreplace(self._ready, (sender_queue[0][0], sender_id))
+                continue
+            return sender_queue[0][1]
+        return None
+
+    def _pop_id(self):
+        """Извлекает ID следующей транзакции. Вызывается под self.lock после _peek_id."""
+        _, sender_id = heapq.heappop(self._ready)
+        sender_queue = self._sender_queues[sender_id]
+        _, tx_id = sender_queue.popleft()
+        if sender_queue:
+            heapq.heappush(self._ready, (sender_queue[0][0], sender_id))
+        else:
+            del self._sender_queues[sender_id]
+        self._tx_nonces.pop(tx_id, None)
+        return tx_id
+
+    def get_tx_nonce(self, tx_id):
+        """Возвращает nonce ожидающей транзакции в последовательности её отправителя."""
+        with self.lock:
+            return self._tx_nonces.get(tx_id)
+
+    def get_next_nonce(self, sender_id):
+        """Возвращает nonce, который получит следующая транзакция отправителя."""
+        with self.lock:
+            return self._sender_nonces.get(sender_id, 0)
@@ -0,0 +1,121 @@
+import hashlib
+import multiprocessing
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Формат nonce в заголовке блока (см. Block.calculate_hash)
+NONCE_FORMAT = '>Q'
+# Как часто (в попытках) воркер проверяет, не нашёл ли nonce другой процесс
+STOP_CHECK_INTERVAL = 4096
+
+# Событие остановки, передаётся каждому процессу пула при его запуске
+_stop_event = None
+
+def _init_worker(stop_event):
+    """Инициализатор процесса пула: сохраняет общее событие остановки."""
+    global _stop_event
+    _stop_event = stop_event
+
+def _search_nonces(header_prefix, target, start_nonce, step):
+    """
+    Перебирает nonce = start_nonce, start_nonce + step, ... до нахождения хеша
+    с нужным префиксом или до сигнала остановки.
+
+    Returns:
+        tuple: (nonce, hash, attempts); nonce и hash равны None, если поиск остановлен.
+    """
+    prefix_hasher = hashlib.sha256(header_prefix)
+    difficulty = len(target)
+    nonce = start_nonce
+    attempts = 0
+    while True:
+        if attempts % STOP_CHECK_INTERVAL == 0 and _stop_event.is_set():
+            return None, None, attempts
+        hasher = prefix_hasher.copy()
+        hasher.update(struct.pack(NONCE_FORMAT, nonce))
+        digest = hasher.hexdigest()
+        attempts += 1
+        if digest[:difficulty] == target:
+            _stop_event.set()
+            return nonce, digest, attempts
+        nonce += step
+
+class ParallelMiner:
+    """
+    Многопроцессный поиск nonce.
+    Пространство nonce делится между воркерами с шагом, равным их количеству;
+    как только один воркер находит подходящий хеш, остальные останавливаются.
+    """
+    def __init__(self, workers=None):
+        """
+        Args:
+            workers (int, optional): Количество процессов. По умолчанию - число ядер CPU.
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.last_hashes_per_second = 0.0 # Скорость последнего майнинга
+        self.last_attempts = 0 # Количество попыток в последнем майнинге
+        self._stop_event = None
+        self._manager = None
+        self._executor = None
+
+    def _get_executor(self):
+        """
+        Лениво создаёт пул процессов, чтобы не запускать его для каждого блока.
+        Процессы запускаются через spawn: к этому моменту уже работают потоки записи в БД
+        и диспетчеры сети, и fork мог бы унаследовать захваченную ими блокировку.
+        """
+        if self._executor is None:
+            context = multiprocessing.get_context('spawn')
+            self._manager = context.Manager()
+            self._stop_event = self._manager.Event()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self._stop_event,)
+            )
+        return self._executor
+
+    def mine(self, header_prefix, difficulty, start_nonce=0):
+        """
+        Ищет nonce, при котором SHA-256(header_prefix + nonce) начинается с difficulty нулей.
+
+        Args:
+            header_prefix (bytes): Заголовок блока без nonce.
+            difficulty (int): Требуемое количество ведущих нулей.
+            start_nonce (int): Начальное значение nonce.
+
+        Returns:
+            tuple: (nonce, hash).
+        """
+        target = '0' * difficulty
+        executor = self._get_executor()
+        self._stop_event.clear()
+        start_time = time.time()
+        futures = [
+            executor.submit(_search_nonces, header_prefix, target, start_nonce + i, self.workers)
+            for i in range(self.workers)
+        ]
+        # Воркеры завершаются сами после установки события, поэтому ждём всех
+        results = [future.result() for future in futures]
+        elapsed = time.time() - start_time
+
+        self.last_attempts = sum(attempts for _, _, attempts in results)
+        self.last_hashes_per_second = self.last_attempts / elapsed if elapsed > 0 else 0.0
+        found = [(nonce, digest) for nonce, digest, _ in results if nonce is not None]
+        # Если nonce нашли несколько воркеров, берём наименьший из найденных. Какие воркеры успеют
+        # найти nonce до остановки, зависит от планирования процессов, поэтому nonce (и хеш блока)
+        # между запусками не воспроизводится - в отличие от перебора в одном потоке.
+        return min(found)
+
+    def shutdown(self):
+        """Останавливает пул процессов."""
+        if self._executor is not None:
+            self._stop_event.set()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._stop_event = None
+            self._manager.shutdown()
+            self._manager = None
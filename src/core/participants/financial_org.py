@@ -1,16 +1,33 @@
 import time
 from .. import utils # Относительный импорт utils из core
+from .. import mempool
+from .. import transaction
 
 class FinancialOrg:
     """
     Класс, представляющий Финансовую Организацию (Кредитную Организацию).
     """
-    def __init__(self, fo_id, central_bank_instance, db_manager): # Добавлен аргумент db_manager
+    def __init__(self, fo_id, central_bank_instance, db_manager, max_block_txs=10, max_block_bytes=None, pool_priority=None,
+                 shared_pool=None):
+        """
+        Args:
+            fo_id (str): ID ФО.
+            central_bank_instance (CentralBank): Экземпляр ЦБ.
+            db_manager (DatabaseManager): Менеджер БД.
+            max_block_txs (int, optional): Максимальное количество транзакций в блоке.
+            max_block_bytes (int, optional): Максимальный суммарный размер транзакций блока в байтах.
+            pool_priority (str, optional): Режим приоритета пула (None - FIFO, 'fee' или 'age').
+            shared_pool (mempool.SharedMempool, optional): Общий для всех ФО пул. Если указан,
+                транзакции ФО попадают в него, и лидер любой ФО может включить их в блок.
+        """
         self.id = fo_id
         self.cb = central_bank_instance  # Ссылка на экземпляр ЦБ
         self.db_manager = db_manager # Сохраняем ссылку на db_manager
         self.users = {}  # Словарь {user_id: User_instance}
-        self.transaction_pool = [] # Пул неподтверждённых транзакций
+        # Пул неподтверждённых транзакций (собственный или общий для всех ФО)
+        self.transaction_pool = shared_pool if shared_pool is not None else mempool.Mempool(priority=pool_priority)
+        self.max_block_txs = max_block_txs
+        self.max_block_bytes = max_block_bytes
         self.transaction_log = [] # Локальный лог транзакций, прошедших через эту ФО
         self.total_emitted_digital_rubles = 0.0 # Общая сумма эмиссии, полученной от ЦБ
 
@@ -32,6 +49,23 @@ class FinancialOrg:
             print(f"[WARN] Пользователь {user_instance.id} уже обслуживается ФО {self.id}.")
             return False
 
+    def add_users(self, user_instances):
+        """
+        Добавляет пользователей в обслуживание ФО без сохранения каждого из них в БД.
+        Используется при массовом создании пользователей: данные сохраняются одним пакетом
+        через DatabaseManager.bulk_save_users.
+
+        Returns:
+            int: Количество добавленных пользователей.
+        """
+        added = 0
+        for user_instance in user_instances:
+            if user_instance.id not in self.users:
+                self.users[user_instance.id] = user_instance
+                added += 1
+        print(f"[INFO] В ФО {self.id} добавлено {added} пользователей.")
+        return added
+
     def request_emission(self, amount):
         """
         Отправляет запрос ЦБ на эмиссию цифровых рублей.
@@ -65,25 +99,26 @@ class FinancialOrg:
         # Используем utils.calculate_hash для генерации уникального ID
         # ИСПРАВЛЕНО: убран .encode() из аргумента calculate_hash
         tx_id = utils.calculate_hash(f"{sender_id}{recipient_id}{amount}{time.time()}{tx_type}")
-        tx_data = {
-            'id': tx_id, # --- ДОБАВЛЕНО: ID транзакции ---
-            'sender_id': sender_id,
-            'recipient_id': recipient_id,
-            'amount': int(amount), # Убедимся, что сумма целая
-            'type': tx_type,
-            'timestamp': time.time(),
-            'status': 'PENDING',
-            'fo_id': self.id,
-        }
+        tx = transaction.Transaction(
+            sender_id, recipient_id,
+            int(amount), # Убедимся, что сумма целая
+            tx_type, self.id,
+            tx_id=tx_id, # --- ДОБАВЛЕНО: ID транзакции ---
+            status='PENDING',
+        )
 
         # В реальной системе тут была бы подпись отправителя
         print(f"[INFO] Создана транзакция {tx_id} от {sender_id} к {recipient_id} через ФО {self.id}.")
 
         # Сохраняем транзакцию в БД
-        self.db_manager.save_transaction(tx_data) # --- ИСПРАВЛЕНИЕ: Вызов метода save_transaction ---
+        self.db_manager.save_transaction(tx.to_dict()) # --- ИСПРАВЛЕНИЕ: Вызов метода save_transaction ---
 
-        # Добавляем в пул
-        self.transaction_pool.append(tx_data)
+        # Средства отправителя резервируются: следующие переводы не могут рассчитывать на уже отправленные,
+        # поэтому транзакции остаются обеспеченными на счёте в цепочке при любом порядке включения в блоки
+        sender.balance_digital -= int(amount)
+
+        # Добавляем в пул сам объект транзакции
+        self.transaction_pool.add(tx)
         print(f"[INFO] Транзакция {tx_id} добавлена в пул ФО {self.id}.")
         return tx_id # Возвращаем ID
 
@@ -91,19 +126,24 @@ class FinancialOrg:
         """
         Возвращает пул неподтверждённых транзакций.
         """
-        return self.transaction_pool
+        return self.transaction_pool.snapshot()
 
     def process_pool_for_consensus(self):
         """
-        Извлекает транзакции из пула для включения в блок.
+        Извлекает транзакции из пула для включения в блок
+        с учётом ограничений на количество транзакций и размер блока.
+        """
+        return self.transaction_pool.pop_batch(self.max_block_txs, self.max_block_bytes)
+
+    def return_transactions_to_pool(self, transactions):
+        """
+        Возвращает в пул транзакции отброшенных блоков, чтобы они были предложены повторно:
+        они встают в начало очереди в исходном порядке (в общем пуле - в начало очередей отправителей).
+
+        Returns:
+            int: Количество возвращённых транзакций.
         """
-        if not self.transaction_pool:
-            return []
-        # Извлекаем транзакции (например, первые 10 или все, если меньше)
-        # В реальной системе могли бы быть приоритеты
-        transactions_to_process = self.transaction_pool[:10] # Примерный лимит
-        self.transaction_pool = self.transaction_pool[10:] # Удаляем из пула
-        return transactions_to_process
+        return self.transaction_pool.requeue(transactions)
 
     def log_transaction(self, tx_data):
         """
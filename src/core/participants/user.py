@@ -3,6 +3,7 @@ import time
 from enum import Enum
 # Исправленный импорт utils: используем относительный путь
 from .. import utils # Относительный импорт utils из core
+from .. import transaction
 
 class UserType(Enum):
     PHYSICAL = "physical"
@@ -11,7 +12,14 @@ class UserType(Enum):
 class User:
     """
     Класс, представляющий виртуального пользователя (физическое или юридическое лицо).
+    Поля хранятся в __slots__: в пиковом сценарии в памяти одновременно десятки тысяч пользователей.
     """
+    __slots__ = (
+        'id', 'type', 'offline_wallet', 'offline_wallet_expiry', 'offline_wallet_active',
+        'balance_non_cash', 'balance_digital', 'balance_offline',
+        'status_digital_wallet', 'status_offline_wallet',
+    )
+
     def __init__(self, user_id, user_type, initial_balance=10000):
         """
         Инициализирует пользователя.
@@ -36,6 +44,23 @@ class User:
         self.status_digital_wallet = "ЗАКРЫТ"
         self.status_offline_wallet = "ЗАКРЫТ"
 
+    @classmethod
+    def from_stored(cls, user_data):
+        """
+        Восстанавливает пользователя по записи БД (см. DatabaseManager.iter_users):
+        балансы и статусы кошельков берутся из хранилища, а не задаются начальными значениями.
+        """
+        user = cls(user_data['id'], UserType(user_data['type']), initial_balance=user_data['balance_non_cash'] or 0)
+        user.balance_digital = int(user_data['balance_digital'] or 0)
+        user.balance_offline = int(user_data['balance_offline'] or 0)
+        user.status_digital_wallet = user_data['status_digital_wallet'] or "ЗАКРЫТ"
+        user.status_offline_wallet = user_data['status_offline_wallet'] or "ЗАКРЫТ"
+        expiry = user_data['offline_wallet_expiry']
+        if expiry is not None:
+            user.offline_wallet_expiry = expiry.timestamp()
+            user.offline_wallet_active = user.status_offline_wallet == "ОТКРЫТ"
+        return user
+
     def create_digital_wallet(self):
         """Открывает цифровой кошелёк."""
         if self.status_digital_wallet == "ЗАКРЫТ":
@@ -108,7 +133,7 @@ class User:
     def create_offline_transaction(self, amount, recipient_id): # Поменяли порядок аргументов для соответствия вызову в tab_user.py
         """
         Создаёт офлайн-транзакцию.
-        Возвращает словарь с данными транзакции или None в случае ошибки.
+        Возвращает объект Transaction (подпись - в additional_data['signature']) или None в случае ошибки.
         """
         # --- ИСПРАВЛЕНИЕ: Проверяем активность офлайн-кошелька ---
         if not self.offline_wallet_active:
@@ -123,21 +148,18 @@ class User:
             print(f"[ERROR] Недостаточно средств на офлайн-кошельке пользователя {self.id}.")
             return None
 
-        tx_data = {
-            'sender_id': self.id,
-            'recipient_id': recipient_id,
-            'amount': amount,
-            'timestamp': time.time(),
-            'type': 'OFFLINE',
-            'status': 'ОФФЛАЙН'
-        }
+        timestamp = time.time()
         # Простая подпись данных (в реальной системе использовалась бы криптография)
         # Используем utils.calculate_hash
-        tx_data['signature'] = utils.calculate_hash(f"{self.id}{recipient_id}{amount}{tx_data['timestamp']}OFFLINE")
+        signature = utils.calculate_hash(f"{self.id}{recipient_id}{amount}{timestamp}OFFLINE")
+        offline_tx = transaction.Transaction(
+            self.id, recipient_id, amount, transaction.TransactionType.OFFLINE, None,
+            additional_data={'signature': signature}, timestamp=timestamp, status='ОФФЛАЙН'
+        )
 
         self.balance_offline -= amount
         print(f"[INFO] Создана офлайн-транзакция от {self.id} к {recipient_id} на сумму {amount}.")
-        return tx_data
+        return offline_tx
 
     def create_smart_contract(self, contract_details):
         """
@@ -0,0 +1,64 @@
+import json
+import zlib
+
+class StateOverlay:
+    """
+    Представление состояния балансов поверх базового словаря без его копирования.
+    Изменения записываются в журнал (только затронутые блоком счета) и либо применяются
+    к базовому состоянию одной операцией commit(), либо отбрасываются discard().
+    Базовое состояние до commit() не изменяется.
+    """
+    def __init__(self, base):
+        """
+        Args:
+            base (dict): Базовое состояние {user_id: balance}.
+        """
+        self.base = base
+        self.changes = {} # {user_id: новое значение} - только затронутые счета
+
+    def get(self, key, default=0):
+        """Возвращает значение с учётом журнала изменений."""
+        if key in self.changes:
+            return self.changes[key]
+        return self.base.get(key, default)
+
+    def __getitem__(self, key):
+        if key in self.changes:
+            return self.changes[key]
+        return self.base[key]
+
+    def __setitem__(self, key, value):
+        self.changes[key] = value
+
+    def __contains__(self, key):
+        return key in self.changes or key in self.base
+
+    def commit(self):
+        """Применяет журнал изменений к базовому состоянию и очищает его."""
+        self.base.update(self.changes)
+        self.changes = {}
+
+    def discard(self):
+        """Отбрасывает журнал изменений."""
+        self.changes = {}
+
+def encode_snapshot(balances, wallet_state):
+    """
+    Кодирует снимок состояния (балансы и состояние кошельков) в компактный вид:
+    JSON без пробелов, сжатый zlib.
+
+    Returns:
+        bytes: Сжатое представление снимка.
+    """
+    payload = {'balances': balances, 'wallet_state': wallet_state}
+    return zlib.compress(json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8'))
+
+def decode_snapshot(data):
+    """
+    Декодирует снимок, созданный encode_snapshot.
+
+    Returns:
+        tuple: (balances, wallet_state).
+    """
+    payload = json.loads(zlib.decompress(data).decode('utf-8'))
+    return payload['balances'], payload['wallet_state']
@@ -0,0 +1,146 @@
+import os
+import struct
+from . import codec
+
+# Трасса нагрузки - файл, в который записи только дописываются. После заголовка TRACE_MAGIC
+# идут записи с префиксом длины в каноническом бинарном представлении (см. codec):
+# однобайтовый тип записи и её поля. Неполная последняя запись (например, после аварийного
+# завершения) при чтении отбрасывается.
+TRACE_MAGIC = b'DRTRACE1'
+
+RECORD_HEADER = b'H' # Параметры симуляции (JSON)
+RECORD_USER = b'U' # Создание пользователя: user_id, тип, fo_id, начальный баланс
+RECORD_RUN = b'R' # Запуск цикла: длительность, ожидаемое количество транзакций
+RECORD_TRANSFER = b'T' # Перевод: время, fo_id, отправитель, получатель, сумма
+RECORD_OFFLINE = b'O' # Событие с офлайн-кошельком: время, user_id, fo_id, получатель
+RECORD_SMART_CONTRACT = b'S' # Событие со смарт-контрактом: время, user_id, fo_id
+
+EVENT_RECORDS = (RECORD_TRANSFER, RECORD_OFFLINE, RECORD_SMART_CONTRACT)
+
+class TraceWriter:
+    """
+    Запись сгенерированной нагрузки в трассу для последующего воспроизведения.
+    Записи дописываются в конец файла через буфер; flush() сбрасывает буфер на диск.
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Путь к файлу трассы. Существующий файл перезаписывается.
+        """
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(TRACE_MAGIC)
+        self.records_written = 0
+
+    def _write(self, kind, writer):
+        data = kind + writer.getvalue()
+        self.file.write(struct.pack(codec.LENGTH_FORMAT, len(data)))
+        self.file.write(data)
+        self.records_written += 1
+
+    def record_header(self, params):
+        writer = codec.Writer()
+        writer.write_json(params)
+        self._write(RECORD_HEADER, writer)
+
+    def record_user(self, user_id, user_type, fo_id, initial_balance):
+        writer = codec.Writer()
+        writer.write_str(user_id)
+        writer.write_str(user_type)
+        writer.write_str(fo_id)
+        writer.write_double(initial_balance)
+        self._write(RECORD_USER, writer)
+
+    def record_run(self, duration, expected_transactions):
+        writer = codec.Writer()
+        writer.write_double(duration)
+        writer.write_uint(expected_transactions)
+        self._write(RECORD_RUN, writer)
+
+    def record_transfer(self, at_time, fo_id, sender_id, recipient_id, amount):
+        writer = codec.Writer()
+        writer.write_double(at_time)
+        writer.write_str(fo_id)
+        writer.write_str(sender_id)
+        writer.write_str(recipient_id)
+        writer.write_number(amount)
+        self._write(RECORD_TRANSFER, writer)
+
+    def record_offline(self, at_time, user_id, fo_id, recipient_id):
+        writer = codec.Writer()
+        writer.write_double(at_time)
+        writer.write_str(user_id)
+        writer.write_str(fo_id)
+        writer.write_str(recipient_id)
+        self._write(RECORD_OFFLINE, writer)
+
+    def record_smart_contract(self, at_time, user_id, fo_id):
+        writer = codec.Writer()
+        writer.write_double(at_time)
+        writer.write_str(user_id)
+        writer.write_str(fo_id)
+        self._write(RECORD_SMART_CONTRACT, writer)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+_RECORD_FIELDS = {
+    RECORD_HEADER: lambda reader: (reader.read_json(),),
+    RECORD_USER: lambda reader: (reader.read_str(), reader.read_str(), reader.read_str(), reader.read_double()),
+    RECORD_RUN: lambda reader: (reader.read_double(), reader.read_uint()),
+    RECORD_TRANSFER: lambda reader: (reader.read_double(), reader.read_str(), reader.read_str(), reader.read_str(),
+                                     reader.read_number()),
+    RECORD_OFFLINE: lambda reader: (reader.read_double(), reader.read_str(), reader.read_str(), reader.read_str()),
+    RECORD_SMART_CONTRACT: lambda reader: (reader.read_double(), reader.read_str(), reader.read_str()),
+}
+
+class TraceReader:
+    """
+    Чтение трассы нагрузки. Каждый вызов iter_records() читает файл заново потоково,
+    поэтому трасса любого размера не загружается в память целиком.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+                raise ValueError(f"Файл {path} не является трассой нагрузки")
+        self.header = next((fields[0] for _, fields in self.iter_records((RECORD_HEADER,))), {})
+        self.run = next((fields for _, fields in self.iter_records((RECORD_RUN,))), None)
+
+    def iter_records(self, kinds=None):
+        """
+        Выдаёт записи (тип, поля) в порядке записи.
+
+        Args:
+            kinds (tuple, optional): Типы записей, которые нужно выдать. По умолчанию - все.
+        """
+        length_size = struct.calcsize(codec.LENGTH_FORMAT)
+        file_size = os.path.getsize(self.path)
+        with open(self.path, 'rb') as f:
+            f.seek(len(TRACE_MAGIC))
+            while f.tell() + length_size <= file_size:
+                length = struct.unpack(codec.LENGTH_FORMAT, f.read(length_size))[0]
+                if f.tell() + length > file_size:
+                    print(f"[WARN] Трасса {self.path} обрезана: неполная последняя запись пропущена.")
+                    return
+                data = f.read(length)
+                kind = data[:1]
+                if kinds is not None and kind not in kinds:
+                    continue
+                parse = _RECORD_FIELDS.get(kind)
+                if parse is None:
+                    raise ValueError(f"Неизвестный тип записи трассы: {kind!r}")
+                yield kind, parse(codec.Reader(data, 1))
+
+    def iter_users(self):
+        """Выдаёт (user_id, тип, fo_id, начальный баланс) в порядке создания пользователей."""
+        for _, fields in self.iter_records((RECORD_USER,)):
+            yield fields
+
+    def iter_events(self):
+        """Выдаёт события нагрузки (тип, поля) в порядке виртуального времени."""
+        return self.iter_records(EVENT_RECORDS)
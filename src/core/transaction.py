@@ -1,6 +1,7 @@
 import hashlib
 import time
 from enum import Enum
+from . import codec
 
 class TransactionType(Enum):
     C2C = "C2C" # Client to Client
@@ -17,8 +18,15 @@ class TransactionType(Enum):
 class Transaction:
     """
     Класс, представляющий транзакцию в системе цифрового рубля.
+    Единое представление транзакции от создания в ФО до включения в блок; словари (to_dict)
+    используются только на границах - при сохранении в БД и в сообщениях консенсуса.
+    Поля хранятся в __slots__ (без __dict__ у каждого объекта) в порядке FIELDS.
     """
-    def __init__(self, sender_id, recipient_id, amount, tx_type, fo_id, additional_data=None):
+    FIELDS = ('id', 'sender_id', 'recipient_id', 'amount', 'type', 'fo_id', 'timestamp', 'status', 'additional_data')
+    __slots__ = FIELDS
+
+    def __init__(self, sender_id, recipient_id, amount, tx_type, fo_id, additional_data=None,
+                 tx_id=None, timestamp=None, status='CREATED'):
         """
         Инициализирует транзакцию.
 
@@ -26,19 +34,23 @@ class Transaction:
             sender_id (str): ID отправителя.
             recipient_id (str): ID получателя.
             amount (float): Сумма транзакции.
-            tx_type (TransactionType): Тип транзакции.
+            tx_type (TransactionType | str): Тип транзакции.
             fo_id (str): ID ФО, через которую идёт транзакция.
             additional_data (dict, optional): Дополнительные данные (например, для смарт-контрактов).
+                None и пустой словарь различаются: они кодируются по-разному (см. encode) и дают разные хеши.
+            tx_id (str, optional): ID транзакции. По умолчанию вычисляется по её данным и времени.
+            timestamp (float, optional): Время создания. По умолчанию (None) - текущее; 0 допустим.
+            status (str): Начальный статус.
         """
-        self.id = hashlib.sha256(f"{sender_id}{recipient_id}{amount}{time.time()}".encode()).hexdigest()
+        self.id = tx_id or hashlib.sha256(f"{sender_id}{recipient_id}{amount}{time.time()}".encode()).hexdigest()
         self.sender_id = sender_id
         self.recipient_id = recipient_id
         self.amount = amount
-        self.type = tx_type.value # Сохраняем как строку
+        self.type = tx_type.value if isinstance(tx_type, TransactionType) else tx_type # Сохраняем как строку
         self.fo_id = fo_id
-        self.timestamp = time.time()
-        self.status = 'CREATED'
-        self.additional_data = additional_data or {}
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.status = status
+        self.additional_data = additional_data
 
     def to_dict(self):
         """
@@ -56,6 +68,72 @@ class Transaction:
             'additional_data': self.additional_data,
         }
 
+    @classmethod
+    def from_dict(cls, tx_data):
+        """
+        Восстанавливает транзакцию из словаря (из пула ФО или сообщения PROPOSE),
+        сохраняя её исходные id, время создания и статус.
+        """
+        tx = cls.__new__(cls)
+        tx.id = tx_data['id']
+        tx.sender_id = tx_data['sender_id']
+        tx.recipient_id = tx_data['recipient_id']
+        tx.amount = tx_data['amount']
+        tx.type = tx_data['type']
+        tx.fo_id = tx_data.get('fo_id')
+        tx.timestamp = tx_data.get('timestamp', time.time())
+        tx.status = tx_data.get('status', 'CREATED')
+        tx.additional_data = tx_data.get('additional_data')
+        return tx
+
+    def encode(self, include_status=True):
+        """
+        Возвращает каноническое бинарное представление транзакции (поля в порядке FIELDS,
+        строки и additional_data - с префиксом длины).
+
+        Args:
+            include_status (bool): Включать статус. Для хеша статус не учитывается,
+                так как он меняется после включения транзакции в блок.
+        """
+        writer = codec.Writer()
+        writer.write_str(self.id)
+        writer.write_str(self.sender_id)
+        writer.write_str(self.recipient_id)
+        writer.write_number(self.amount)
+        writer.write_str(self.type)
+        writer.write_str(self.fo_id)
+        writer.write_double(self.timestamp)
+        if include_status:
+            writer.write_str(self.status)
+        writer.write_json(self.additional_data)
+        return writer.getvalue()
+
+    @classmethod
+    def decode(cls, data):
+        """
+        Восстанавливает транзакцию из представления encode() (со статусом).
+        """
+        reader = codec.Reader(data)
+        tx = cls.__new__(cls)
+        tx.id = reader.read_str()
+        tx.sender_id = reader.read_str()
+        tx.recipient_id = reader.read_str()
+        tx.amount = reader.read_number()
+        tx.type = reader.read_str()
+        tx.fo_id = reader.read_str()
+        tx.timestamp = reader.read_double()
+        tx.status = reader.read_str()
+        tx.additional_data = reader.read_json()
+        if not reader.at_end():
+            raise ValueError("Лишние байты после транзакции")
+        return tx
+
+    def calculate_hash(self):
+        """
+        Вычисляет хеш транзакции по каноническому представлению без статуса.
+        """
+        return hashlib.sha256(self.encode(include_status=False)).hexdigest()
+
     def __repr__(self):
         return (f"Transaction(id={self.id}, sender={self.sender_id}, "
                 f"recipient={self.recipient_id}, amount={self.amount}, type={self.type})")
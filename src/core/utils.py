@@ -29,3 +29,97 @@ def validate_hash(hash_string, data):
     """
     computed_hash = calculate_hash(data)
     return computed_hash == hash_string
+
+def hash_to_bytes(hash_string):
+    """
+    Преобразует HEX-хеш в 32 байта для бинарного заголовка блока.
+    Короткие значения (например, "0" у генезис-блока) дополняются нулями слева.
+    """
+    return bytes.fromhex(hash_string.rjust(64, '0'))
+
+# Префиксы разделения доменов хешей дерева Меркла (RFC 6962): хеш листа не может совпасть
+# с хешем внутреннего узла, поэтому внутренний узел нельзя выдать за лист (second preimage)
+MERKLE_LEAF_PREFIX = b'\x00'
+MERKLE_NODE_PREFIX = b'\x01'
+
+def merkle_leaf(leaf_hash):
+    """
+    Вычисляет хеш листа дерева Меркла из HEX-хеша транзакции (с префиксом 0x00).
+    """
+    return hashlib.sha256(MERKLE_LEAF_PREFIX + hash_to_bytes(leaf_hash)).hexdigest()
+
+def merkle_parent(left_hash, right_hash):
+    """
+    Вычисляет хеш родительского узла дерева Меркла из двух дочерних HEX-хешей (с префиксом 0x01).
+    """
+    return hashlib.sha256(MERKLE_NODE_PREFIX + hash_to_bytes(left_hash) + hash_to_bytes(right_hash)).hexdigest()
+
+def merkle_root(leaf_hashes):
+    """
+    Вычисляет корень дерева Меркла по списку хешей листьев.
+    Листья и внутренние узлы хешируются с разными префиксами (merkle_leaf, merkle_parent).
+    При нечётном количестве узлов на уровне последний узел переносится на следующий уровень без изменений
+    (дублирование давало бы одинаковый корень для списка с повторённой последней транзакцией, CVE-2012-2459).
+
+    Args:
+        leaf_hashes (list): Список HEX-хешей листьев (транзакций).
+
+    Returns:
+        str: HEX-представление корня. Для пустого списка - 64 нуля.
+    """
+    if not leaf_hashes:
+        return '0' * 64
+    level = [merkle_leaf(leaf_hash) for leaf_hash in leaf_hashes]
+    while len(level) > 1:
+        level = _merkle_next_level(level)
+    return level[0]
+
+def _merkle_next_level(level):
+    """Строит следующий уровень дерева Меркла; непарный последний узел переносится без изменений."""
+    next_level = [merkle_parent(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2 == 1:
+        next_level.append(level[-1])
+    return next_level
+
+def merkle_proof(leaf_hashes, index):
+    """
+    Строит доказательство включения листа с номером index в дерево Меркла.
+
+    Args:
+        leaf_hashes (list): Список HEX-хешей листьев.
+        index (int): Позиция листа.
+
+    Returns:
+        list: Список пар (sibling_hash, is_left), где sibling_hash - хеш соседнего узла дерева
+              (для листа - с префиксом листа), а is_left=True означает, что сосед находится слева.
+    """
+    if index < 0 or index >= len(leaf_hashes):
+        raise IndexError(f"Лист {index} вне диапазона (всего {len(leaf_hashes)}).")
+    proof = []
+    level = [merkle_leaf(leaf_hash) for leaf_hash in leaf_hashes]
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append((level[sibling], sibling < index))
+        # Непарный последний узел переносится на следующий уровень без соседа
+        level = _merkle_next_level(level)
+        index //= 2
+    return proof
+
+def verify_merkle_proof(leaf_hash, proof, root):
+    """
+    Проверяет доказательство включения листа в дерево Меркла.
+
+    Args:
+        leaf_hash (str): HEX-хеш транзакции (хеш листа вычисляется через merkle_leaf).
+
+    Returns:
+        bool: True, если из листа и доказательства получается корень root.
+    """
+    current = merkle_leaf(leaf_hash)
+    for sibling_hash, is_left in proof:
+        if is_left:
+            current = merkle_parent(sibling_hash, current)
+        else:
+            current = merkle_parent(current, sibling_hash)
+    return current == root
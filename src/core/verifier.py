@@ -0,0 +1,140 @@
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+def _check_blocks(blocks):
+    """
+    Пересчитывает корень Меркла и хеш заголовка для пачки блоков (выполняется в процессе пула).
+
+    Returns:
+        list: [(index, причина)] для блоков, не прошедших проверку.
+    """
+    failures = []
+    for block in blocks:
+        if block.merkle_root != block.calculate_merkle_root():
+            failures.append((block.index, "корень Меркла не соответствует транзакциям"))
+        elif block.hash != block.calculate_hash():
+            failures.append((block.index, "хеш недействителен"))
+    return failures
+
+class ChainVerifier:
+    """
+    Проверка цепочки блоков с запоминанием последней проверенной высоты:
+    повторный аудит проверяет только блоки, добавленные после предыдущего.
+    Связность (previous_hash) проверяется одним проходом, хеши и корни Меркла длинных участков
+    пересчитываются параллельно в пуле процессов, балансы при необходимости повторно применяются.
+    """
+    def __init__(self, blockchain, workers=1, parallel_threshold=256, chunk_size=64):
+        """
+        Args:
+            blockchain (Blockchain): Проверяемая цепочка.
+            workers (int): Количество процессов. По умолчанию 1 - проверка идёт в текущем процессе;
+                пул процессов запускается, только если workers задано явно больше 1.
+            parallel_threshold (int): Минимальное число непроверенных блоков для запуска пула.
+            chunk_size (int): Количество блоков в одной задаче пула.
+        """
+        self.blockchain = blockchain
+        self.workers = max(1, workers or 1)
+        self.parallel_threshold = parallel_threshold
+        self.chunk_size = chunk_size
+        self._executor = None
+        self.reset()
+
+    def reset(self):
+        """Сбрасывает запомненный прогресс: следующий аудит проверит цепочку целиком."""
+        self.verified_position = 0 # Позиция в blockchain.chain, до которой цепочка проверена
+        self.verified_hash = None # Хеш блока на этой позиции
+        self.replayed_position = 0 # Позиция, до которой повторно применены балансы
+        self.balance_deltas = {} # {user_id: изменение баланса по блокам после chain[0]}
+
+    def _get_executor(self):
+        """Лениво создаёт пул процессов (spawn, как в mining.ParallelMiner)."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _check_hashes(self, blocks):
+        """Проверяет хеши блоков: параллельно для длинных участков, иначе в текущем процессе."""
+        if self.workers == 1 or len(blocks) < self.parallel_threshold:
+            return _check_blocks(blocks)
+        chunks = [blocks[i:i + self.chunk_size] for i in range(0, len(blocks), self.chunk_size)]
+        failures = []
+        for chunk_failures in self._get_executor().map(_check_blocks, chunks):
+            failures.extend(chunk_failures)
+        return failures
+
+    def _replay_balances(self, chain):
+        """
+        Повторно применяет транзакции блоков после replayed_position и сверяет итог с blockchain.state.
+        Исходные балансы - blockchain.base_state (снимок и эмиссия, не отражённые в блоках);
+        эмиссия учитывается целиком, поэтому её порядок относительно блоков не проверяется.
+        """
+        base_state = self.blockchain.base_state
+        deltas = self.balance_deltas
+        for position in range(max(1, self.replayed_position + 1), len(chain)):
+            for tx in chain[position].transactions:
+                sender_balance = base_state.get(tx.sender_id, 0) + deltas.get(tx.sender_id, 0)
+                if sender_balance < tx.amount:
+                    print(f"[ERROR] Повторное применение: недостаточно средств для транзакции {tx.id} "
+                          f"в блоке {chain[position].index}.")
+                    return False
+                deltas[tx.sender_id] = deltas.get(tx.sender_id, 0) - tx.amount
+                deltas[tx.recipient_id] = deltas.get(tx.recipient_id, 0) + tx.amount
+            self.replayed_position = position
+
+        current_state = self.blockchain.state
+        for user_id in set(current_state) | set(deltas) | set(base_state):
+            expected = base_state.get(user_id, 0) + deltas.get(user_id, 0)
+            if not math.isclose(current_state.get(user_id, 0), expected, abs_tol=1e-9):
+                print(f"[ERROR] Баланс {user_id} ({current_state.get(user_id, 0)}) не совпадает "
+                      f"с повторно вычисленным ({expected}).")
+                return False
+        return True
+
+    def verify(self, replay_balances=False):
+        """
+        Проверяет блоки, добавленные после последнего успешного аудита.
+
+        Args:
+            replay_balances (bool): Повторно применить транзакции и сверить балансы с состоянием цепочки.
+
+        Returns:
+            bool: True, если цепочка действительна.
+        """
+        chain = self.blockchain.chain
+        if self.verified_position >= len(chain) or chain[self.verified_position].hash != self.verified_hash:
+            # Цепочка заменена (например, восстановлена из БД) - проверяем заново
+            self.reset()
+
+        start = self.verified_position + 1
+        new_blocks = chain[start:]
+
+        # Связность - одним проходом
+        for position in range(start, len(chain)):
+            if chain[position].previous_hash != chain[position - 1].hash:
+                print(f"[ERROR] previous_hash блока {position} не совпадает с хешем блока {position - 1}.")
+                return False
+
+        failures = self._check_hashes(new_blocks)
+        if failures:
+            index, reason = min(failures)
+            print(f"[ERROR] Блок {index}: {reason}.")
+            return False
+
+        if chain:
+            self.verified_position = len(chain) - 1
+            self.verified_hash = chain[-1].hash
+
+        if replay_balances and not self._replay_balances(chain):
+            # Частично применённые изменения недостоверны - следующий аудит пересчитает балансы заново
+            self.replayed_position = 0
+            self.balance_deltas = {}
+            return False
+        return True
+
+    def shutdown(self):
+        """Останавливает пул процессов."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,170 @@
+import math
+import numpy as np
+
+ARRIVAL_PROFILES = ('poisson', 'diurnal')
+PAIR_DISTRIBUTIONS = ('uniform', 'zipf')
+
+class WorkloadChunk:
+    """
+    Порция сгенерированной нагрузки: поступления транзакций в порядке виртуального времени.
+    Все поля - списки одинаковой длины (преобразованы из массивов NumPy одной операцией).
+    """
+    __slots__ = ('timestamps', 'fo_ids', 'sender_ids', 'recipient_ids', 'amounts')
+
+    def __init__(self, timestamps, fo_ids, sender_ids, recipient_ids, amounts):
+        self.timestamps = timestamps
+        self.fo_ids = fo_ids
+        self.sender_ids = sender_ids
+        self.recipient_ids = recipient_ids
+        self.amounts = amounts
+
+    def __len__(self):
+        return len(self.timestamps)
+
+class WorkloadGenerator:
+    """
+    Векторизованный генератор нагрузки: моменты поступления транзакций, пары отправитель-получатель
+    и суммы формируются массивами NumPy порциями по chunk_size и выдаются симулятору потоком,
+    поэтому генерация нагрузки почти ничего не стоит по сравнению с моделируемой системой.
+    Отправитель и получатель всегда обслуживаются одной ФО.
+
+    Профили поступления:
+        - 'poisson': однородный пуассоновский поток с интенсивностью total_transactions / duration;
+        - 'diurnal': неоднородный пуассоновский поток (метод прореживания) с суточным профилем,
+          сжатым в diurnal_period: минимум в начале и конце периода, пик в середине.
+    Распределение пар:
+        - 'uniform': все пользователи равновероятны;
+        - 'zipf': популярность пользователей по закону Ципфа с показателем zipf_exponent
+          (ранги назначаются случайной перестановкой пользователей).
+    """
+    def __init__(self, users_by_fo, duration, total_transactions, arrival_profile='poisson',
+                 pair_distribution='uniform', zipf_exponent=1.1, amount_range=(10, 1000),
+                 diurnal_amplitude=0.8, diurnal_period=None, chunk_size=10000, seed=None):
+        """
+        Args:
+            users_by_fo (dict): {fo_id: [user_id, ...]} - пользователи каждой ФО.
+            duration (float): Длительность нагрузки в секундах виртуального времени.
+            total_transactions (int): Ожидаемое количество поступлений за duration.
+            arrival_profile (str): Профиль поступления ('poisson' или 'diurnal').
+            pair_distribution (str): Распределение пар ('uniform' или 'zipf').
+            zipf_exponent (float): Показатель распределения Ципфа.
+            amount_range (tuple): Диапазон целых сумм [min, max).
+            diurnal_amplitude (float): Относительная амплитуда суточного профиля (0..1).
+            diurnal_period (float, optional): Период суточного профиля. По умолчанию равен duration.
+            chunk_size (int): Количество кандидатов на поступление в одной порции.
+            seed (int, optional): Начальное значение генератора случайных чисел.
+        """
+        if arrival_profile not in ARRIVAL_PROFILES:
+            raise ValueError(f"Неизвестный профиль поступления: {arrival_profile}")
+        if pair_distribution not in PAIR_DISTRIBUTIONS:
+            raise ValueError(f"Неизвестное распределение пар: {pair_distribution}")
+        if not 0 <= diurnal_amplitude <= 1:
+            raise ValueError("Амплитуда суточного профиля должна быть в диапазоне [0, 1]")
+        self.duration = duration
+        self.rate = total_transactions / duration if duration > 0 else 0.0
+        self.arrival_profile = arrival_profile
+        self.pair_distribution = pair_distribution
+        self.zipf_exponent = zipf_exponent
+        self.amount_range = amount_range
+        self.diurnal_amplitude = diurnal_amplitude
+        self.diurnal_period = diurnal_period or duration
+        self.chunk_size = chunk_size
+        self.rng = np.random.default_rng(seed)
+
+        # Пользователи упорядочены по ФО: ФО k занимает отрезок [fo_start[k], fo_start[k] + fo_size[k])
+        self.fo_ids = [fo_id for fo_id, fo_users in users_by_fo.items() if fo_users]
+        self.user_ids = np.array([user_id for fo_id in self.fo_ids for user_id in users_by_fo[fo_id]], dtype=object)
+        self.fo_size = np.array([len(users_by_fo[fo_id]) for fo_id in self.fo_ids], dtype=np.int64)
+        self.fo_start = np.concatenate(([0], np.cumsum(self.fo_size)[:-1])).astype(np.int64)
+        self.user_fo = np.repeat(np.arange(len(self.fo_ids)), self.fo_size)
+
+        weights = self._popularity_weights()
+        # Отправителями могут быть только пользователи ФО, в которых есть хотя бы ещё один пользователь
+        sender_weights = np.where(self.fo_size[self.user_fo] > 1, weights, 0.0)
+        self.sender_cdf = self._cdf(sender_weights)
+        # Для выбора получателя - отдельная функция распределения внутри каждой ФО
+        self.fo_cdfs = [self._cdf(weights[start:start + size]) for start, size in zip(self.fo_start, self.fo_size)]
+
+    @classmethod
+    def from_financial_orgs(cls, financial_orgs, duration, total_transactions, **kwargs):
+        """Создаёт генератор по словарю {fo_id: FinancialOrg} с учётом текущего распределения пользователей."""
+        users_by_fo = {fo_id: list(fo_instance.users.keys()) for fo_id, fo_instance in financial_orgs.items()}
+        return cls(users_by_fo, duration, total_transactions, **kwargs)
+
+    def _popularity_weights(self):
+        """Веса популярности пользователей (в порядке self.user_ids)."""
+        num_users = len(self.user_ids)
+        if self.pair_distribution == 'uniform':
+            return np.ones(num_users)
+        ranks = self.rng.permutation(num_users) + 1
+        return 1.0 / np.power(ranks, self.zipf_exponent)
+
+    @staticmethod
+    def _cdf(weights):
+        """Нормированная функция распределения для выборки через searchsorted."""
+        cdf = np.cumsum(weights, dtype=np.float64)
+        if cdf.size and cdf[-1] > 0:
+            cdf /= cdf[-1]
+        return cdf
+
+    def _arrival_rate(self, timestamps):
+        """Интенсивность поступления в заданные моменты (для профиля 'diurnal')."""
+        phase = 2 * math.pi * timestamps / self.diurnal_period
+        return self.rate * (1 - self.diurnal_amplitude * np.cos(phase))
+
+    def _generate_timestamps(self, start_time):
+        """
+        Генерирует моменты поступления после start_time.
+
+        Returns:
+            tuple: (моменты поступления, момент последнего кандидата).
+        """
+        if self.arrival_profile == 'poisson':
+            timestamps = start_time + np.cumsum(self.rng.exponential(1 / self.rate, self.chunk_size))
+            return timestamps, timestamps[-1]
+        # Прореживание: кандидаты с максимальной интенсивностью, каждый принимается
+        # с вероятностью rate(t) / max_rate
+        max_rate = self.rate * (1 + self.diurnal_amplitude)
+        candidates = start_time + np.cumsum(self.rng.exponential(1 / max_rate, self.chunk_size))
+        accepted = self.rng.random(self.chunk_size) * max_rate < self._arrival_rate(candidates)
+        return candidates[accepted], candidates[-1]
+
+    def _generate_pairs(self, count):
+        """Генерирует индексы отправителей и получателей (внутри ФО отправителя)."""
+        senders = np.searchsorted(self.sender_cdf, self.rng.random(count), side='right')
+        sender_fo = self.user_fo[senders]
+        recipients = np.empty(count, dtype=np.int64)
+        for fo_index in np.unique(sender_fo):
+            mask = sender_fo == fo_index
+            start, size = self.fo_start[fo_index], self.fo_size[fo_index]
+            local = np.searchsorted(self.fo_cdfs[fo_index], self.rng.random(int(mask.sum())), side='right')
+            local = np.minimum(local, size - 1)
+            # Совпавший с отправителем получатель заменяется следующим пользователем той же ФО
+            collided = local == senders[mask] - start
+            local[collided] = (local[collided] + 1) % size
+            recipients[mask] = start + local
+        return senders, recipients, sender_fo
+
+    def iter_chunks(self):
+        """
+        Выдаёт порции нагрузки (WorkloadChunk) до окончания интервала duration.
+        """
+        if self.rate <= 0 or not self.sender_cdf.size or self.sender_cdf[-1] <= 0:
+            return
+        fo_ids = np.array(self.fo_ids, dtype=object)
+        current_time = 0.0
+        while current_time < self.duration:
+            timestamps, current_time = self._generate_timestamps(current_time)
+            timestamps = timestamps[timestamps < self.duration]
+            count = len(timestamps)
+            if not count:
+                continue
+            senders, recipients, sender_fo = self._generate_pairs(count)
+            amounts = self.rng.integers(self.amount_range[0], self.amount_range[1], count)
+            yield WorkloadChunk(
+                timestamps.tolist(),
+                fo_ids[sender_fo].tolist(),
+                self.user_ids[senders].tolist(),
+                self.user_ids[recipients].tolist(),
+                amounts.tolist(),
+            )
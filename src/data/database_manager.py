@@ -5,31 +5,159 @@
 """
 
 # --- ИМПОРТЫ ---
-from sqlalchemy import create_engine
+from sqlalchemy import MetaData, Table, and_, create_engine, event, inspect, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 # ИМПОРТИРУЕМ models из ТОГО ЖЕ ПАКЕТА (data)
 from . import models  # <-- ОТНОСИТЕЛЬНЫЙ ИМПОРТ, КРИТИЧЕСКИ ВАЖЕН
 import os
 import json
+import time
+import queue
+import atexit
 import datetime
+import threading
 # --- КОНЕЦ ИМПОРТОВ ---
 
+# --- ПОТОКОВОЕ ЧТЕНИЕ ---
+# Размер страницы потокового чтения (iter_users, iter_transactions, iter_blocks)
+DEFAULT_PAGE_SIZE = 5000
+
+# Интервал (сек.), с которым flush() и close() проверяют, что фоновый поток записи ещё работает
+WRITER_POLL_INTERVAL = 0.5
+
+# Поля, возвращаемые потоковыми читателями
+USER_FIELDS = ('id', 'type', 'balance_non_cash', 'balance_digital', 'balance_offline',
+               'status_digital_wallet', 'status_offline_wallet', 'offline_wallet_expiry')
+TRANSACTION_FIELDS = ('id', 'sender_id', 'recipient_id', 'amount', 'type', 'fo_id',
+                      'timestamp', 'status', 'block_hash')
+BLOCK_FIELDS = ('index', 'hash', 'previous_hash', 'merkle_root', 'timestamp', 'nonce', 'tx_count')
+
+# --- ПРОФИЛИ ХРАНЕНИЯ SQLite ---
+# journal_mode=WAL позволяет читателям (UI) не блокировать писателя (консенсус, фоновая запись).
+# synchronous задаёт, когда выполняется fsync: FULL - при каждом коммите, NORMAL - при checkpoint WAL,
+# OFF - никогда (данные могут потеряться при сбое ОС, подходит только для замеров производительности).
+# cache_size в отрицательных значениях задаётся в КиБ.
+STORAGE_PROFILES = {
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -16000, # ~16 МБ
+        'mmap_size': 0,
+        'busy_timeout': 5000, # мс
+        'temp_store': 'DEFAULT',
+        'pool_size': 5,
+        'max_overflow': 10,
+    },
+    'balanced': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000, # ~64 МБ
+        'mmap_size': 256 * 1024 * 1024,
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+        'pool_size': 10,
+        'max_overflow': 20,
+    },
+    'benchmark': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -256000, # ~256 МБ
+        'mmap_size': 1024 * 1024 * 1024,
+        'busy_timeout': 10000,
+        'temp_store': 'MEMORY',
+        'pool_size': 20,
+        'max_overflow': 20,
+    },
+}
+
 class DatabaseManager:
     """
     Класс для управления подключением и операциями с базой данных.
     """
-    def __init__(self, db_path="sqlite:///../../db/simulation_data.db"):
+    def __init__(self, db_path="sqlite:///../../db/simulation_data.db", write_behind=True,
+                 flush_interval=0.5, batch_size=1000, max_queue_size=100000, storage_profile='balanced'):
         """
         Инициализирует менеджер БД.
+
+        Args:
+            db_path (str): URL базы данных.
+            storage_profile (str): Профиль настройки SQLite из STORAGE_PROFILES
+                ('durable', 'balanced' или 'benchmark').
+            write_behind (bool): Сохранять пользователей, транзакции и блоки в фоновом потоке
+                пакетами, не блокируя вызывающий код.
+            flush_interval (float): Максимальная задержка записи пакета (сек).
+            batch_size (int): Размер пакета, при котором запись выполняется не дожидаясь flush_interval.
+            max_queue_size (int): Размер очереди записи; при переполнении вызывающий поток ждёт.
         """
+        if storage_profile not in STORAGE_PROFILES:
+            raise ValueError(f"Неизвестный профиль хранения: {storage_profile}. Доступны: {', '.join(STORAGE_PROFILES)}")
+        self.storage_profile = storage_profile
+
         # Убедимся, что директория для БД существует
         db_dir = os.path.dirname(db_path.replace("sqlite:///", ""))
-        os.makedirs(db_dir, exist_ok=True)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
 
-        self.engine = create_engine(db_path, echo=False) # echo=True для отладки SQL
+        self.engine = self._create_engine(db_path, STORAGE_PROFILES[storage_profile])
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
         self.create_tables() # Вызываем create_tables после инициализации engine
 
+        # --- Фоновая пакетная запись (write-behind) ---
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._columns = {model: set(self._column_names(model)) for model in (models.User, models.Transaction)}
+        self._write_lock = threading.Lock() # Согласует постановку в очередь с close()
+        self._write_queue = None
+        self._writer_thread = None
+        if write_behind:
+            self._write_queue = queue.Queue(maxsize=max_queue_size)
+            self._writer_thread = threading.Thread(target=self._writer_loop, args=(self._write_queue,), name="db-writer")
+            self._writer_thread.daemon = True
+            self._writer_thread.start()
+            atexit.register(self.close)
+
+    def _create_engine(self, db_path, profile):
+        """
+        Создаёт engine с пулом соединений для многопоточного доступа
+        и применяет PRAGMA профиля к каждому новому соединению SQLite.
+        """
+        if not db_path.startswith("sqlite"):
+            return create_engine(db_path, echo=False)
+
+        if db_path in ("sqlite://", "sqlite:///:memory:"):
+            # БД в памяти существует только в рамках одного соединения
+            engine = create_engine(db_path, echo=False, poolclass=StaticPool,
+                                   connect_args={'check_same_thread': False})
+        else:
+            engine = create_engine(
+                db_path,
+                echo=False, # echo=True для отладки SQL
+                poolclass=QueuePool,
+                pool_size=profile['pool_size'],
+                max_overflow=profile['max_overflow'],
+                # Соединения пула используются из потоков симуляции, реплик, фоновой записи и UI
+                connect_args={'check_same_thread': False, 'timeout': profile['busy_timeout'] / 1000},
+            )
+
+        @event.listens_for(engine, "connect")
+        def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute(f"PRAGMA journal_mode={profile['journal_mode']}")
+                cursor.execute(f"PRAGMA synchronous={profile['synchronous']}")
+                cursor.execute(f"PRAGMA cache_size={profile['cache_size']}")
+                cursor.execute(f"PRAGMA mmap_size={profile['mmap_size']}")
+                cursor.execute(f"PRAGMA busy_timeout={profile['busy_timeout']}")
+                cursor.execute(f"PRAGMA temp_store={profile['temp_store']}")
+            finally:
+                cursor.close()
+
+        print(f"[DB] Профиль хранения '{self.storage_profile}': journal_mode={profile['journal_mode']}, "
+              f"synchronous={profile['synchronous']}, пул {profile['pool_size']}+{profile['max_overflow']}.")
+        return engine
+
     def create_tables(self):
         """
         Создаёт таблицы в БД на основе моделей SQLAlchemy.
@@ -44,7 +172,15 @@ class DatabaseManager:
                 raise AttributeError("Модуль 'models' не содержит атрибут 'Base'")
             print(f"[DB] Base найден в models: {base_attr}") # Для отладки
 
+            legacy_blocks = self._take_legacy_blocks()
             models.Base.metadata.create_all(bind=self.engine)
+            self._add_missing_columns(models.Block)
+            if legacy_blocks:
+                self._write_blocks(legacy_blocks)
+                print(f"[DB] Перенесено {len(legacy_blocks)} блоков в нормализованную схему.")
+            # create_all не добавляет индексы в уже существующие таблицы - создаём недостающие
+            for index in models.Transaction.__table__.indexes:
+                index.create(bind=self.engine, checkfirst=True)
             print(f"[DB] Таблицы созданы в {self.engine.url}")
         except AttributeError as e:
             print(f"[ERROR] Ошибка при создании таблиц: {e}")
@@ -54,6 +190,46 @@ class DatabaseManager:
             raise # Переподнимаем исключение
         # --- КОНЕЦ КРИТИЧЕСКОГО ИСПРАВЛЕНИЯ ---
 
+    def _add_missing_columns(self, model):
+        """
+        Добавляет в существующую таблицу колонки модели, появившиеся позже (create_all их не добавляет).
+        Поддерживаются только колонки, допускающие NULL.
+        """
+        table = model.__table__
+        existing = {column['name'] for column in inspect(self.engine).get_columns(table.name)}
+        with self.engine.begin() as connection:
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=self.engine.dialect)
+                    connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}')
+                    print(f"[DB] В таблицу {table.name} добавлена колонка {column.name}.")
+
+    def _take_legacy_blocks(self):
+        """
+        Забирает блоки из таблицы старой схемы (с колонкой transactions_json) и удаляет её,
+        чтобы create_all создал нормализованные таблицы blocks и block_transactions.
+
+        Returns:
+            list: Словари блоков в формате Block.to_dict (пустой, если миграция не нужна).
+        """
+        if 'blocks' not in inspect(self.engine).get_table_names():
+            return []
+        with self.engine.begin() as connection:
+            legacy_table = Table('blocks', MetaData(), autoload_with=connection)
+            if 'transactions_json' not in legacy_table.c:
+                return []
+            legacy_blocks = [{
+                    'index': row.index,
+                    'hash': row.hash,
+                    'previous_hash': row.previous_hash,
+                    'transactions': json.loads(row.transactions_json),
+                    'timestamp': row.timestamp,
+                    'nonce': row.nonce,
+                } for row in connection.execute(select(legacy_table))]
+            legacy_table.drop(connection)
+        print(f"[DB] Найдена таблица blocks старой схемы ({len(legacy_blocks)} блоков), выполняется миграция.")
+        return legacy_blocks
+
     def get_session(self):
         """
         Возвращает сессию SQLAlchemy для выполнения операций.
@@ -69,6 +245,15 @@ class DatabaseManager:
     def save_user(self, user_data):
         """
         Сохраняет или обновляет данные пользователя в БД.
+        В режиме write-behind запись ставится в очередь и выполняется фоновым потоком.
+        """
+        if self._enqueue_write('user', user_data['id'], user_data):
+            return
+        self._save_user_sync(user_data)
+
+    def _save_user_sync(self, user_data):
+        """
+        Сохраняет или обновляет данные пользователя в БД в текущем потоке.
         """
         session = self.get_session()
         try:
@@ -108,9 +293,29 @@ class DatabaseManager:
         finally:
             self.close_session(session)
 
+    def bulk_save_users(self, users_data):
+        """
+        Сохраняет список пользователей одним пакетным upsert в одной транзакции БД.
+        Выполняется синхронно (минуя очередь write-behind), чтобы после возврата пользователи уже были в БД.
+
+        Args:
+            users_data (list): Список словарей get_wallet_info.
+        """
+        rows = [self._prepare_user_row(user_data) for user_data in users_data]
+        self._write_batch(models.User, rows, users_data, self._save_user_sync)
+
     def save_transaction(self, tx_data):
         """
         Сохраняет транзакцию в БД.
+        В режиме write-behind запись ставится в очередь и выполняется фоновым потоком.
+        """
+        if self._enqueue_write('transaction', tx_data['id'], tx_data):
+            return
+        self._save_transaction_sync(tx_data)
+
+    def _save_transaction_sync(self, tx_data):
+        """
+        Сохраняет транзакцию в БД в текущем потоке.
         """
         session = self.get_session()
         try:
@@ -137,6 +342,15 @@ class DatabaseManager:
     def save_block(self, block_data):
         """
         Сохраняет блок в БД.
+        В режиме write-behind запись ставится в очередь и выполняется фоновым потоком.
+        """
+        if self._enqueue_write('block', block_data['hash'], block_data):
+            return
+        self._save_block_sync(block_data)
+
+    def _save_block_sync(self, block_data):
+        """
+        Сохраняет блок в БД в текущем потоке.
         """
         session = self.get_session()
         try:
@@ -144,27 +358,321 @@ class DatabaseManager:
             if db_block:
                 print(f"[WARN] Блок с хешем {block_data['hash']} уже существует в БД.")
                 return
-            block_data_for_db = block_data.copy()
-            if 'timestamp' in block_data_for_db and isinstance(block_data_for_db['timestamp'], float):
-                block_data_for_db['timestamp'] = datetime.datetime.fromtimestamp(block_data_for_db['timestamp'])
-            tx_json = json.dumps(block_data_for_db.get('transactions', []), default=str)
-            db_block = models.Block(
-                index=block_data_for_db['index'],
-                hash=block_data_for_db['hash'],
-                previous_hash=block_data_for_db['previous_hash'],
-                transactions_json=tx_json,
-                timestamp=block_data_for_db['timestamp'],
-                nonce=block_data_for_db['nonce']
-            )
-            session.add(db_block)
+            session.add(models.Block(**self._prepare_block_row(block_data)))
+            session.add_all([models.BlockTransaction(**row)
+                             for row in self._prepare_block_transaction_rows(block_data)])
             session.commit()
-            print(f"[DB] Блок {block_data_for_db['index']} (hash {block_data_for_db['hash'][:8]}) сохранён.")
+            print(f"[DB] Блок {block_data['index']} (hash {block_data['hash'][:8]}) сохранён.")
         except Exception as e:
             session.rollback()
             print(f"[ERROR] Не удалось сохранить блок {block_data['index']}: {e}")
         finally:
             self.close_session(session)
 
+    def save_state_snapshot(self, height, block_hash, data):
+        """
+        Сохраняет снимок состояния на высоте height.
+        В режиме write-behind снимок записывается после блоков того же пакета.
+
+        Args:
+            height (int): Индекс блока, на котором снят снимок.
+            block_hash (str): Хеш этого блока.
+            data (bytes): Сжатый снимок (core.state.encode_snapshot).
+        """
+        snapshot_data = {'height': height, 'block_hash': block_hash, 'timestamp': time.time(), 'data': data}
+        if self._enqueue_write('snapshot', height, snapshot_data):
+            return
+        self._save_state_snapshot_sync(snapshot_data)
+
+    def _save_state_snapshot_sync(self, snapshot_data):
+        """
+        Сохраняет снимок состояния в текущем потоке (существующий снимок той же высоты заменяется).
+        """
+        session = self.get_session()
+        try:
+            session.merge(models.StateSnapshot(**self._prepare_snapshot_row(snapshot_data)))
+            session.commit()
+            print(f"[DB] Снимок состояния на высоте {snapshot_data['height']} сохранён "
+                  f"({len(snapshot_data['data'])} байт).")
+        except Exception as e:
+            session.rollback()
+            print(f"[ERROR] Не удалось сохранить снимок состояния на высоте {snapshot_data['height']}: {e}")
+        finally:
+            self.close_session(session)
+
+    def get_latest_state_snapshot(self):
+        """
+        Получает последний снимок состояния, блок которого уже сохранён в БД.
+
+        Returns:
+            dict | None: {'height', 'block_hash', 'data'} или None, если снимков нет.
+        """
+        session = self.get_session()
+        try:
+            snapshot = (session.query(models.StateSnapshot)
+                        .join(models.Block, models.Block.hash == models.StateSnapshot.block_hash)
+                        .order_by(models.StateSnapshot.height.desc())
+                        .first())
+            if snapshot is None:
+                return None
+            return {'height': snapshot.height, 'block_hash': snapshot.block_hash, 'data': snapshot.data}
+        finally:
+            self.close_session(session)
+
+    # --- Фоновая пакетная запись (write-behind) ---
+
+    def _enqueue_write(self, kind, key, data):
+        """
+        Ставит запись в очередь фонового потока.
+
+        Returns:
+            bool: False, если режим write-behind выключен, менеджер закрыт или фоновый поток
+                завершился (нужна синхронная запись).
+        """
+        with self._write_lock:
+            if self._write_queue is None or not self._writer_thread.is_alive():
+                return False
+            # Копируем данные: вызывающий код может изменить словарь до записи
+            self._write_queue.put((kind, key, dict(data)))
+            return True
+
+    def _writer_loop(self, write_queue):
+        """
+        Цикл фонового потока: накапливает записи, объединяя повторные записи одного объекта,
+        и сохраняет их пакетом по размеру batch_size или раз в flush_interval.
+        Ошибка записи пакета не останавливает поток: пакет отбрасывается с сообщением [ERROR],
+        а ожидающие flush() и close() всё равно получают сигнал завершения.
+        """
+        pending = {} # {(kind, key): data} - последние данные каждого объекта
+        last_flush_time = time.time()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.time() - last_flush_time))
+            try:
+                kind, key, data = write_queue.get(timeout=timeout)
+            except queue.Empty:
+                kind = None
+            try:
+                if kind == '_flush' or kind == '_stop':
+                    self._write_pending_safely(pending)
+                    pending = {}
+                    last_flush_time = time.time()
+                    if kind == '_stop':
+                        return
+                    continue
+                if kind is not None:
+                    # Повторные записи одного объекта объединяются: более поздние поля перекрывают ранние
+                    pending.setdefault((kind, key), {}).update(data)
+                if not pending:
+                    last_flush_time = time.time()
+                elif len(pending) >= self.batch_size or time.time() - last_flush_time >= self.flush_interval:
+                    self._write_pending_safely(pending)
+                    pending = {}
+                    last_flush_time = time.time()
+            except Exception as e:
+                print(f"[ERROR] Фоновая запись в БД: не удалось обработать {kind} {key}: {e}")
+            finally:
+                if kind == '_flush' or kind == '_stop':
+                    data.set()
+                if kind is not None:
+                    write_queue.task_done()
+
+    def _write_pending_safely(self, pending):
+        """
+        Записывает накопленные данные; при ошибке пакет отбрасывается, чтобы фоновый поток продолжил работу.
+        """
+        try:
+            self._write_pending(pending)
+        except Exception as e:
+            print(f"[ERROR] Не удалось записать пакет из {len(pending)} объектов в БД, пакет отброшен: {e}")
+
+    def _write_pending(self, pending):
+        """
+        Записывает накопленные данные: пользователи, затем транзакции, блоки и снимки состояния.
+        """
+        if not pending:
+            return
+        users = [data for (kind, _), data in pending.items() if kind == 'user']
+        transactions = [data for (kind, _), data in pending.items() if kind == 'transaction']
+        blocks = [data for (kind, _), data in pending.items() if kind == 'block']
+        snapshots = [data for (kind, _), data in pending.items() if kind == 'snapshot']
+        self._write_batch(models.User, [self._prepare_user_row(u) for u in users], users, self._save_user_sync)
+        self._write_batch(models.Transaction, [self._prepare_transaction_row(t) for t in transactions],
+                          transactions, self._save_transaction_sync)
+        self._write_blocks(blocks)
+        self._write_batch(models.StateSnapshot, [self._prepare_snapshot_row(s) for s in snapshots],
+                          snapshots, self._save_state_snapshot_sync)
+
+    def _write_blocks(self, blocks):
+        """
+        Записывает заголовки блоков, затем их связи с транзакциями.
+        """
+        self._write_batch(models.Block, [self._prepare_block_row(b) for b in blocks], blocks,
+                          self._save_block_sync, update=False)
+        link_rows = [row for b in blocks for row in self._prepare_block_transaction_rows(b)]
+        self._write_batch(models.BlockTransaction, link_rows, blocks,
+                          self._save_block_transactions_sync, update=False)
+
+    def _save_block_transactions_sync(self, block_data):
+        """
+        Сохраняет связи блока с транзакциями в текущем потоке (уже существующие пропускаются).
+        """
+        rows = self._prepare_block_transaction_rows(block_data)
+        if not rows:
+            return
+        session = self.get_session()
+        try:
+            session.execute(sqlite_insert(models.BlockTransaction.__table__).on_conflict_do_nothing(), rows)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"[ERROR] Не удалось сохранить состав блока {block_data['index']}: {e}")
+        finally:
+            self.close_session(session)
+
+    def _write_batch(self, model, rows, source_items, fallback, update=True):
+        """
+        Выполняет пакетный upsert строк одной таблицы (INSERT ... ON CONFLICT в режиме executemany).
+        Строки группируются по набору колонок, так как executemany требует одинаковых параметров.
+        При ошибке пакета записи повторяются по одной через синхронный метод fallback.
+        """
+        if not rows:
+            return
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+        session = self.get_session()
+        try:
+            for columns, group_rows in groups.items():
+                stmt = sqlite_insert(model.__table__)
+                pk_columns = [c.name for c in model.__table__.primary_key.columns]
+                update_columns = {c: stmt.excluded[c] for c in columns if c not in pk_columns}
+                if update and update_columns:
+                    stmt = stmt.on_conflict_do_update(index_elements=pk_columns, set_=update_columns)
+                else:
+                    stmt = stmt.on_conflict_do_nothing()
+                session.execute(stmt, group_rows)
+            session.commit()
+            print(f"[DB] Пакетно сохранено {len(rows)} записей в {model.__tablename__}.")
+        except Exception as e:
+            session.rollback()
+            print(f"[ERROR] Не удалось пакетно сохранить {len(rows)} записей в {model.__tablename__}: {e}. Сохраняем по одной.")
+            for item in source_items:
+                fallback(item)
+        finally:
+            self.close_session(session)
+
+    @staticmethod
+    def _column_names(model):
+        """Возвращает имена колонок модели."""
+        return [column.key for column in inspect(model).columns]
+
+    def _prepare_user_row(self, user_data):
+        """Готовит строку таблицы users из словаря get_wallet_info."""
+        row = {k: v for k, v in user_data.items() if k in self._columns[models.User]}
+        if isinstance(row.get('offline_wallet_expiry'), str):
+            try:
+                row['offline_wallet_expiry'] = datetime.datetime.fromisoformat(row['offline_wallet_expiry'])
+            except ValueError:
+                row['offline_wallet_expiry'] = None
+        return row
+
+    def _prepare_transaction_row(self, tx_data):
+        """Готовит строку таблицы transactions из словаря транзакции."""
+        row = {k: v for k, v in tx_data.items() if k in self._columns[models.Transaction]}
+        if isinstance(row.get('timestamp'), float):
+            row['timestamp'] = datetime.datetime.fromtimestamp(row['timestamp'])
+        if isinstance(row.get('additional_data'), dict):
+            row['additional_data'] = json.dumps(row['additional_data'], default=str)
+        return row
+
+    def _prepare_block_row(self, block_data):
+        """Готовит строку заголовка таблицы blocks из словаря Block.to_dict."""
+        timestamp = block_data['timestamp']
+        if isinstance(timestamp, float):
+            timestamp = datetime.datetime.fromtimestamp(timestamp)
+        return {
+            'index': block_data['index'],
+            'hash': block_data['hash'],
+            'previous_hash': block_data['previous_hash'],
+            'merkle_root': block_data.get('merkle_root'),
+            'timestamp': timestamp,
+            'nonce': block_data['nonce'],
+            'tx_count': len(block_data.get('transactions', [])),
+            'data': block_data.get('data'),
+        }
+
+    @staticmethod
+    def _prepare_snapshot_row(snapshot_data):
+        """Готовит строку таблицы state_snapshots."""
+        row = dict(snapshot_data)
+        if isinstance(row.get('timestamp'), float):
+            row['timestamp'] = datetime.datetime.fromtimestamp(row['timestamp'])
+        return row
+
+    @staticmethod
+    def _prepare_block_transaction_rows(block_data):
+        """Готовит строки таблицы block_transactions (по одной на транзакцию блока)."""
+        return [{
+                'block_index': block_data['index'],
+                'position': position,
+                'tx_id': tx['id'],
+            } for position, tx in enumerate(block_data.get('transactions', []))]
+
+    def flush(self, timeout=None):
+        """
+        Дожидается записи всех поставленных в очередь данных.
+
+        Returns:
+            bool: True, если запись завершена до истечения таймаута.
+        """
+        with self._write_lock:
+            if self._write_queue is None:
+                return True
+            if not self._writer_thread.is_alive():
+                print(f"[ERROR] Фоновый поток записи в БД завершился, данные в очереди не будут записаны.")
+                return False
+            done = threading.Event()
+            self._write_queue.put(('_flush', None, done))
+        return self._wait_for_writer(done, timeout)
+
+    def close(self, timeout=None):
+        """
+        Записывает оставшиеся данные и останавливает фоновый поток.
+        Последующие вызовы save_* выполняются синхронно.
+        """
+        with self._write_lock:
+            if self._write_queue is None:
+                return
+            done = threading.Event()
+            write_queue = self._write_queue
+            self._write_queue = None
+            if self._writer_thread.is_alive():
+                write_queue.put(('_stop', None, done))
+            else:
+                print(f"[ERROR] Фоновый поток записи в БД завершился, данные в очереди не будут записаны.")
+                done.set()
+        # Обработчик завершения больше не нужен и не должен удерживать закрытый менеджер в памяти
+        atexit.unregister(self.close)
+        self._wait_for_writer(done, timeout)
+        self._writer_thread.join(timeout)
+
+    def _wait_for_writer(self, done, timeout=None):
+        """
+        Ожидает сигнала фонового потока, прекращая ожидание, если поток завершился, не подав его.
+
+        Returns:
+            bool: True, если сигнал получен до истечения таймаута.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while not done.is_set():
+            if not self._writer_thread.is_alive():
+                return done.is_set()
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            done.wait(WRITER_POLL_INTERVAL if remaining is None else min(remaining, WRITER_POLL_INTERVAL))
+        return True
+
     def get_user_data(self, user_id):
         """
         Получает данные пользователя из БД по ID.
@@ -189,62 +697,208 @@ class DatabaseManager:
         finally:
             self.close_session(session)
 
+    def _iter_table(self, key_column, columns, page_size, start_after=None):
+        """
+        Потоково читает таблицу страницами фиксированного размера с keyset-пагинацией
+        (WHERE key > последний_ключ ORDER BY key LIMIT page_size) через core-level select(),
+        без ORM-объектов и identity map. Каждая страница читается в отдельном коротком соединении,
+        поэтому долгий обход не блокирует фоновую запись.
+
+        Yields:
+            Row: Именованная строка (доступ по атрибуту, индексу или через ._mapping).
+        """
+        key_position = [column.name for column in columns].index(key_column.name)
+        last_key = start_after
+        while True:
+            stmt = select(*columns).order_by(key_column).limit(page_size)
+            if last_key is not None:
+                stmt = stmt.where(key_column > last_key)
+            with self.engine.connect() as connection:
+                rows = connection.execute(stmt).fetchall()
+            if not rows:
+                return
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last_key = rows[-1][key_position]
+
+    def iter_users(self, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Потоково возвращает пользователей, упорядоченных по id.
+
+        Yields:
+            Row: (id, type, balance_non_cash, balance_digital, balance_offline,
+                  status_digital_wallet, status_offline_wallet, offline_wallet_expiry).
+        """
+        table = models.User.__table__
+        columns = [table.c[name] for name in USER_FIELDS]
+        return self._iter_table(table.c.id, columns, page_size)
+
+    def iter_transactions(self, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Потоково возвращает транзакции, упорядоченные по id.
+
+        Yields:
+            Row: (id, sender_id, recipient_id, amount, type, fo_id, timestamp, status, block_hash).
+        """
+        table = models.Transaction.__table__
+        columns = [table.c[name] for name in TRANSACTION_FIELDS]
+        return self._iter_table(table.c.id, columns, page_size)
+
+    def iter_blocks(self, page_size=DEFAULT_PAGE_SIZE, start_after=None):
+        """
+        Потоково возвращает заголовки блоков, упорядоченные по индексу.
+        Если задан start_after, возвращаются только блоки с индексом больше него.
+
+        Yields:
+            Row: (index, hash, previous_hash, merkle_root, timestamp, nonce, tx_count).
+        """
+        table = models.Block.__table__
+        columns = [table.c[name] for name in BLOCK_FIELDS]
+        return self._iter_table(table.c.index, columns, page_size, start_after)
+
     def get_all_users_data(self):
         """
         Получает данные всех пользователей из БД.
         """
+        return [dict(row._mapping) for row in self.iter_users()]
+
+    @staticmethod
+    def _transaction_to_dict(t):
+        """
+        Преобразует ORM-объект транзакции в словарь для UI.
+        """
+        return {
+            'id': t.id,
+            'sender_id': t.sender_id,
+            'recipient_id': t.recipient_id,
+            'amount': t.amount,
+            'type': t.type,
+            'fo_id': t.fo_id,
+            'timestamp': t.timestamp,
+            'status': t.status,
+            'block_hash': t.block_hash,
+        }
+
+    def get_all_transactions_data(self):
+        """
+        Получает данные всех транзакций из БД.
+        """
+        return [dict(row._mapping) for row in self.iter_transactions()]
+
+    @staticmethod
+    def _transaction_column(name):
+        """Возвращает колонку таблицы транзакций по имени или выбрасывает ValueError."""
+        if name not in models.Transaction.__table__.columns:
+            raise ValueError(f"Неизвестное поле транзакции: {name}")
+        return getattr(models.Transaction, name)
+
+    def _build_transaction_condition(self, conditions):
+        """
+        Строит SQL-условие из словаря {поле: значение}. Значение-список/кортеж/множество означает IN.
+        """
+        clauses = []
+        for name, value in conditions.items():
+            column = self._transaction_column(name)
+            if isinstance(value, (list, tuple, set, frozenset)):
+                clauses.append(column.in_(list(value)))
+            else:
+                clauses.append(column == value)
+        return and_(*clauses)
+
+    def query_transactions(self, filters=None, order=None, limit=None, offset=None):
+        """
+        Получает транзакции с фильтрацией, сортировкой и ограничением на стороне SQL.
+
+        Args:
+            filters (dict | list, optional): Словарь {поле: значение} - все условия через AND
+                (значение-список означает IN). Список словарей объединяется через OR,
+                например [{'type': 'OFFLINE'}, {'status': ['ОФФЛАЙН', 'ОБРАБОТАНА']}].
+            order (str | list, optional): Поле или список полей сортировки; префикс '-' - по убыванию.
+            limit (int, optional): Максимальное количество строк.
+            offset (int, optional): Количество пропускаемых строк.
+
+        Returns:
+            list: Список словарей транзакций (как в get_all_transactions_data).
+        """
         session = self.get_session()
         try:
-            db_users = session.query(models.User).all()
-            return [{
-                    'id': u.id,
-                    'type': u.type,
-                    'balance_non_cash': u.balance_non_cash,
-                    'balance_digital': u.balance_digital,
-                    'balance_offline': u.balance_offline,
-                    'status_digital_wallet': u.status_digital_wallet,
-                    'status_offline_wallet': u.status_offline_wallet,
-                    'offline_wallet_expiry': u.offline_wallet_expiry,
-                } for u in db_users]
+            query = session.query(models.Transaction)
+            if filters:
+                if isinstance(filters, dict):
+                    query = query.filter(self._build_transaction_condition(filters))
+                else:
+                    query = query.filter(or_(*[self._build_transaction_condition(f) for f in filters]))
+            if order:
+                for name in ([order] if isinstance(order, str) else order):
+                    if name.startswith('-'):
+                        query = query.order_by(self._transaction_column(name[1:]).desc())
+                    else:
+                        query = query.order_by(self._transaction_column(name).asc())
+            if offset:
+                query = query.offset(offset)
+            if limit is not None:
+                query = query.limit(limit)
+            return [self._transaction_to_dict(t) for t in query.all()]
         finally:
             self.close_session(session)
 
-    def get_all_transactions_data(self):
+    def get_all_blocks_data(self):
         """
-        Получает данные всех транзакций из БД.
+        Получает заголовки всех блоков из БД (с количеством транзакций tx_count).
+        Состав блока возвращает get_block_transactions.
+        """
+        return [dict(row._mapping) for row in self.iter_blocks()]
+
+    def get_block_transactions(self, block_index):
+        """
+        Получает транзакции блока в порядке их следования в блоке.
         """
         session = self.get_session()
         try:
-            db_transactions = session.query(models.Transaction).all()
-            return [{
-                    'id': t.id,
-                    'sender_id': t.sender_id,
-                    'recipient_id': t.recipient_id,
-                    'amount': t.amount,
-                    'type': t.type,
-                    'fo_id': t.fo_id,
-                    'timestamp': t.timestamp,
-                    'status': t.status,
-                    'block_hash': t.block_hash,
-                } for t in db_transactions]
+            db_transactions = (session.query(models.Transaction)
+                               .join(models.BlockTransaction, models.BlockTransaction.tx_id == models.Transaction.id)
+                               .filter(models.BlockTransaction.block_index == block_index)
+                               .order_by(models.BlockTransaction.position)
+                               .all())
+            return [self._transaction_to_dict(t) for t in db_transactions]
         finally:
             self.close_session(session)
 
-    def get_all_blocks_data(self):
+    def iter_full_blocks(self, start_index=0):
+        """
+        Потоково возвращает блоки с индексом не меньше start_index для восстановления цепочки при запуске.
+        Если сохранено каноническое представление блока, оно возвращается в поле 'data';
+        иначе транзакции собираются из таблицы transactions (в формате Block.to_dict, время - в секундах).
+        """
+        table = models.Block.__table__
+        columns = [table.c[name] for name in BLOCK_FIELDS] + [table.c.data]
+        for row in self._iter_table(table.c.index, columns, DEFAULT_PAGE_SIZE, start_index - 1):
+            block_data = dict(row._mapping)
+            block_data['timestamp'] = block_data['timestamp'].timestamp()
+            if block_data['data'] is None:
+                block_data['transactions'] = self._get_full_block_transactions(row.index)
+            yield block_data
+
+    def _get_full_block_transactions(self, block_index):
         """
-        Получает данные всех блоков из БД.
+        Получает все поля транзакций блока (включая additional_data) в порядке следования в блоке.
         """
         session = self.get_session()
         try:
-            db_blocks = session.query(models.Block).all()
-            return [{
-                    'index': b.index,
-                    'hash': b.hash,
-                    'previous_hash': b.previous_hash,
-                    'transactions': json.loads(b.transactions_json),
-                    'timestamp': b.timestamp,
-                    'nonce': b.nonce,
-                } for b in db_blocks]
+            db_transactions = (session.query(models.Transaction)
+                               .join(models.BlockTransaction, models.BlockTransaction.tx_id == models.Transaction.id)
+                               .filter(models.BlockTransaction.block_index == block_index)
+                               .order_by(models.BlockTransaction.position)
+                               .all())
+            transactions = []
+            for t in db_transactions:
+                tx_data = self._transaction_to_dict(t)
+                tx_data['timestamp'] = t.timestamp.timestamp() if t.timestamp else None
+                # NULL и '{}' различаются: от additional_data зависит хеш транзакции
+                tx_data['additional_data'] = json.loads(t.additional_data) if t.additional_data is not None else None
+                transactions.append(tx_data)
+            return transactions
         finally:
             self.close_session(session)
 
@@ -5,7 +5,7 @@
 
 # --- ИМПОРТЫ ---
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Index, LargeBinary
 import datetime
 # --- КОНЕЦ ИМПОРТОВ ---
 
@@ -51,25 +51,66 @@ class Transaction(Base):
     additional_data = Column(Text, default="{}") # JSON строка
     block_hash = Column(String, nullable=True)
 
+    # Вторичные индексы под фильтры вкладок UI и выборки по участникам/блокам
+    __table_args__ = (
+        Index('ix_transactions_fo_id_timestamp', 'fo_id', 'timestamp'),
+        Index('ix_transactions_type_status', 'type', 'status'),
+        Index('ix_transactions_sender_id', 'sender_id'),
+        Index('ix_transactions_recipient_id', 'recipient_id'),
+        Index('ix_transactions_block_hash', 'block_hash'),
+    )
+
     def __repr__(self):
         return f"<Transaction(id='{self.id}', sender='{self.sender_id}', recipient='{self.recipient_id}', amount={self.amount})>"
 
 class Block(Base):
     """
-    Модель SQLAlchemy для таблицы блоков.
+    Модель SQLAlchemy для таблицы блоков (только заголовки).
+    Состав блока хранится в таблице block_transactions, количество транзакций - в tx_count.
     """
     __tablename__ = 'blocks'
 
     index = Column(Integer, primary_key=True)
     hash = Column(String, unique=True, index=True, nullable=False)
     previous_hash = Column(String, nullable=False)
-    transactions_json = Column(Text, nullable=False) # JSON строка с транзакциями
+    merkle_root = Column(String, nullable=True)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
     nonce = Column(Integer, default=0)
+    tx_count = Column(Integer, nullable=False, default=0) # Количество транзакций в блоке
+    data = Column(LargeBinary, nullable=True) # Каноническое бинарное представление блока (Block.encode)
 
     def __repr__(self):
         return f"<Block(index={self.index}, hash='{self.hash[:8]}...', prev_hash='{self.previous_hash[:8]}...')>"
 
+class BlockTransaction(Base):
+    """
+    Модель SQLAlchemy для таблицы связи блоков и транзакций.
+    position - порядковый номер транзакции в блоке.
+    """
+    __tablename__ = 'block_transactions'
+
+    block_index = Column(Integer, ForeignKey('blocks.index'), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    tx_id = Column(String, ForeignKey('transactions.id'), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<BlockTransaction(block_index={self.block_index}, position={self.position}, tx_id='{self.tx_id}')>"
+
+class StateSnapshot(Base):
+    """
+    Модель SQLAlchemy для таблицы снимков состояния.
+    Хранит балансы и состояние кошельков на высоте height в сжатом виде (core.state.encode_snapshot).
+    """
+    __tablename__ = 'state_snapshots'
+
+    height = Column(Integer, primary_key=True) # Индекс блока, после которого снят снимок
+    block_hash = Column(String, nullable=False)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    data = Column(LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f"<StateSnapshot(height={self.height}, block_hash='{self.block_hash[:8]}...', size={len(self.data)})>"
+
 class LogEntry(Base):
     """
     Модель SQLAlchemy для таблицы логов.
@@ -5,7 +5,7 @@
 """
 
 # --- КРИТИЧЕСКИЕ ИЗМЕНЕНИЯ ---
-# Убедимся, что корень проекта (digital_ruble_simulation) доступен для импорта
+# Убедимся, что корень проекта (каталог с пакетами src и ui) доступен для импорта
 # Это достигается добавлением пути к корню в sys.path.
 import os
 import sys
@@ -17,9 +17,9 @@ from datetime import datetime, timedelta
 from src.core import utils
 
 # Определяем путь к корню проекта относительно этого файла
-# main.py находится в digital_ruble_simulation/src/main.py
-current_file_dir = os.path.dirname(os.path.abspath(__file__)) # digital_ruble_simulation/src
-project_root = os.path.dirname(os.path.dirname(current_file_dir)) # digital_ruble_simulation
+# main.py находится в <корень проекта>/src/main.py
+current_file_dir = os.path.dirname(os.path.abspath(__file__)) # <корень проекта>/src
+project_root = os.path.dirname(current_file_dir) # <корень проекта>
 
 # Добавляем корень проекта в начало sys.path, если его там ещё нет
 if project_root not in sys.path:
@@ -31,45 +31,81 @@ print(f"[MAIN] sys.path: {sys.path[:3]}...") # Показываем начало
 # --- ОСТАЛЬНОЙ КОД main.py ---
 # Попробуем импортировать каждый модуль по отдельности для отладки
 try:
-    from digital_ruble_simulation.src.core import participants, blockchain, consensus, transaction
+    from src.core import participants, blockchain, consensus, transaction, mempool, event_engine, trace
     print("[MAIN] Успешно импортированы core модули")
 except ImportError as e:
     print(f"[ERROR] Не удалось импортировать core модули: {e}")
     sys.exit(1)
 
 try:
-    from digital_ruble_simulation.src.data import database_manager
+    # Векторизованный генератор нагрузки требует NumPy; без него транзакции генерируются по одной
+    from src.core import workload
+except ImportError:
+    workload = None
+    print("[WARN] NumPy не установлен, векторизованный генератор нагрузки недоступен.")
+
+try:
+    from src.data import database_manager
     print("[MAIN] Успешно импортирован database_manager")
 except ImportError as e:
     print(f"[ERROR] Не удалось импортировать database_manager: {e}")
     sys.exit(1)
 
-try:
-    from digital_ruble_simulation.ui import main_window # Импортируем главный файл UI
-    print("[MAIN] Успешно импортирован main_window")
-except ImportError as e:
-    print(f"[ERROR] Не удалось импортировать main_window: {e}")
-    sys.exit(1)
+# UI (tkinter, matplotlib) импортируется только в main(), чтобы симуляцию можно было
+# запускать без графической среды (см. src/cli.py)
 
 # --- Остальной код main.py ---
 
 # --- Глобальные переменные для симуляции ---
 SIMULATION_RUNNING = False
-SIMULATION_END_TIME = None
+SIMULATION_END_TIME = None # Момент окончания в виртуальном времени движка событий
+SIMULATION_ENGINE = None # Движок событий текущего запуска (для статуса и остановки)
+SIMULATION_DB_MANAGER = None # Менеджер БД текущей симуляции (закрывается при повторной инициализации)
+SIMULATION_CHAIN = None # Блокчейн текущей симуляции (его пулы процессов останавливаются при повторной инициализации)
 SIMULATION_DURATION_SECONDS = 3600 # 1 час вирт. времени по умолчанию
+CONSENSUS_STEP_TIMEOUT = 5 # Сколько секунд реального времени ждать обработки сообщений шага консенсуса
 
 # --- Параметры сценариев ---
 SCENARIOS = {
-    "low": {"num_users": 1000, "num_fos": 5, "total_transactions_expected": 4150},
-    "medium": {"num_users": 10000, "num_fos": 10, "total_transactions_expected": 41800},
-    "peak": {"num_users": 50000, "num_fos": 15, "total_transactions_expected": 208500},
+    "low": {"num_users": 1000, "num_fos": 5, "total_transactions_expected": 4150,
+            "arrival_profile": "poisson", "pair_distribution": "uniform"},
+    "medium": {"num_users": 10000, "num_fos": 10, "total_transactions_expected": 41800,
+               "arrival_profile": "poisson", "pair_distribution": "zipf"},
+    "peak": {"num_users": 50000, "num_fos": 15, "total_transactions_expected": 208500,
+             "arrival_profile": "diurnal", "pair_distribution": "zipf"},
 }
 
-def initialize_simulation(num_users=1000, num_fos=5, scenario="low"):
+# Снимок состояния блокчейна сохраняется в БД каждые N блоков
+STATE_SNAPSHOT_INTERVAL = 100
+
+def initialize_simulation(num_users=1000, num_fos=5, scenario="low", pipelined_consensus=False, shared_mempool=False,
+                          storage_profile="balanced", db_path=None, fo_id_offset=0, user_id_offset=0, seed=None,
+                          trace_writer=None, trace_reader=None, mining_workers=1):
     """
     Инициализирует все компоненты симуляции.
+
+    Args:
+        pipelined_consensus (bool): Включить конвейерный (chained) режим HotStuff
+            без фиксированной паузы между раундами.
+        shared_mempool (bool): Использовать общий для всех ФО пул транзакций с упорядочиванием
+            по отправителю, чтобы лидер любой ФО заполнял блок из всех ожидающих транзакций.
+        storage_profile (str): Профиль настройки SQLite ('durable', 'balanced' или 'benchmark').
+        db_path (str, optional): URL базы данных. По умолчанию - путь DatabaseManager.
+        fo_id_offset (int): Смещение нумерации ФО (шард получает свой диапазон ID).
+        user_id_offset (int): Смещение нумерации пользователей.
+        seed (int, optional): Начальное значение генератора random для воспроизводимых запусков.
+        trace_writer (TraceWriter, optional): Трасса, в которую записываются параметры и созданные пользователи.
+        trace_reader (TraceReader, optional): Трасса, из которой ФО и пользователи восстанавливаются
+            вместо случайной генерации (num_users и num_fos при этом игнорируются).
+        mining_workers (int): Количество процессов для майнинга (больше 1 - mining.ParallelMiner).
     """
-    global SIMULATION_RUNNING, SIMULATION_END_TIME, SIMULATION_DURATION_SECONDS
+    global SIMULATION_RUNNING, SIMULATION_END_TIME, SIMULATION_DURATION_SECONDS, SIMULATION_DB_MANAGER, SIMULATION_CHAIN
+
+    if seed is not None:
+        random.seed(seed)
+    if trace_reader is not None:
+        num_users = trace_reader.header.get("num_users", num_users)
+        num_fos = len(trace_reader.header.get("fo_ids", [])) or num_fos
 
     print(f"[MAIN] Инициализация симуляции: {num_users} пользователей, {num_fos} ФО, сценарий {scenario}.")
 
@@ -90,11 +126,25 @@ def initialize_simulation(num_users=1000, num_fos=5, scenario="low"):
     print(f"[MAIN] Использую параметры: {num_users} пользователей, {num_fos} ФО, {total_transactions_expected} транзакций.")
 
     # --- Инициализация БД ---
-    db_manager = database_manager.DatabaseManager()
+    # Повторный запуск из UI создаёт новый менеджер: предыдущий дописывает очередь и останавливает поток записи
+    if SIMULATION_CHAIN is not None:
+        SIMULATION_CHAIN.shutdown()
+    if SIMULATION_DB_MANAGER is not None:
+        SIMULATION_DB_MANAGER.close()
+    db_kwargs = {'db_path': db_path} if db_path else {}
+    db_manager = database_manager.DatabaseManager(storage_profile=storage_profile, **db_kwargs)
+    SIMULATION_DB_MANAGER = db_manager
     print(f"[MAIN] Менеджер базы данных инициализирован.")
 
     # --- Инициализация блокчейна ---
-    digital_ruble_chain = blockchain.Blockchain(difficulty=2) # Уровень сложности для майнинга (если применимо)
+    # Цепочка восстанавливается из последнего снимка состояния в БД, если он есть
+    digital_ruble_chain = blockchain.Blockchain(
+        difficulty=2, # Уровень сложности для майнинга (если применимо)
+        mining_workers=mining_workers,
+        db_manager=db_manager,
+        snapshot_interval=STATE_SNAPSHOT_INTERVAL,
+    )
+    SIMULATION_CHAIN = digital_ruble_chain
     print(f"[MAIN] Блокчейн инициализирован.")
 
     # --- Инициализация ЦБ ---
@@ -104,33 +154,76 @@ def initialize_simulation(num_users=1000, num_fos=5, scenario="low"):
     # --- Инициализация ФО ---
     financial_orgs = {}
     validator_set_data = {} # Для консенсуса
-    for i in range(num_fos):
-        fo_id = f"FO_{i+1:03d}"
-        fo_instance = participants.FinancialOrg(fo_id, central_bank, db_manager) # Передаём db_manager
+    shared_pool = mempool.SharedMempool() if shared_mempool else None
+    if trace_reader is not None and trace_reader.header.get("fo_ids"):
+        fo_id_list = trace_reader.header["fo_ids"]
+    else:
+        fo_id_list = [f"FO_{fo_id_offset+i+1:03d}" for i in range(num_fos)]
+    for fo_id in fo_id_list:
+        fo_instance = participants.FinancialOrg(fo_id, central_bank, db_manager, shared_pool=shared_pool) # Передаём db_manager
         financial_orgs[fo_id] = fo_instance
         validator_set_data[fo_id] = "mock_public_key" # Заглушка
     print(f"[MAIN] {num_fos} Финансовых Организаций инициализировано.")
 
     # --- Инициализация пользователей ---
+    # Пользователи и их распределение по ФО формируются в памяти и сохраняются в БД одним пакетом
     users = {}
-    for i in range(num_users):
-        # ИСПРАВЛЕНО: используем participants.UserType
-        user_type = random.choice([participants.UserType.PHYSICAL, participants.UserType.LEGAL])
-        user_id = f"USER_{i+1:06d}"
-        # --- КРИТИЧЕСКОЕ ИЗМЕНЕНИЕ: Пользователь создаётся с initial_balance=10000 ---
-        user_instance = participants.User(user_id, user_type, initial_balance=10000.0) # 10000 по умолчанию - ПРАВИЛЬНО
-        users[user_id] = user_instance
-
-        # Регистрируем пользователей в случайной ФО
-        random_fo_id = random.choice(list(financial_orgs.keys()))
-        financial_orgs[random_fo_id].add_user(user_instance)
-
-        # Сохраняем данные пользователя в БД
-        # ИСПРАВЛЕНО: передаём только поля, совместимые с моделью БД, используя get_wallet_info
-        user_db_data = user_instance.get_wallet_info() # Получаем текущее состояние
-        # database_manager.save_user фильтрует поля, так что можно передать весь словарь
-        db_manager.save_user(user_db_data) # Передаём словарь из get_wallet_info
-    print(f"[MAIN] {num_users} пользователей инициализировано и распределены по ФО.")
+    fo_ids = list(financial_orgs.keys())
+    users_by_fo = {fo_id: [] for fo_id in fo_ids}
+    user_types = [participants.UserType.PHYSICAL, participants.UserType.LEGAL]
+
+    def _generate_user_records():
+        for i in range(num_users):
+            user_type = random.choice(user_types)
+            user_id = f"USER_{user_id_offset+i+1:06d}"
+            # Регистрируем пользователей в случайной ФО
+            # --- КРИТИЧЕСКОЕ ИЗМЕНЕНИЕ: Пользователь создаётся с initial_balance=10000 ---
+            yield user_id, user_type.value, random.choice(fo_ids), 10000.0 # 10000 по умолчанию - ПРАВИЛЬНО
+
+    if trace_writer is not None:
+        trace_writer.record_header({
+            "scenario": scenario, "num_users": num_users, "fo_ids": fo_ids, "seed": seed,
+            "pipelined_consensus": pipelined_consensus, "shared_mempool": shared_mempool,
+        })
+    restored_users = False
+    if digital_ruble_chain.restored_from_db and trace_reader is None:
+        # Цепочка продолжает прошлый запуск - пользователи и их балансы тоже берутся из БД,
+        # а не генерируются заново (иначе пакетное сохранение перезаписало бы сохранённые балансы).
+        # Распределение по ФО в БД не хранится: пользователи назначаются ФО по кругу в порядке ID
+        for position, row in enumerate(db_manager.iter_users()):
+            user_instance = participants.User.from_stored(row._mapping)
+            users[user_instance.id] = user_instance
+            users_by_fo[fo_ids[position % len(fo_ids)]].append(user_instance)
+            if trace_writer is not None:
+                trace_writer.record_user(user_instance.id, user_instance.type, fo_ids[position % len(fo_ids)],
+                                         user_instance.balance_non_cash)
+        restored_users = bool(users)
+        if restored_users:
+            print(f"[MAIN] {len(users)} пользователей загружено из БД (параметр количества пользователей не используется).")
+
+    if not restored_users:
+        user_records = trace_reader.iter_users() if trace_reader is not None else _generate_user_records()
+        for user_id, user_type, fo_id, initial_balance in user_records:
+            if trace_writer is not None:
+                trace_writer.record_user(user_id, user_type, fo_id, initial_balance)
+            user_instance = participants.User(user_id, participants.UserType(user_type), initial_balance=initial_balance)
+            users[user_id] = user_instance
+            users_by_fo[fo_id].append(user_instance)
+
+    for fo_id, fo_users in users_by_fo.items():
+        financial_orgs[fo_id].add_users(fo_users)
+
+    if not restored_users:
+        # Сохраняем данные всех пользователей в БД одним пакетом
+        db_manager.bulk_save_users([user_instance.get_wallet_info() for user_instance in users.values()])
+    # Цифровые средства пользователей (загруженные из БД или трассы) должны быть и на счетах цепочки,
+    # иначе их переводы не пройдут проверку балансов при формировании блока
+    funded = digital_ruble_chain.seed_balances({user_id: user_instance.balance_digital
+                                                for user_id, user_instance in users.items()
+                                                if user_instance.balance_digital > 0})
+    if funded:
+        print(f"[MAIN] Цифровые балансы {funded} пользователей зачислены в состояние цепочки.")
+    print(f"[MAIN] {len(users)} пользователей инициализировано и распределены по ФО.")
 
     # --- Инициализация консенсуса ---
     # Создаём валидаторов (реплик) для HotStuff
@@ -142,7 +235,9 @@ def initialize_simulation(num_users=1000, num_fos=5, scenario="low"):
             financial_org_instance=fo_instance,
             validator_set=consensus.ValidatorSet(validator_set_data, {k: 1 for k in validator_set_data}), # Равный вес
             crypto_instance=consensus.MockCrypto(), # Заглушка
-            db_manager = db_manager # Передаём db_manager для сохранения блоков
+            db_manager = db_manager, # Передаём db_manager для сохранения блоков
+            pipelined=pipelined_consensus,
+            financial_orgs=financial_orgs, # Транзакции отброшенных блоков возвращаются в пулы принявших их ФО
         )
         replicas.append(replica)
 
@@ -159,248 +254,427 @@ def initialize_simulation(num_users=1000, num_fos=5, scenario="low"):
 
     return db_manager, digital_ruble_chain, central_bank, financial_orgs, users, replicas, network, total_transactions_expected
 
-def run_simulation_loop(replicas, duration_seconds, total_transactions_expected, financial_orgs, users, db_manager,
-                        tx_=None): # Добавлен аргумент db_manager
+def create_workload(scenario, financial_orgs, duration_seconds, total_transactions_expected, seed=None):
     """
-    Запускает основной цикл симуляции.
+    Создаёт генератор нагрузки с профилем поступления и распределением пар из SCENARIOS.
+
+    Returns:
+        WorkloadGenerator: Генератор или None, если NumPy не установлен.
     """
-    global SIMULATION_RUNNING, SIMULATION_END_TIME
-    SIMULATION_RUNNING = True
-    SIMULATION_END_TIME = time.time() + duration_seconds
+    if workload is None:
+        return None
+    params = SCENARIOS.get(scenario, {})
+    return workload.WorkloadGenerator.from_financial_orgs(
+        financial_orgs, duration_seconds, total_transactions_expected,
+        arrival_profile=params.get("arrival_profile", "poisson"),
+        pair_distribution=params.get("pair_distribution", "uniform"),
+        seed=seed,
+    )
 
-    print(f"[MAIN] Запуск основного цикла симуляции на {duration_seconds} секунд вирт. времени.")
-    print(f"[MAIN] Ожидаемое время окончания: {datetime.fromtimestamp(SIMULATION_END_TIME)}")
-    print(f"[MAIN] Ожидаемое количество транзакций: {total_transactions_expected}")
+def _pick_fo_transfer(fo_instance):
+    """
+    Выбирает перевод между случайными пользователями ФО (используется, если NumPy не установлен).
 
-    # Запускаем циклы реплик в отдельных потоках
-    threads = []
-    for replica in replicas:
-        t = threading.Thread(target=replica.run)
-        t.daemon = True # Поток завершится при завершении основного процесса
-        t.start()
-        threads.append(t)
+    Returns:
+        tuple: (sender_id, recipient_id, amount) или None, если в ФО меньше двух пользователей.
+    """
+    fo_users = list(fo_instance.users.keys())
+    if len(fo_users) <= 1:
+        return None
+    sender_id = random.choice(fo_users)
+    recipient_id = random.choice(fo_users)
+    while recipient_id == sender_id:
+        recipient_id = random.choice(fo_users)
+    # --- ИСПРАВЛЕНИЕ: Генерируем целое значение ---
+    amount = int(random.uniform(10, 1000)) # Случайная СУММА - ЦЕЛОЕ ЧИСЛО
+    return sender_id, recipient_id, amount
+
+def _submit_fo_transaction(fo_instance, sender_id, recipient_id, amount, db_manager, chain=None):
+    """
+    Отправляет перевод в ФО: при необходимости открывает цифровой кошелёк отправителя
+    и обменивает безналичные средства на цифровые. Обмен зачисляется на счёт отправителя
+    в цепочке chain эмиссией (Blockchain.apply_emission).
 
-    # Основной цикл симуляции (может управлять генерацией транзакций и т.д.)
-    start_time = time.time()
-    generated_tx_count = 0
-    last_report_time = start_time
-    report_interval = 10 # Секунд между отчетами
-    last_ui_update_time = start_time # Время последнего обновления UI
-    ui_update_interval = 5 # Секунд между обновлениями UI
-
-    # --- Добавим переменные для отслеживания сценариев ---
-    last_offline_event_time = start_time
-    last_smart_contract_event_time = start_time
-    offline_event_interval = 30 # Секунд между событиями с офлайн-кошельками
-    smart_contract_event_interval = 60 # Секунд между событиями со смарт-контрактами
-
-    while SIMULATION_RUNNING and time.time() < SIMULATION_END_TIME and generated_tx_count < total_transactions_expected:
-        # В реальной симуляции тут была бы логика генерации событий, транзакций и т.д.
-        # Имитируем генерацию транзакций
-        for fo_id, fo_instance in financial_orgs.items():
-            if SIMULATION_RUNNING and generated_tx_count < total_transactions_expected:
-                 # Имитируем создание транзакций между случайными пользователями этой ФО
-                 fo_users = list(fo_instance.users.keys())
-                 if len(fo_users) > 1:
-                     sender_id = random.choice(fo_users)
-                     recipient_id = random.choice(fo_users)
-                     while recipient_id == sender_id:
-                         recipient_id = random.choice(fo_users)
-                     # --- ИСПРАВЛЕНИЕ: Генерируем целое значение ---
-                     amount = int(random.uniform(10, 1000)) # Случайная СУММА - ЦЕЛОЕ ЧИСЛО
-                     print(f"[SIM_LOOP] Попытка создать транзакцию {sender_id} -> {recipient_id}, сумма: {amount}")
-
-                     # --- ИСПРАВЛЕНИЕ: Убедимся, что у отправителя открыт цифровой кошелёк и есть средства ---
-                     sender = fo_instance.users[sender_id]
-
-                     # Открываем цифровой кошелёк, если он закрыт
-                     if sender.status_digital_wallet == "ЗАКРЫТ":
-                         success = sender.create_digital_wallet()
-                         if success:
-                             # Сохраняем изменения в БД через переданный db_manager
-                             user_db_data = sender.get_wallet_info()
-                             db_manager.save_user(user_db_data)
-                             print(f"[SIM_LOOP] Цифровой кошелёк {sender_id} открыт.")
-
-                     # Проверяем, есть ли средства на безналичном кошельке для обмена
-                     if sender.balance_non_cash > amount and sender.balance_digital < amount:
-                         # Обмениваем безналичные деньги на цифровые, чтобы хватило на транзакцию
-                         # Обмениваем чуть больше, чем нужно, чтобы была "подушка"
-                         exchange_amount = min(int(sender.balance_non_cash), amount * 1.1) # Целое значение
-                         success = sender.exchange_to_digital(exchange_amount)
-                         if success:
-                             # Сохраняем изменения в БД через переданный db_manager
-                             user_db_data = sender.get_wallet_info()
-                             db_manager.save_user(user_db_data)
-                             print(f"[SIM_LOOP] {sender_id} обменял {exchange_amount} на цифровые рубли. Новый баланс цифрового: {sender.balance_digital}")
-
-                     # --- Конец исправления ---
-
-                     # Проверяем, достаточно ли средств на цифровом кошельке *после* подготовки
-                     if sender.balance_digital >= amount:
-                         tx_id = fo_instance.submit_transaction(sender_id, recipient_id, amount, 'C2C')
-                         if tx_id:
-                             generated_tx_count += 1
-                             # print(f"[SIM_LOOP] Сгенерирована транзакция {tx_id}, всего: {generated_tx_count}/{total_transactions_expected}") # Слишком много логов
-                     else:
-                         print(f"[SIM_LOOP] Недостаточно средств у {sender_id} для транзакции {amount}. Баланс цифрового: {sender.balance_digital}")
-
-        # --- НОВОЕ: Имитация работы с офлайн-кошельками ---
-        current_time = time.time()
-        if current_time - last_offline_event_time >= offline_event_interval and SIMULATION_RUNNING and generated_tx_count < total_transactions_expected:
-            print(f"[SIM_LOOP] Имитация события с офлайн-кошельком...")
-            # Выбираем случайного пользователя
-            random_user_id = random.choice(list(users.keys()))
-            random_user = users[random_user_id]
-            random_fo_id = random.choice(list(financial_orgs.keys()))
-            random_fo = financial_orgs[random_fo_id]
-
-            # --- ОТКРЫТИЕ ОФФЛАЙН-КОШЕЛЬКА ---
-            if random_user.status_offline_wallet == "ЗАКРЫТ":
-                 print(f"[SIM_LOOP] Пользователь {random_user_id} открывает офлайн-кошелёк.")
-                 success = random_user.open_offline_wallet()
-                 if success:
-                     # Сохраняем изменения в БД через переданный db_manager
-                     user_db_data = random_user.get_wallet_info()
-                     db_manager.save_user(user_db_data)
-
-            # --- ПОПОЛНЕНИЕ ОФФЛАЙН-КОШЕЛЬКА ---
-            if random_user.status_offline_wallet == "ОТКРЫТ" and random_user.balance_digital > 0:
-                 fill_amount = min(int(random_user.balance_digital), 200) # Пополняем на 200 или сколько есть
-                 print(f"[SIM_LOOP] Пользователь {random_user_id} пополняет офлайн-кошелёк на {fill_amount}.")
-                 success = random_user.fill_offline_wallet(fill_amount)
-                 if success:
-                     # Сохраняем изменения в БД через переданный db_manager
-                     user_db_data = random_user.get_wallet_info()
-                     db_manager.save_user(user_db_data)
-
-            # --- СОЗДАНИЕ И СИНХРОНИЗАЦИЯ ОФФЛАЙН-ТРАНЗАКЦИИ ---
-            if random_user.status_offline_wallet == "ОТКРЫТ" and random_user.balance_offline > 0:
-                 recipient_offline = random.choice(list(users.keys()))
-                 while recipient_offline == random_user_id:
-                     recipient_offline = random.choice(list(users.keys()))
-                 tx_amount = min(int(random_user.balance_offline), 100) # Отправляем 100 или сколько есть
-                 print(f"[SIM_LOOP] Пользователь {random_user_id} создает офлайн-транзакцию на {tx_amount} для {recipient_offline}.")
-                 tx_data = random_user.create_offline_transaction(tx_amount, recipient_offline)
-                 # --- ИСПРАВЛЕНИЕ: Проверяем, что tx_data не None и не пустой ---
-                 if tx_: # ИСПРАВЛЕНО: if tx_data
-                     # --- ИСПРАВЛЕНИЕ: Генерируем ID для офлайн-транзакции перед сохранением ---
-                     # Используем utils.calculate_hash для генерации ID
-                     # Сформируем строку для хеширования, включая уникальные данные транзакции
-                     # ИСПРАВЛЕНО: убран .encode() из аргумента calculate_hash
-                     offline_tx_id = utils.calculate_hash(f"{tx_data['sender_id']}{tx_data['recipient_id']}{tx_data['amount']}{tx_data['timestamp']}{tx_data['type']}")
-                     tx_data['id'] = offline_tx_id # --- ДОБАВЛЕНО: ID транзакции ---
-                     # --- Конец исправления ---
-
-                     # Сохраняем офлайн-транзакцию в БД как транзакцию со статусом OFFLINE
-                     tx_data['status'] = 'ОФФЛАЙН'
-                     tx_data['fo_id'] = random_fo_id # Назначаем FO для отслеживания
-                     db_manager.save_transaction(tx_data) # Сохраняем в БД
-                     print(f"[SIM_LOOP] Офлайн-транзакция {offline_tx_id} от {random_user_id} синхронизирована и отправлена в ФО {random_fo_id}.")
-
-                     # --- ИМИТАЦИЯ СИНХРОНИЗАЦИИ ---
-                     # В реальной системе это происходило бы при восстановлении связи
-                     # Мы имитируем это сразу после создания
-                     # Проверим, достаточно ли средств у отправителя в момент синхронизации
-                     # (в реальности это проверялось бы при создании, но для симуляции проверим снова)
-                     if random_user.balance_offline >= tx_amount:
-                         # В реальной системе тут была бы логика обработки офлайн-транзакции
-                         # Пока что просто пометим её как "поступила в обработку"
-                         tx_data['status'] = 'ПОСТУПИЛО В ОБРАБОТКУ'
-                         # В этой симуляции мы не будем делать полноценную проверку двойной траты для офлайн
-                         # Предположим, транзакция проходит
-                         # Создаём обычную транзакцию через FO для имитации включения в блок
-                         # Это не совсем точно отражает реальный процесс, но позволяет включить в консенсус
-                         # ВАЖНО: используем submit_transaction, которое генерирует *новый* ID для транзакции, которая пойдёт в пул!
-                         # Мы передаём ту же сумму, получателя, но тип OFFLINE_SYNC
-                         sync_tx_id = random_fo.submit_transaction(random_user_id, recipient_offline, tx_amount, 'OFFLINE_SYNC')
-                         if sync_tx_id:
-                             generated_tx_count += 1 # Учитываем как одну из целевых транзакций
-                             print(f"[SIM_LOOP] Офлайн-транзакция {offline_tx_id} от {random_user_id} включена в пул ФО {random_fo_id} для обработки в консенсусе (через синхронизированную транзакцию {sync_tx_id}).")
-                         else:
-                             print(f"[SIM_LOOP] Не удалось отправить офлайн-транзакцию {offline_tx_id} в пул ФО {random_fo_id}.")
-                         # Обновим статус *оригинальной* офлайн-транзакции в БД после отправки в пул
-                         tx_data['status'] = 'ОБРАБОТАНА' # Имитация успешной обработки
-                         # db_manager.save_transaction(tx_data) # Повторное сохранение с новым статусом, если нужно
-                     else:
-                         print(f"[SIM_LOOP] Недостаточно средств у {random_user_id} для офлайн-транзакции {offline_tx_id} при синхронизации. Отмена.")
-                         tx_data['status'] = 'ОТКЛОНЕНА' # Имитация отклонения
-                         # db_manager.save_transaction(tx_data) # Сохранение с новым статусом
-                     # Обновим данные пользователя в БД после операции
-                     user_db_data = random_user.get_wallet_info()
-                     db_manager.save_user(user_db_data)
-
-            last_offline_event_time = current_time
-
-
-        # --- НОВОЕ: Имитация работы со смарт-контрактами ---
-        if current_time - last_smart_contract_event_time >= smart_contract_event_interval and SIMULATION_RUNNING and generated_tx_count < total_transactions_expected:
-            print(f"[SIM_LOOP] Имитация события со смарт-контрактом...")
-            # Выбираем случайного пользователя
-            random_user_id_sc = random.choice(list(users.keys()))
-            random_user_sc = users[random_user_id_sc]
-            random_fo_id_sc = random.choice(list(financial_orgs.keys()))
-            random_fo_sc = financial_orgs[random_fo_id_sc]
-
-            # --- СОЗДАНИЕ СМАРТ-КОНТРАКТА ---
-            # Пример: смарт-контракт на оплату 1000 ЦР (услуги, коммуналка и т.д.)
-            contract_details = {"type": "utility_payment", "amount": 1000, "recipient": "UTILITY_PROVIDER_ID"} # Сумма целая
-            contract_id = random_user_sc.create_smart_contract(contract_details)
-            print(f"[SIM_LOOP] Создан смарт-контракт {contract_id} пользователем {random_user_id_sc}.")
-
-            # --- ИМИТАЦИЯ ИСПОЛНЕНИЯ КОНТРАКТА ---
-            # В реальной системе это было бы триггером или таймером
-            # Для симуляции просто выполним транзакцию
-            amount_sc = int(contract_details['amount']) # Убедимся, что сумма целая
-            recipient_sc = contract_details['recipient']
-            # Проверим, достаточно ли средств у отправителя
-            if random_user_sc.balance_digital >= amount_sc:
-                 print(f"[SIM_LOOP] Смарт-контракт {contract_id} инициирует транзакцию от {random_user_id_sc} к {recipient_sc} на {amount_sc}.")
-                 # Выполним транзакцию через ФО
-                 tx_id_sc = random_fo_sc.submit_transaction(random_user_id_sc, recipient_sc, amount_sc, 'SMART_CONTRACT_EXECUTION')
-                 if tx_id_sc:
-                     generated_tx_count += 1 # Учитываем как одну из целевых транзакций
-                     print(f"[SIM_LOOP] Транзакция по смарт-контракту {contract_id} включена в пул ФО {random_fo_id_sc} для обработки в консенсусе.")
-                 else:
-                     print(f"[SIM_LOOP] Не удалось выполнить транзакцию по смарт-контракту {contract_id}.")
-            else:
-                 print(f"[SIM_LOOP] Недостаточно средств у {random_user_id_sc} для выполнения смарт-контракта {contract_id}.")
+    Returns:
+        bool: True, если транзакция отправлена в пул ФО.
+    """
+    print(f"[SIM_LOOP] Попытка создать транзакцию {sender_id} -> {recipient_id}, сумма: {amount}")
+
+    # --- ИСПРАВЛЕНИЕ: Убедимся, что у отправителя открыт цифровой кошелёк и есть средства ---
+    sender = fo_instance.users[sender_id]
+
+    # Открываем цифровой кошелёк, если он закрыт
+    if sender.status_digital_wallet == "ЗАКРЫТ":
+        success = sender.create_digital_wallet()
+        if success:
+            # Сохраняем изменения в БД через переданный db_manager
+            user_db_data = sender.get_wallet_info()
+            db_manager.save_user(user_db_data)
+            print(f"[SIM_LOOP] Цифровой кошелёк {sender_id} открыт.")
+
+    # Проверяем, есть ли средства на безналичном кошельке для обмена
+    if sender.balance_non_cash > amount and sender.balance_digital < amount:
+        # Обмениваем безналичные деньги на цифровые, чтобы хватило на транзакцию
+        # Обмениваем чуть больше, чем нужно, чтобы была "подушка"
+        exchange_amount = int(min(sender.balance_non_cash, amount * 1.1)) # Целое значение
+        success = sender.exchange_to_digital(exchange_amount)
+        if success:
+            if chain is not None:
+                chain.apply_emission(sender_id, exchange_amount)
+            # Сохраняем изменения в БД через переданный db_manager
+            user_db_data = sender.get_wallet_info()
+            db_manager.save_user(user_db_data)
+            print(f"[SIM_LOOP] {sender_id} обменял {exchange_amount} на цифровые рубли. Новый баланс цифрового: {sender.balance_digital}")
+
+    # Проверяем, достаточно ли средств на цифровом кошельке *после* подготовки
+    if sender.balance_digital >= amount:
+        tx_id = fo_instance.submit_transaction(sender_id, recipient_id, amount, 'C2C')
+        return bool(tx_id)
+    print(f"[SIM_LOOP] Недостаточно средств у {sender_id} для транзакции {amount}. Баланс цифрового: {sender.balance_digital}")
+    return False
+
+def _pick_event_participants(users, financial_orgs, local=False):
+    """
+    Выбирает участников события с офлайн-кошельком или смарт-контрактом.
 
-            last_smart_contract_event_time = current_time
+    Args:
+        local (bool): Выбирать пользователя и получателя среди клиентов одной ФО. Иначе ФО,
+            пользователь и получатель независимы, и событие может затрагивать разные ФО.
 
-        time.sleep(0.01) # Небольшая задержка, чтобы не грузить CPU
+    Returns:
+        tuple: (user_id, fo_id, recipient_id) - случайные пользователь, ФО и другой пользователь.
+    """
+    if local:
+        fo_id = random.choice([fo_id for fo_id, fo_instance in financial_orgs.items() if fo_instance.users]
+                              or list(financial_orgs.keys()))
+        user_ids = list(financial_orgs[fo_id].users.keys()) or list(users.keys())
+        user_id = random.choice(user_ids)
+    else:
+        user_ids = list(users.keys())
+        user_id = random.choice(user_ids)
+        fo_id = random.choice(list(financial_orgs.keys()))
+    recipient_id = random.choice(user_ids)
+    while recipient_id == user_id and len(user_ids) > 1:
+        recipient_id = random.choice(user_ids)
+    return user_id, fo_id, recipient_id
+
+def _simulate_offline_event(users, financial_orgs, db_manager, random_user_id, random_fo_id, recipient_offline):
+    """
+    Имитирует работу с офлайн-кошельком пользователя: открытие, пополнение,
+    создание офлайн-транзакции получателю recipient_offline и её синхронизацию через ФО.
 
-        # Отчет о прогрессе
-        current_time = time.time()
-        if current_time - last_report_time >= report_interval:
-            print(f"[MAIN] Прогресс симуляции: {generated_tx_count}/{total_transactions_expected} транзакций за {(current_time - start_time):.2f} сек.")
-            last_report_time = current_time
+    Returns:
+        int: Количество транзакций, отправленных в пул ФО (0 или 1).
+    """
+    print(f"[SIM_LOOP] Имитация события с офлайн-кошельком...")
+    random_user = users[random_user_id]
+    random_fo = financial_orgs[random_fo_id]
+    generated = 0
+
+    # --- ОТКРЫТИЕ ОФФЛАЙН-КОШЕЛЬКА ---
+    if random_user.status_offline_wallet == "ЗАКРЫТ":
+        print(f"[SIM_LOOP] Пользователь {random_user_id} открывает офлайн-кошелёк.")
+        success = random_user.open_offline_wallet()
+        if success:
+            # Сохраняем изменения в БД через переданный db_manager
+            user_db_data = random_user.get_wallet_info()
+            db_manager.save_user(user_db_data)
+
+    # --- ПОПОЛНЕНИЕ ОФФЛАЙН-КОШЕЛЬКА ---
+    if random_user.status_offline_wallet == "ОТКРЫТ" and random_user.balance_digital > 0:
+        fill_amount = min(int(random_user.balance_digital), 200) # Пополняем на 200 или сколько есть
+        print(f"[SIM_LOOP] Пользователь {random_user_id} пополняет офлайн-кошелёк на {fill_amount}.")
+        success = random_user.fill_offline_wallet(fill_amount)
+        if success:
+            # Сохраняем изменения в БД через переданный db_manager
+            user_db_data = random_user.get_wallet_info()
+            db_manager.save_user(user_db_data)
+
+    # --- СОЗДАНИЕ И СИНХРОНИЗАЦИЯ ОФФЛАЙН-ТРАНЗАКЦИИ ---
+    if random_user.status_offline_wallet == "ОТКРЫТ" and random_user.balance_offline > 0 and recipient_offline != random_user_id:
+        tx_amount = min(int(random_user.balance_offline), 100) # Отправляем 100 или сколько есть
+        print(f"[SIM_LOOP] Пользователь {random_user_id} создает офлайн-транзакцию на {tx_amount} для {recipient_offline}.")
+        offline_tx = random_user.create_offline_transaction(tx_amount, recipient_offline)
+        # --- ИСПРАВЛЕНИЕ: Проверяем, что offline_tx не None и не пустой ---
+        if offline_tx:
+            # --- ИСПРАВЛЕНИЕ: Генерируем ID для офлайн-транзакции перед сохранением ---
+            # Используем utils.calculate_hash для генерации ID
+            # Сформируем строку для хеширования, включая уникальные данные транзакции
+            # ИСПРАВЛЕНО: убран .encode() из аргумента calculate_hash
+            offline_tx_id = utils.calculate_hash(f"{offline_tx.sender_id}{offline_tx.recipient_id}{offline_tx.amount}{offline_tx.timestamp}{offline_tx.type}")
+            offline_tx.id = offline_tx_id # --- ДОБАВЛЕНО: ID транзакции ---
+            # --- Конец исправления ---
+
+            # Сохраняем офлайн-транзакцию в БД как транзакцию со статусом OFFLINE
+            offline_tx.status = 'ОФФЛАЙН'
+            offline_tx.fo_id = random_fo_id # Назначаем FO для отслеживания
+            db_manager.save_transaction(offline_tx.to_dict()) # Сохраняем в БД
+            print(f"[SIM_LOOP] Офлайн-транзакция {offline_tx_id} от {random_user_id} синхронизирована и отправлена в ФО {random_fo_id}.")
+
+            # --- ИМИТАЦИЯ СИНХРОНИЗАЦИИ ---
+            # В реальной системе это происходило бы при восстановлении связи
+            # Мы имитируем это сразу после создания
+            # Проверим, достаточно ли средств у отправителя в момент синхронизации
+            # (в реальности это проверялось бы при создании, но для симуляции проверим снова)
+            if random_user.balance_offline >= tx_amount:
+                # В реальной системе тут была бы логика обработки офлайн-транзакции
+                # Пока что просто пометим её как "поступила в обработку"
+                offline_tx.status = 'ПОСТУПИЛО В ОБРАБОТКУ'
+                # В этой симуляции мы не будем делать полноценную проверку двойной траты для офлайн
+                # Предположим, транзакция проходит
+                # Создаём обычную транзакцию через FO для имитации включения в блок
+                # Это не совсем точно отражает реальный процесс, но позволяет включить в консенсус
+                # ВАЖНО: используем submit_transaction, которое генерирует *новый* ID для транзакции, которая пойдёт в пул!
+                # Мы передаём ту же сумму, получателя, но тип OFFLINE_SYNC
+                sync_tx_id = random_fo.submit_transaction(random_user_id, recipient_offline, tx_amount, 'OFFLINE_SYNC')
+                if sync_tx_id:
+                    generated += 1 # Учитываем как одну из целевых транзакций
+                    print(f"[SIM_LOOP] Офлайн-транзакция {offline_tx_id} от {random_user_id} включена в пул ФО {random_fo_id} для обработки в консенсусе (через синхронизированную транзакцию {sync_tx_id}).")
+                else:
+                    print(f"[SIM_LOOP] Не удалось отправить офлайн-транзакцию {offline_tx_id} в пул ФО {random_fo_id}.")
+                # Обновим статус *оригинальной* офлайн-транзакции в БД после отправки в пул
+                offline_tx.status = 'ОБРАБОТАНА' # Имитация успешной обработки
+                # db_manager.save_transaction(offline_tx.to_dict()) # Повторное сохранение с новым статусом, если нужно
+            else:
+                print(f"[SIM_LOOP] Недостаточно средств у {random_user_id} для офлайн-транзакции {offline_tx_id} при синхронизации. Отмена.")
+                offline_tx.status = 'ОТКЛОНЕНА' # Имитация отклонения
+                # db_manager.save_transaction(offline_tx.to_dict()) # Сохранение с новым статусом
+            # Обновим данные пользователя в БД после операции
+            user_db_data = random_user.get_wallet_info()
+            db_manager.save_user(user_db_data)
+    return generated
+
+def _simulate_smart_contract_event(users, financial_orgs, random_user_id_sc, random_fo_id_sc):
+    """
+    Имитирует создание смарт-контракта пользователем и его немедленное исполнение через ФО.
 
-        # Обновление UI (примерное, можно уточнить по необходимости)
-        if current_time - last_ui_update_time >= ui_update_interval:
-            print(f"[MAIN] Обновление данных UI...")
-            # Здесь можно вызвать обновление, если MainApplication доступен
-            # Однако, в текущей архитектуре это сложно сделать напрямую из потока симуляции
-            # Лучше запускать UI обновления из основного потока или по таймеру в UI
-            # Пока просто обновим БД для транзакций, которые могли быть созданы
-            # Транзакции сохраняются в FinancialOrg.submit_transaction
-            last_ui_update_time = current_time
+    Returns:
+        int: Количество транзакций, отправленных в пул ФО (0 или 1).
+    """
+    print(f"[SIM_LOOP] Имитация события со смарт-контрактом...")
+    random_user_sc = users[random_user_id_sc]
+    random_fo_sc = financial_orgs[random_fo_id_sc]
+
+    # --- СОЗДАНИЕ СМАРТ-КОНТРАКТА ---
+    # Пример: смарт-контракт на оплату 1000 ЦР (услуги, коммуналка и т.д.)
+    contract_details = {"type": "utility_payment", "amount": 1000, "recipient": "UTILITY_PROVIDER_ID"} # Сумма целая
+    contract_id = random_user_sc.create_smart_contract(contract_details)
+    print(f"[SIM_LOOP] Создан смарт-контракт {contract_id} пользователем {random_user_id_sc}.")
+
+    # --- ИМИТАЦИЯ ИСПОЛНЕНИЯ КОНТРАКТА ---
+    # В реальной системе это было бы триггером или таймером
+    # Для симуляции просто выполним транзакцию
+    amount_sc = int(contract_details['amount']) # Убедимся, что сумма целая
+    recipient_sc = contract_details['recipient']
+    # Проверим, достаточно ли средств у отправителя
+    if random_user_sc.balance_digital < amount_sc:
+        print(f"[SIM_LOOP] Недостаточно средств у {random_user_id_sc} для выполнения смарт-контракта {contract_id}.")
+        return 0
+    print(f"[SIM_LOOP] Смарт-контракт {contract_id} инициирует транзакцию от {random_user_id_sc} к {recipient_sc} на {amount_sc}.")
+    # Выполним транзакцию через ФО
+    tx_id_sc = random_fo_sc.submit_transaction(random_user_id_sc, recipient_sc, amount_sc, 'SMART_CONTRACT_EXECUTION')
+    if tx_id_sc:
+        print(f"[SIM_LOOP] Транзакция по смарт-контракту {contract_id} включена в пул ФО {random_fo_id_sc} для обработки в консенсусе.")
+        return 1 # Учитываем как одну из целевых транзакций
+    print(f"[SIM_LOOP] Не удалось выполнить транзакцию по смарт-контракту {contract_id}.")
+    return 0
 
-    print(f"[MAIN] Цикл генерации транзакций завершён. Сгенерировано: {generated_tx_count}")
+def run_simulation_loop(replicas, duration_seconds, total_transactions_expected, financial_orgs, users, db_manager,
+                        tx_=None, realtime=False, speed=1.0, workload_generator=None, trace_writer=None,
+                        trace_reader=None, seed=None, local_events=False): # Добавлен аргумент db_manager
+    """
+    Запускает основной цикл симуляции на движке дискретных событий с виртуальными часами.
+    Поступление транзакций, раунды консенсуса, события с офлайн-кошельками и смарт-контрактами
+    планируются как события; без realtime час виртуального времени выполняется так быстро,
+    как позволяет CPU.
+
+    Args:
+        realtime (bool): Согласовывать виртуальное время с реальным.
+        speed (float): Ускорение виртуального времени относительно реального в режиме realtime.
+        workload_generator (WorkloadGenerator, optional): Источник поступлений транзакций.
+            По умолчанию - пуассоновский поток с равновероятными парами (create_workload);
+            без NumPy - пуассоновский поток на каждую ФО с выбором пар через random.
+        trace_writer (TraceWriter, optional): Трасса, в которую записываются события нагрузки.
+        trace_reader (TraceReader, optional): Трасса для воспроизведения: события нагрузки берутся
+            из неё вместо генерации (с максимальной скоростью или, при realtime, в исходном темпе).
+        seed (int, optional): Начальное значение генераторов случайных чисел цикла.
+        local_events (bool): События с офлайн-кошельками и смарт-контрактами затрагивают клиентов
+            одной ФО (см. _pick_event_participants).
+
+    Returns:
+        dict: Итоги запуска (сгенерированные транзакции, виртуальное и реальное время, число событий).
+    """
+    global SIMULATION_RUNNING, SIMULATION_END_TIME, SIMULATION_ENGINE
+    SIMULATION_RUNNING = True
+    engine = event_engine.EventEngine(realtime=realtime, speed=speed)
+    SIMULATION_ENGINE = engine
+    SIMULATION_END_TIME = engine.now + duration_seconds
+
+    print(f"[MAIN] Запуск основного цикла симуляции на {duration_seconds} секунд вирт. времени "
+          f"({'реальное время, ускорение x' + str(speed) if realtime else 'максимальная скорость'}).")
+    print(f"[MAIN] Ожидаемое количество транзакций: {total_transactions_expected}")
 
-    # Ждём, пока время симуляции не истечёт или не будет остановлена
-    while SIMULATION_RUNNING and time.time() < SIMULATION_END_TIME:
-        time.sleep(0.1)
+    if seed is not None:
+        random.seed(seed)
+    start_time = time.time()
+    generated_tx_count = 0
+    report_interval = 10 # Секунд вирт. времени между отчетами
+    offline_event_interval = 30 # Секунд вирт. времени между событиями с офлайн-кошельками
+    smart_contract_event_interval = 60 # Секунд вирт. времени между событиями со смарт-контрактами
+    # Интенсивность поступления транзакций на одну ФО без генератора нагрузки:
+    # ожидаемое количество распределяется по всему интервалу
+    arrival_rate = total_transactions_expected / duration_seconds / max(1, len(financial_orgs))
+    chain = replicas[0].blockchain if replicas else None # Обмен на цифровые рубли зачисляется в её состояние
+
+    def _generation_active():
+        return SIMULATION_RUNNING and generated_tx_count < total_transactions_expected
+
+    def _transfer(fo_id, sender_id, recipient_id, amount):
+        nonlocal generated_tx_count
+        if trace_writer is not None:
+            trace_writer.record_transfer(engine.now, fo_id, sender_id, recipient_id, amount)
+        fo_instance = financial_orgs.get(fo_id)
+        if fo_instance and _submit_fo_transaction(fo_instance, sender_id, recipient_id, amount, db_manager, chain):
+            generated_tx_count += 1
+
+    def _offline_event(user_id, fo_id, recipient_id):
+        nonlocal generated_tx_count
+        if trace_writer is not None:
+            trace_writer.record_offline(engine.now, user_id, fo_id, recipient_id)
+        generated_tx_count += _simulate_offline_event(users, financial_orgs, db_manager, user_id, fo_id, recipient_id)
+
+    def _smart_contract_event(user_id, fo_id):
+        nonlocal generated_tx_count
+        if trace_writer is not None:
+            trace_writer.record_smart_contract(engine.now, user_id, fo_id)
+        generated_tx_count += _simulate_smart_contract_event(users, financial_orgs, user_id, fo_id)
+
+    def _on_fo_transaction(fo_id):
+        if not _generation_active():
+            return
+        transfer = _pick_fo_transfer(financial_orgs[fo_id])
+        if transfer:
+            _transfer(fo_id, *transfer)
+        engine.schedule(random.expovariate(arrival_rate), _on_fo_transaction, fo_id)
+
+    def _on_workload_transaction(chunks, chunk, position):
+        if not _generation_active():
+            return
+        _transfer(chunk.fo_ids[position], chunk.sender_ids[position], chunk.recipient_ids[position],
+                  chunk.amounts[position])
+        # В очереди событий находится только следующее поступление, порции генерируются по мере надобности
+        if position + 1 < len(chunk):
+            engine.schedule_at(chunk.timestamps[position + 1], _on_workload_transaction, chunks, chunk, position + 1)
+        else:
+            _schedule_next_chunk(chunks)
+
+    def _schedule_next_chunk(chunks):
+        chunk = next(chunks, None)
+        if chunk is not None:
+            engine.schedule_at(chunk.timestamps[0], _on_workload_transaction, chunks, chunk, 0)
+
+    def _on_offline_event():
+        if not _generation_active():
+            return False
+        _offline_event(*_pick_event_participants(users, financial_orgs, local_events))
+
+    def _on_smart_contract_event():
+        if not _generation_active():
+            return False
+        user_id, fo_id, _ = _pick_event_participants(users, financial_orgs, local_events)
+        _smart_contract_event(user_id, fo_id)
+
+    def _on_trace_event(events, kind, fields):
+        if not _generation_active():
+            return
+        if kind == trace.RECORD_TRANSFER:
+            _transfer(*fields[1:])
+        elif kind == trace.RECORD_OFFLINE:
+            _offline_event(*fields[1:])
+        elif kind == trace.RECORD_SMART_CONTRACT:
+            _smart_contract_event(*fields[1:])
+        # Трасса читается потоково: в очереди событий находится только следующее событие
+        _schedule_next_trace_event(events)
+
+    def _schedule_next_trace_event(events):
+        record = next(events, None)
+        if record is not None:
+            kind, fields = record
+            engine.schedule_at(fields[0], _on_trace_event, events, kind, fields)
+
+    def _on_consensus_step():
+        if not SIMULATION_RUNNING:
+            engine.stop()
+            return False
+        for replica in replicas:
+            replica.step()
+        # Раунд завершается в тот же момент виртуального времени: ждём обработки всех сообщений
+        if network and not network.wait_until_idle(timeout=CONSENSUS_STEP_TIMEOUT):
+            print(f"[WARN] Сообщения консенсуса не обработаны за {CONSENSUS_STEP_TIMEOUT} сек. "
+                  f"(вирт. время {engine.now:.2f}). Продолжаем.")
+
+    def _on_report():
+        print(f"[MAIN] Прогресс симуляции: {generated_tx_count}/{total_transactions_expected} транзакций "
+              f"за {engine.now:.0f} сек. вирт. времени ({(time.time() - start_time):.2f} сек. реального).")
+
+    network = replicas[0].network if replicas else None
+    if trace_writer is not None:
+        trace_writer.record_run(duration_seconds, total_transactions_expected)
+    if trace_reader is not None:
+        print(f"[MAIN] Воспроизведение нагрузки из трассы {trace_reader.path}.")
+        _schedule_next_trace_event(trace_reader.iter_events())
+    else:
+        if workload_generator is None:
+            workload_generator = create_workload(None, financial_orgs, duration_seconds, total_transactions_expected,
+                                                 seed=seed)
+        if workload_generator is not None:
+            _schedule_next_chunk(workload_generator.iter_chunks())
+        elif arrival_rate > 0:
+            for fo_id in financial_orgs:
+                engine.schedule(random.expovariate(arrival_rate), _on_fo_transaction, fo_id)
+        if users and financial_orgs:
+            engine.schedule_every(offline_event_interval, _on_offline_event)
+            engine.schedule_every(smart_contract_event_interval, _on_smart_contract_event)
+    if replicas:
+        # Таймауты view и метки времени блоков отсчитываются по виртуальным часам движка
+        # (смещённым к моменту запуска, чтобы метки блоков оставались временем эпохи Unix)
+        def virtual_clock():
+            return start_time + engine.now
+
+        for replica in replicas:
+            replica.set_clock(virtual_clock)
+        engine.schedule_every(replicas[0].get_step_interval(), _on_consensus_step)
+    engine.schedule_every(report_interval, _on_report)
+
+    engine.run(until=SIMULATION_END_TIME)
+    if trace_writer is not None:
+        trace_writer.flush()
+
+    print(f"[MAIN] Цикл генерации транзакций завершён. Сгенерировано: {generated_tx_count}, "
+          f"обработано событий: {engine.events_processed}")
 
     # Останавливаем реплики
     for replica in replicas:
         replica.stop()
 
-    # Ждём завершения потоков реплик
-    for t in threads:
-        t.join(timeout=1) # Таймаут на случай, если поток не отвечает
+    # Останавливаем потоки-диспетчеры сети (очереди сообщений реплик)
+    if network:
+        network.wait_until_idle(timeout=5)
+        network.stop()
 
-    print(f"[MAIN] Цикл симуляции завершён. Время работы: {time.time() - start_time:.2f} сек.")
+    # Дожидаемся фоновой записи в БД, чтобы UI увидел все данные симуляции
+    db_manager.flush()
+    SIMULATION_RUNNING = False
+
+    wall_time = time.time() - start_time
+    print(f"[MAIN] Цикл симуляции завершён. Вирт. время: {engine.now:.2f} сек., "
+          f"время работы: {wall_time:.2f} сек.")
+    return {
+        'generated_transactions': generated_tx_count,
+        'virtual_time': engine.now,
+        'wall_time': wall_time,
+        'events_processed': engine.events_processed,
+    }
 
 def stop_simulation():
     """
@@ -408,6 +682,8 @@ def stop_simulation():
     """
     global SIMULATION_RUNNING
     SIMULATION_RUNNING = False
+    if SIMULATION_ENGINE is not None:
+        SIMULATION_ENGINE.stop()
     print(f"[MAIN] Запрошена остановка симуляции.")
 
 def get_simulation_status():
@@ -415,9 +691,9 @@ def get_simulation_status():
     Возвращает текущий статус симуляции.
     """
     global SIMULATION_RUNNING, SIMULATION_END_TIME
-    if SIMULATION_RUNNING:
-        remaining_time = SIMULATION_END_TIME - time.time()
-        return f"Запущена. Осталось времени: {max(0, remaining_time):.2f} сек."
+    if SIMULATION_RUNNING and SIMULATION_ENGINE is not None:
+        remaining_time = SIMULATION_END_TIME - SIMULATION_ENGINE.now
+        return f"Запущена. Осталось вирт. времени: {max(0, remaining_time):.2f} сек."
     else:
         return "Остановлена."
 
@@ -450,8 +726,10 @@ def run_scenario(scenario_name):
         scenario=scenario_name
     )
 
+    workload_generator = create_workload(scenario_name, fos, SIMULATION_DURATION_SECONDS, expected_txs)
     # ИСПРАВЛЕНО: передаём db_manager в run_loop
-    run_simulation_loop(replicas, SIMULATION_DURATION_SECONDS, expected_txs, fos, users, db_manager) # Передаём db_manager
+    run_simulation_loop(replicas, SIMULATION_DURATION_SECONDS, expected_txs, fos, users, db_manager,
+                        workload_generator=workload_generator) # Передаём db_manager
 
 def main():
     """
@@ -459,6 +737,13 @@ def main():
     """
     print(f"[MAIN] Запуск имитационной модели цифрового рубля...")
 
+    try:
+        from ui import main_window # Импортируем главный файл UI
+        print("[MAIN] Успешно импортирован main_window")
+    except ImportError as e:
+        print(f"[ERROR] Не удалось импортировать main_window: {e}")
+        sys.exit(1)
+
     # --- Инициализация ---
     # Сначала инициализируем с пустыми объектами или минимальными
     # В UI будет кнопка "Запустить симуляцию", которая вызовет initialize_simulation с нужными параметрами
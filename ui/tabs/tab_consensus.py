@@ -56,6 +56,11 @@ class ConsensusTab(ttk.Frame):
             self.visual_text.insert(tk.END, f"  - Current View: {replica.current_view}\n")
             self.visual_text.insert(tk.END, f"  - High QC View: {replica.high_qc.view if replica.high_qc else 'None'}\n")
             self.visual_text.insert(tk.END, f"  - High Commit QC View: {replica.high_commit_qc.view if replica.high_commit_qc else 'None'}\n")
+            view_stats = replica.get_view_stats()
+            avg_latency = view_stats['avg_view_latency']
+            self.visual_text.insert(tk.END, f"  - Views (успешно / по таймауту): {view_stats['views_completed']} / {view_stats['views_timed_out']}\n")
+            self.visual_text.insert(tk.END, f"  - Средняя длительность view: {f'{avg_latency:.3f} сек' if avg_latency is not None else 'N/A'}\n")
+            self.visual_text.insert(tk.END, f"  - Потеряно на таймаутах: {view_stats['time_lost_to_timeouts']:.2f} сек (текущий таймаут {view_stats['current_timeout']:.2f} сек)\n")
             self.visual_text.insert(tk.END, f"  - Status: {'RUNNING' if replica._running else 'STOPPED'}\n\n")
 
         self.visual_text.config(state=tk.DISABLED)
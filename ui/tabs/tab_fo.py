@@ -92,8 +92,9 @@ class FOTab(ttk.Frame):
                 self.tx_tree.delete(item)
 
             # Получаем транзакции из БД, связанные с этой ФО
-            all_transactions = self.db_manager.get_all_transactions_data()
-            fo_transactions = [tx for tx in all_transactions if tx['fo_id'] == self.selected_fo.id]
+            fo_transactions = self.db_manager.query_transactions(
+                filters={'fo_id': self.selected_fo.id}, order='timestamp'
+            )
 
             # Заполняем таблицу
             for tx in fo_transactions:
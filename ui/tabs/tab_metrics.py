@@ -41,8 +41,8 @@ class MetricsTab(ttk.Frame):
         for item in self.metrics_tree.get_children():
             self.metrics_tree.delete(item)
 
-        # Получаем данные
-        chain_data = self.blockchain.get_chain_data()
+        # Получаем данные: заголовки блоков из БД уже содержат количество транзакций (tx_count)
+        chain_data = self.db_manager.get_all_blocks_data()
         transactions_data = self.db_manager.get_all_transactions_data()
 
         # Вычисляем метрики
@@ -52,7 +52,7 @@ class MetricsTab(ttk.Frame):
         block_times = [b['timestamp'] for b in chain_data]
         avg_block_time = "N/A"
         if len(block_times) > 1:
-            time_diffs = [block_times[i] - block_times[i-1] for i in range(1, len(block_times))]
+            time_diffs = [(block_times[i] - block_times[i-1]).total_seconds() for i in range(1, len(block_times))]
             avg_block_time = sum(time_diffs) / len(time_diffs)
 
         # Заполняем таблицу
@@ -66,7 +66,7 @@ class MetricsTab(ttk.Frame):
         self.ax.clear()
         if chain_data:
             block_indices = [b['index'] for b in chain_data]
-            tx_counts = [len(b['transactions']) for b in chain_data]
+            tx_counts = [b['tx_count'] for b in chain_data]
             self.ax.plot(block_indices, tx_counts, marker='o')
             self.ax.set_xlabel('Индекс блока')
             self.ax.set_ylabel('Количество транзакций')
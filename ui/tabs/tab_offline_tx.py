@@ -52,11 +52,12 @@ class OfflineTxTab(ttk.Frame):
         for item in self.offline_tx_tree.get_children():
             self.offline_tx_tree.delete(item)
 
-        # Получаем ВСЕ транзакции из БД
-        all_transactions_data = self.db_manager.get_all_transactions_data()
-        # Фильтруем только офлайн-транзакции (по статусу или типу)
+        # Получаем из БД только офлайн-транзакции (по статусу или типу)
         # В requirements тип "OFFLINE" и статус "ОФФЛАЙН"
-        offline_transactions_data = [tx for tx in all_transactions_data if tx['type'] == 'OFFLINE' or tx['status'] in ['ОФФЛАЙН', 'ПОСТУПИЛО В ОБРАБОТКУ', 'ОБРАБОТАНА']]
+        offline_transactions_data = self.db_manager.query_transactions(filters=[
+            {'type': 'OFFLINE'},
+            {'status': ['ОФФЛАЙН', 'ПОСТУПИЛО В ОБРАБОТКУ', 'ОБРАБОТАНА']},
+        ])
 
         # Заполняем таблицу
         for tx in offline_transactions_data:
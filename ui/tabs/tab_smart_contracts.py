@@ -54,10 +54,8 @@ class SmartContractsTab(ttk.Frame):
         for item in self.sc_tree.get_children():
             self.sc_tree.delete(item)
 
-        # Получаем ВСЕ транзакции из БД
-        all_transactions_data = self.db_manager.get_all_transactions_data()
-        # Фильтруем только транзакции смарт-контрактов
-        sc_transactions_data = [tx for tx in all_transactions_data if tx['type'] == 'SMART_CONTRACT']
+        # Получаем из БД только транзакции смарт-контрактов
+        sc_transactions_data = self.db_manager.query_transactions(filters={'type': 'SMART_CONTRACT'})
 
         # Заполняем таблицу
         for tx in sc_transactions_data:
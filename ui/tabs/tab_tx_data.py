@@ -62,29 +62,29 @@ class TxDataTab(ttk.Frame):
         for item in self.tx_tree.get_children():
             self.tx_tree.delete(item)
 
-        # Получаем данные из БД
-        transactions_data = self.db_manager.get_all_transactions_data()
+        # Потоково читаем данные из БД страницами, не загружая всю таблицу в память
+        transactions_data = self.db_manager.iter_transactions()
 
         # Заполняем таблицу
         for tx in transactions_data:
-            # Используем tx['type'] для отображения типа перевода
+            # Используем tx.type для отображения типа перевода
             # Он может быть C2C, OFFLINE, SMART_CONTRACT_EXECUTION и т.д.
-            # Для столбца "Тип перевода" отобразим 'онлайн', 'офлайн', 'смарт-контракт' на основе tx['type']
+            # Для столбца "Тип перевода" отобразим 'онлайн', 'офлайн', 'смарт-контракт' на основе tx.type
             tx_type_display = "неизвестно"
-            if tx['type'] in ['C2C', 'C2B', 'B2C', 'B2B', 'G2B', 'B2G', 'C2G', 'G2C']: # Пример онлайн-типов
+            if tx.type in ['C2C', 'C2B', 'B2C', 'B2B', 'G2B', 'B2G', 'C2G', 'G2C']: # Пример онлайн-типов
                 tx_type_display = "онлайн"
-            elif tx['type'] == 'OFFLINE' or tx['type'] == 'OFFLINE_SYNC': # Пример офлайн-типов
+            elif tx.type == 'OFFLINE' or tx.type == 'OFFLINE_SYNC': # Пример офлайн-типов
                 tx_type_display = "офлайн"
-            elif tx['type'] == 'SMART_CONTRACT_EXECUTION': # Пример смарт-контракта
+            elif tx.type == 'SMART_CONTRACT_EXECUTION': # Пример смарт-контракта
                 tx_type_display = "смарт-контракт"
             # Добавьте другие типы по мере необходимости
 
             self.tx_tree.insert("", "end", values=(
-                tx['sender_id'],
-                tx['recipient_id'],
+                tx.sender_id,
+                tx.recipient_id,
                 tx_type_display, # Отображаем тип перевода
-                tx['amount'],
-                tx['timestamp'],
-                tx['fo_id'],
-                tx['status'] # Отображаем статус
+                tx.amount,
+                tx.timestamp,
+                tx.fo_id,
+                tx.status # Отображаем статус
             ))
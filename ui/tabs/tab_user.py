@@ -214,20 +214,20 @@ class UserTab(ttk.Frame):
                 messagebox.showerror("Ошибка", "Некорректная сумма офлайн-транзакции.")
                 return
 
-            tx_data = self.selected_user.create_offline_transaction(recipient_id, amount)
-            if tx_data:
+            offline_tx = self.selected_user.create_offline_transaction(recipient_id, amount)
+            if offline_tx:
                 messagebox.showinfo("Успех", f"Офлайн-транзакция создана. Она будет обработана при синхронизации.")
-                # В реальной системе, tx_data нужно было бы сохранить отдельно и обработать позже
+                # В реальной системе, offline_tx нужно было бы сохранить отдельно и обработать позже
                 # Для симуляции сохраним в БД как транзакцию со статусом OFFLINE
-                tx_data['status'] = 'ОФФЛАЙН'
+                offline_tx.status = 'ОФФЛАЙН'
                 # Нужно определить fo_id для офлайн-транзакции. Пусть это будет ФО отправителя.
                 sender_fo_id = None
                 for fo_id, fo in self.financial_orgs.items():
                     if self.selected_user.id in fo.users:
                         sender_fo_id = fo_id
                         break
-                tx_data['fo_id'] = sender_fo_id
-                self.db_manager.save_transaction(tx_data)
+                offline_tx.fo_id = sender_fo_id
+                self.db_manager.save_transaction(offline_tx.to_dict())
                 self.display_user_info() # Баланс офлайн кошелька изменился
 
     def create_smart_contract(self):
@@ -67,20 +67,20 @@ class UserDataTab(ttk.Frame):
         for item in self.user_tree.get_children():
             self.user_tree.delete(item)
 
-        # Получаем данные из БД
-        users_data = self.db_manager.get_all_users_data()
+        # Потоково читаем данные из БД страницами, не загружая всю таблицу в память
+        users_data = self.db_manager.iter_users()
 
         # Заполняем таблицу
         # ИСПРАВЛЕНО: используем 'users_data' вместо 'users_'
         for user in users_data:
             self.user_tree.insert("", "end", values=(
-                user['id'],
-                user['type'],
-                user['balance_non_cash'],
-                user['status_digital_wallet'],
-                user['status_offline_wallet'],
-                user['balance_digital'],
-                user['balance_offline'],
-                user['offline_wallet_expiry'], # Показываем время деактивации как ActivationTime, если логика другая
-                user['offline_wallet_expiry']  # Показываем время деактивации
+                user.id,
+                user.type,
+                user.balance_non_cash,
+                user.status_digital_wallet,
+                user.status_offline_wallet,
+                user.balance_digital,
+                user.balance_offline,
+                user.offline_wallet_expiry, # Показываем время деактивации как ActivationTime, если логика другая
+                user.offline_wallet_expiry  # Показываем время деактивации
             ))